@@ -15,7 +15,22 @@ a = Analysis(
         'src.gui.frames.settings_frame',
         'src.models.exercise',
         'src.models.workout',
+        'src.models.sampling',
         'src.services.storage',
+        'src.services.recent_volume',
+        'src.services.history_log',
+        'src.services.sqlite_storage',
+        'src.services.write_queue',
+        'src.services.atomic_file',
+        'src.services.read_cache',
+        'src.services.history_segments',
+        'src.services.history_reader',
+        'src.services.file_lock',
+        'src.services.history_stats',
+        'src.services.history_index',
+        'src.services.history_columns',
+        'src.gui.virtual_list',
+        'sqlite3',
         'customtkinter',
         'PIL',
         'tkinter',
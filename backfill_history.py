@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Add structured totals to GGOS workout history saved by older versions
+
+Usage: python backfill_history.py [data_dir]
+"""
+
+import sys
+from pathlib import Path
+
+# Allow running from any directory
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from src.services.storage import create_storage_service
+
+
+def main():
+    """Upgrade every history record that lacks reps_total, seconds_total or volume"""
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else None
+    storage = create_storage_service(data_dir)
+    
+    print("🔧 Backfilling workout history totals...")
+    try:
+        changed = storage.backfill_history_totals()
+    finally:
+        storage.close()
+    print(f"✅ {changed} record(s) upgraded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Allocation benchmark for GGOS
+
+Times WorkoutGenerator.generate_workout across death counts spanning
+several orders of magnitude. The per-call cost should stay flat because
+the allocation engine scales with the number of exercises, not deaths.
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+# Allow running from the repository root or the benchmarks directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.models.exercise import Exercise, UnitType
+from src.models.workout import WorkoutGenerator
+
+
+def main():
+    """Run the allocation benchmark"""
+    exercises = [Exercise(f"Exercise {i}", UnitType.REPS, 2) for i in range(20)]
+    repeat = 200
+    
+    print(f"⏱️ generate_workout over {len(exercises)} exercises")
+    print("=" * 50)
+    
+    baseline = None
+    for deaths in (10, 10**3, 10**5, 10**7):
+        seconds = timeit.timeit(
+            lambda: WorkoutGenerator.generate_workout(exercises, deaths),
+            number=repeat
+        )
+        per_call_us = seconds / repeat * 1e6
+        if baseline is None:
+            baseline = per_call_us
+        print(f"{deaths:>10} deaths: {per_call_us:8.1f} µs/call ({per_call_us / baseline:.2f}x)")
+    
+    # Batch generation versus a Python loop over generate_workout
+    deck = [(i % 50) + 1 for i in range(10000)]
+    loop_seconds = timeit.timeit(
+        lambda: [WorkoutGenerator.generate_workout(exercises, deaths) for deaths in deck],
+        number=1
+    )
+    batch_seconds = timeit.timeit(
+        lambda: WorkoutGenerator.generate_batch(exercises, deck, seed=1),
+        number=1
+    )
+    print(f"\n📦 {len(deck)} workouts: loop {loop_seconds * 1000:.1f} ms, "
+          f"generate_batch {batch_seconds * 1000:.1f} ms ({loop_seconds / batch_seconds:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
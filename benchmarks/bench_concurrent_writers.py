@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Concurrent writer benchmark for GGOS
+
+Runs several processes saving workouts into one data directory, checks
+that every record arrived, and reports saves per second.
+"""
+
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Allow running from the repository root or the benchmarks directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.storage import StorageService
+
+SAVES_PER_PROCESS = 200
+
+
+def write_workouts(data_dir, worker):
+    """Save workouts one at a time, each its own locked, fsynced append"""
+    storage = StorageService(data_dir)
+    for index in range(SAVES_PER_PROCESS):
+        storage.save_workout_history({"timestamp": "2025-05-01T10:00:00", "worker": worker, "index": index})
+
+
+def main():
+    """Run the concurrent writer benchmark"""
+    print("⏱️ Concurrent writers: one data directory, N processes")
+    print("=" * 50)
+    
+    for workers in (1, 2, 4, 8):
+        temp_dir = tempfile.mkdtemp()
+        try:
+            processes = [multiprocessing.Process(target=write_workouts, args=(temp_dir, worker))
+                         for worker in range(workers)]
+            start = time.perf_counter()
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+            elapsed = time.perf_counter() - start
+            
+            saved = StorageService(temp_dir).load_workout_history(limit=None)
+            expected = workers * SAVES_PER_PROCESS
+            status = "all saved" if len(saved) == expected else f"LOST {expected - len(saved)}"
+            print(f"{workers} processes: {expected / elapsed:8,.0f} saves/s ({expected:,} saves, {status})")
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
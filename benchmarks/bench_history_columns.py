@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Columnar history benchmark for GGOS
+
+Compares the memory held by 100k history records as parsed dictionaries
+with HistoryColumns, and times a combined filter and the whole-history
+statistics over the columns against the same work over the dictionaries.
+"""
+
+import json
+import random
+import sys
+import timeit
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Allow running from the repository root or the benchmarks directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services import history_columns
+from src.services.history_columns import HistoryColumns
+from src.services.history_stats import HistoryStats
+
+
+def main():
+    """Run the columnar history benchmark"""
+    rng = random.Random(1)
+    ids = ["squats", "push_ups", "burpees", "plank", "lunges", "jumping_jacks", "wall_sit", "sit_ups"]
+    start = datetime.now() - timedelta(days=2000)
+    lines = []
+    for i in range(100_000):
+        deaths = rng.randint(0, 30)
+        picks = rng.sample(ids, 3)
+        lines.append(json.dumps({
+            "timestamp": (start + timedelta(minutes=29 * i)).isoformat(), "deaths": deaths,
+            "seed": rng.getrandbits(48), "total_deaths_accounted": deaths,
+            "summary": f"{deaths * 2} reps + {deaths * 3} seconds", "exercise_set": "a3f9c2d1e4b5a6c7",
+            "reps_total": deaths * 2, "seconds_total": deaths * 3,
+            "volume": {pick: rng.randint(1, 40) for pick in picks},
+            "exercises": [{"name": pick, "amount": rng.randint(1, 40), "deaths_allocated": rng.randint(0, 10)}
+                          for pick in picks]
+        }))
+    since = (datetime.now() - timedelta(days=365)).isoformat()
+    
+    print("⏱️ History in memory: dictionaries vs columns")
+    print("=" * 50)
+    print(f"{len(lines):,} records")
+    
+    tracemalloc.start()
+    records = [json.loads(line) for line in lines]
+    dict_bytes = tracemalloc.get_traced_memory()[0]
+    history = HistoryColumns(records)
+    column_bytes = tracemalloc.get_traced_memory()[0] - dict_bytes
+    tracemalloc.stop()
+    
+    def scan():
+        return [r for r in records if r["timestamp"] >= since and r["deaths"] >= 15
+                and "plank" in [e["name"] for e in r["exercises"]]]
+    
+    def count():
+        stats = HistoryStats()
+        for record in records:
+            stats.add(record)
+        return stats
+    
+    print(f"dictionaries:                 {dict_bytes / 1e6:8.1f} MB")
+    print(f"columns:                      {column_bytes / 1e6:8.1f} MB ({dict_bytes / column_bytes:.0f}x smaller)")
+    
+    runs = 10
+    timings = [
+        ("filter, dicts", timeit.timeit(scan, number=runs) / runs * 1000),
+        ("statistics, dicts", timeit.timeit(count, number=runs) / runs * 1000),
+    ]
+    numpy_module = history_columns.np
+    try:
+        for label, backend in [("NumPy", numpy_module), ("pure Python", None)] if numpy_module else [("pure Python", None)]:
+            history_columns.np = backend
+            select = lambda: history.select(since=since, min_deaths=15, exercise="plank")
+            timings.append((f"filter, columns ({label})", timeit.timeit(select, number=runs) / runs * 1000))
+            timings.append((f"statistics, columns ({label})", timeit.timeit(history.stats, number=runs) / runs * 1000))
+    finally:
+        history_columns.np = numpy_module
+    
+    for label, ms in timings:
+        print(f"{label + ':':35} {ms:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
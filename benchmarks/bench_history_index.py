@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+History filter benchmark for GGOS
+
+Compares "last 30 days, 15+ deaths, included Burpees" answered from the
+history indexes with a list comprehension over every record, for 100k
+workouts.
+"""
+
+import random
+import sys
+import time
+import timeit
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Allow running from the repository root or the benchmarks directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.history_index import HistoryIndex
+
+
+def main():
+    """Run the history filter benchmark"""
+    rng = random.Random(1)
+    names = ["Squats", "Push-ups", "Burpees", "Plank", "Lunges", "Jumping Jacks", "Wall Sit", "Sit-ups"]
+    start = datetime.now() - timedelta(days=2000)
+    records = [
+        {"timestamp": (start + timedelta(minutes=29 * i)).isoformat(), "deaths": rng.randint(0, 20),
+         "exercises": [{"name": name} for name in rng.sample(names, 3)]}
+        for i in range(100_000)
+    ]
+    since = (datetime.now() - timedelta(days=30)).isoformat()
+    
+    print("⏱️ History filters: indexes vs list comprehension")
+    print("=" * 50)
+    print(f"{len(records):,} records")
+    
+    begin = time.perf_counter()
+    index = HistoryIndex(records)
+    build_ms = (time.perf_counter() - begin) * 1000
+    
+    def scan():
+        return sorted(
+            (r for r in records if r["timestamp"] >= since and r["deaths"] >= 15
+             and "Burpees" in [e["name"] for e in r["exercises"]]),
+            key=lambda r: r["timestamp"], reverse=True
+        )[:100]
+    
+    def query():
+        return index.query(since=since, min_deaths=15, exercise="Burpees", limit=100)
+    
+    assert query() == scan()
+    
+    runs = 20
+    scan_ms = timeit.timeit(scan, number=runs) / runs * 1000
+    query_ms = timeit.timeit(query, number=runs) / runs * 1000
+    high_ms = timeit.timeit(lambda: index.query(min_deaths=20, limit=100), number=runs) / runs * 1000
+    
+    print(f"build indexes (one pass):       {build_ms:8.1f} ms")
+    print(f"combined filter, full scan:     {scan_ms:8.2f} ms")
+    print(f"combined filter, indexes:       {query_ms:8.2f} ms ({scan_ms / query_ms:,.0f}x)")
+    print(f"20+ deaths, newest 100, indexes: {high_ms:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
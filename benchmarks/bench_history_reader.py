@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+History paging benchmark for GGOS
+
+Compares reading the newest page of a multi-year history through the
+memory-mapped offset index with parsing every record first.
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Allow running from the repository root or the benchmarks directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.storage import StorageService
+
+
+def main():
+    """Run the history paging benchmark"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        storage = StorageService(temp_dir)
+        records = [
+            {"timestamp": f"{2020 + month // 12}-{month % 12 + 1:02d}-{day + 1:02d}T10:00:00",
+             "deaths": day, "summary": f"{day * 2} reps", "exercises": [{"id": "squats", "amount": day * 2}]}
+            for month in range(60) for day in range(28) for _ in range(30)
+        ]
+        storage.history.append_records(records)
+        
+        print("⏱️ History paging: offset index vs full parse")
+        print("=" * 50)
+        print(f"{len(records):,} records over 60 months")
+        
+        start = time.perf_counter()
+        full = list(storage.iter_workout_history())[-100:]
+        full_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        reader = storage.open_history_reader()
+        page = reader.tail(100)
+        tail_ms = (time.perf_counter() - start) * 1000
+        assert page == full
+        
+        start = time.perf_counter()
+        length = len(reader)
+        middle = reader[length // 2]
+        index_ms = (time.perf_counter() - start) * 1000
+        assert middle == records[length // 2]
+        reader.close()
+        
+        print(f"last 100, full parse:   {full_ms:9.1f} ms")
+        print(f"last 100, offset index: {tail_ms:9.1f} ms ({full_ms / tail_ms:,.0f}x)")
+        print(f"index every month, then record k: {index_ms:9.1f} ms")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+History rollup benchmark for GGOS
+
+Compares answering "deaths this week" from the rollups with bucketing
+every record's timestamp, over 100k workouts.
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# Allow running from the repository root or the benchmarks directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.storage import StorageService
+
+
+def main():
+    """Run the history rollup benchmark"""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        storage = StorageService(temp_dir)
+        start_day = date.today() - timedelta(days=2000)
+        records = [
+            {"timestamp": f"{start_day + timedelta(days=i // 50)}T{i % 24:02d}:00:00", "deaths": i % 13,
+             "reps_total": i % 40, "seconds_total": i % 30}
+            for i in range(100_000)
+        ]
+        storage.history.append_records(records)
+        
+        print("⏱️ History rollups: deaths this week")
+        print("=" * 50)
+        print(f"{len(records):,} records over {len(records) // 50:,} days")
+        
+        this_week = date.today().isocalendar()[:2]
+        start = time.perf_counter()
+        scanned = sum(
+            record["deaths"] for record in storage.iter_workout_history()
+            if datetime.fromisoformat(record["timestamp"]).isocalendar()[:2] == this_week
+        )
+        scan_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        rollups = StorageService(temp_dir).get_history_rollups()
+        build_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        rollups = StorageService(temp_dir).get_history_rollups()
+        reload_ms = (time.perf_counter() - start) * 1000
+        assert rollups.current("week")["deaths"] == scanned
+        
+        runs = 100_000
+        query_us = timeit.timeit(lambda: rollups.current("week")["deaths"], number=runs) / runs * 1e6
+        
+        print(f"scan and bucket every record: {scan_ms:9.1f} ms")
+        print(f"first build (streaming pass): {build_ms:9.1f} ms")
+        print(f"reopen from saved rollups:    {reload_ms:9.1f} ms")
+        print(f"deaths this week from rollups: {query_us:8.2f} µs")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Workout summary microbenchmark for GGOS
+
+Compares Workout.get_summary / get_exercises_by_unit_type, which read
+running totals, with the previous approach of walking every exercise and
+comparing unit_type.value strings on each call.
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+# Allow running from the repository root or the benchmarks directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.models.exercise import Exercise, UnitType
+from src.models.workout import WorkoutGenerator
+
+
+def recompute_summary(workout) -> str:
+    """Summary as computed before totals were cached"""
+    reps_total = 0
+    seconds_total = 0
+    for workout_exercise in workout.exercises:
+        if workout_exercise.exercise.unit_type.value == "reps":
+            reps_total += workout_exercise.allocated_amount
+        else:
+            seconds_total += workout_exercise.allocated_amount
+    
+    summary_parts = []
+    if reps_total > 0:
+        summary_parts.append(f"{reps_total} reps")
+    if seconds_total > 0:
+        summary_parts.append(f"{seconds_total} seconds")
+    return " + ".join(summary_parts) if summary_parts else "No exercises"
+
+
+def recompute_grouping(workout):
+    """Unit-type grouping as computed before it was cached"""
+    grouped = {"reps": [], "seconds": []}
+    for workout_exercise in workout.exercises:
+        grouped[workout_exercise.exercise.unit_type.value].append(workout_exercise)
+    return grouped
+
+
+def main():
+    """Run the summary benchmark"""
+    exercises = [
+        Exercise(f"Exercise {i}", UnitType.REPS if i % 3 else UnitType.SECONDS, 2)
+        for i in range(20)
+    ]
+    repeat = 100
+    
+    print("⏱️ Workout summary: cached totals vs recompute")
+    print("=" * 50)
+    
+    for deaths in (100, 10**4, 10**5):
+        # Per-pick layout gives workouts with one entry per 1-3 deaths
+        workout = WorkoutGenerator.generate_workout(exercises, deaths, aggregate=False)
+        assert workout.get_summary() == recompute_summary(workout)
+        
+        def cached():
+            workout.get_summary()
+            workout.get_exercises_by_unit_type()
+        
+        def recompute():
+            recompute_summary(workout)
+            recompute_grouping(workout)
+        
+        cached_us = timeit.timeit(cached, number=repeat) / repeat * 1e6
+        recompute_us = timeit.timeit(recompute, number=repeat) / repeat * 1e6
+        print(f"{len(workout.exercises):>8} entries: cached {cached_us:8.2f} µs, "
+              f"recompute {recompute_us:10.1f} µs ({recompute_us / cached_us:,.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -44,7 +44,21 @@ def build_executable():
             "--hidden-import=src.gui.frames.settings_frame",
             "--hidden-import=src.models.exercise",
             "--hidden-import=src.models.workout",
+            "--hidden-import=src.models.sampling",
             "--hidden-import=src.services.storage",
+            "--hidden-import=src.services.recent_volume",
+            "--hidden-import=src.services.history_log",
+            "--hidden-import=src.services.sqlite_storage",
+            "--hidden-import=src.services.write_queue",
+            "--hidden-import=src.services.atomic_file",
+            "--hidden-import=src.services.read_cache",
+            "--hidden-import=src.services.history_segments",
+            "--hidden-import=src.services.history_reader",
+            "--hidden-import=src.services.file_lock",
+            "--hidden-import=src.services.history_stats",
+            "--hidden-import=src.services.history_index",
+            "--hidden-import=src.services.history_columns",
+            "--hidden-import=src.gui.virtual_list",
             "--hidden-import=customtkinter",
             "--hidden-import=PIL",
             "main.py"
@@ -3,14 +3,14 @@ Main GUI application for GGOS
 """
 
 import customtkinter as ctk
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 import tkinter as tk
 from tkinter import messagebox
 from datetime import datetime
 
 from src.models.exercise import Exercise, UnitType
-from src.models.workout import WorkoutGenerator, Workout
-from src.services.storage import StorageService
+from src.models.workout import WorkoutGenerator, Workout, WorkoutSession
+from src.services.storage import create_storage_service
 from src.gui.frames.setup_frame import SetupFrame
 from src.gui.frames.workout_frame import WorkoutFrame
 from src.gui.frames.settings_frame import SettingsFrame
@@ -26,13 +26,22 @@ class GGOSApp:
         ctk.set_appearance_mode("dark")
         ctk.set_default_color_theme("blue")
         
-        # Initialize storage
-        self.storage = StorageService()
+        # Damaged records can be found on background threads; shown from the UI loop
+        self.corrupt_records = []
+        
+        # Initialize storage; writes happen off the UI thread
+        self.storage = create_storage_service(write_behind=True, on_corrupt=self.corrupt_records.append)
+        
+        # Each app instance owns its own random stream
+        self.generator = WorkoutGenerator()
         
         # Load data
         self.exercises = self.storage.load_exercises()
         self.settings = self.storage.load_settings()
         
+        # Expire and compress old history without holding up startup
+        self.storage.start_history_maintenance(self.settings.get("history_retention_months", 0))
+        
         # If no exercises exist, load defaults
         if not self.exercises:
             self.exercises = self.storage.get_default_exercises()
@@ -59,6 +68,8 @@ class GGOSApp:
         
         # Show initial frame
         self.show_frame("workout")
+        
+        self.root.after(1000, self.check_corrupt_records)
     
     def create_navigation(self):
         """Create the navigation bar"""
@@ -105,7 +116,8 @@ class GGOSApp:
             self.content_frame,
             self.exercises,
             self.generate_workout,
-            self.save_workout
+            self.save_workout,
+            self.start_session
         )
         
         # Setup frame
@@ -119,7 +131,11 @@ class GGOSApp:
         # History frame
         self.frames["history"] = HistoryFrame(
             self.content_frame,
-            self.storage.load_workout_history()
+            self.storage.open_history_reader(),
+            self.get_workout_details,
+            self.storage.load_history_stats,
+            self.storage.get_history_rollups,
+            self.storage.open_history_columns
         )
         
         # Settings frame
@@ -152,31 +168,73 @@ class GGOSApp:
     
     def generate_workout(self, deaths: int) -> Workout:
         """Generate a workout for the given number of deaths"""
-        return WorkoutGenerator.generate_workout(self.exercises, deaths)
+        workout = self.generator.generate(self.exercises, deaths, weights=self.get_generation_weights())
+        
+        # Keep the configuration so the history can point to it by hash
+        self.storage.save_exercise_snapshot(self.exercises)
+        return workout
+    
+    def start_session(self) -> WorkoutSession:
+        """Start a live session that takes deaths one at a time"""
+        session = self.generator.start_session(self.exercises, weights=self.get_generation_weights())
+        self.storage.save_exercise_snapshot(self.exercises)
+        return session
+    
+    def get_generation_weights(self) -> Optional[List[float]]:
+        """Get exercise weights for the selected generation mode"""
+        if self.settings.get("generation_mode") != "balanced":
+            return None
+        
+        # Favour exercises that have seen the least work lately
+        recent_volume = self.storage.get_recent_volume(self.settings.get("balance_window_days", 14))
+        return WorkoutGenerator.balance_weights(self.exercises, recent_volume)
     
     def save_workout(self, workout: Workout, deaths: int):
         """Save workout to history"""
         workout_data = {
             "timestamp": datetime.now().isoformat(),
             "deaths": deaths,
+            "seed": workout.seed,
             "total_deaths_accounted": workout.total_deaths,
             "summary": workout.get_summary(),
-            "exercises": [
-                {
-                    "name": we.exercise.name,
-                    "amount": we.allocated_amount,
-                    "unit": we.exercise.get_unit_display(),
-                    "deaths_allocated": we.deaths_allocated
-                }
-                for we in workout.exercises
-            ]
+            "exercise_set": workout.exercise_set
         }
         
+        if workout.weights is not None:
+            workout_data["weights"] = workout.weights
+        
+        # Numeric totals, so statistics never parse the summary text
+        workout_data["reps_total"] = workout.reps_total
+        workout_data["seconds_total"] = workout.seconds_total
+        
+        # Compact records are rebuilt from the seed when the entry is expanded,
+        # so they carry neither the entries nor the per-exercise volume
+        if not (self.settings.get("compact_history", False) and workout.seed is not None):
+            workout_data["volume"] = {we.exercise.id: we.allocated_amount for we in workout.aggregated().exercises}
+            workout_data["exercises"] = self.get_exercise_entries(workout)
+        
         self.storage.save_workout_history(workout_data)
         
-        # Refresh history frame
+        # Show the new workout without reading the history back
         if "history" in self.frames:
-            self.frames["history"].refresh_history(self.storage.load_workout_history())
+            self.frames["history"].add_workout(workout_data)
+    
+    def get_exercise_entries(self, workout: Workout) -> List[Dict[str, Any]]:
+        """Get the history entries for a workout's exercises"""
+        # Names and units live in the exercise snapshot, referenced by id.
+        # One history entry per exercise, however the picks were made.
+        return [
+            {
+                "id": we.exercise.id,
+                "amount": we.allocated_amount,
+                "deaths_allocated": we.deaths_allocated
+            }
+            for we in workout.aggregated().exercises
+        ]
+    
+    def get_workout_details(self, workout_data: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Get the exercise breakdown of a history record"""
+        return self.storage.get_workout_exercises(workout_data)
     
     def save_exercises(self, exercises: List[Exercise]):
         """Save exercises and update the application"""
@@ -209,12 +267,31 @@ class GGOSApp:
         if "theme" in settings:
             ctk.set_appearance_mode(settings["theme"])
     
+    def check_corrupt_records(self):
+        """Tell the user about damaged data that storage set aside"""
+        if self.corrupt_records:
+            records = self.corrupt_records[:]
+            del self.corrupt_records[:len(records)]
+            
+            details = "\n".join(record.describe() for record in records[:5])
+            if len(records) > 5:
+                details += f"\n...and {len(records) - 5} more"
+            messagebox.showwarning(
+                "Damaged Data",
+                f"{len(records)} damaged record(s) were skipped and kept aside in the GGOS data folder:\n\n{details}"
+            )
+        
+        self.root.after(2000, self.check_corrupt_records)
+    
     def on_closing(self):
         """Handle application closing"""
         # Save window size
         self.settings["window_size"] = self.root.geometry()
         self.storage.save_settings(self.settings)
         
+        # Let queued writes reach the disk before exiting
+        self.storage.close()
+        
         self.root.destroy()
     
     def run(self):
@@ -3,18 +3,59 @@ History frame for GGOS
 """
 
 import customtkinter as ctk
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Optional, Sequence, Tuple
 import tkinter as tk
-from datetime import datetime
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import islice
+from src.gui.virtual_list import VirtualList
+from src.services.history_columns import HistoryColumns
+from src.services.history_stats import HistoryRollups, HistoryStats
+
+
+# History entries rendered per page as the list scrolls, and the most kept
+# in the text box at once; pages scrolled far past are dropped again
+HISTORY_PAGE_SIZE = 20
+HISTORY_MAX_RENDERED = 100
+
+# Formatted entries kept for when they scroll back into view
+FORMAT_CACHE_SIZE = 1000
+
+# Period filter choices, in days back from now
+PERIOD_DAYS = {"all time": None, "last 7 days": 7, "last 30 days": 30, "last 90 days": 90}
+ALL_EXERCISES = "all exercises"
 
 
 class HistoryFrame(ctk.CTkFrame):
     """Frame for displaying workout history"""
     
-    def __init__(self, parent, workout_history: List[Dict[str, Any]]):
+    def __init__(self, parent, workout_history: Sequence[Dict[str, Any]],
+                 details_callback: Optional[Callable[[Dict[str, Any]], Optional[List[Dict[str, Any]]]]] = None,
+                 stats_callback: Optional[Callable[[], HistoryStats]] = None,
+                 rollups_callback: Optional[Callable[[], HistoryRollups]] = None,
+                 columns_callback: Optional[Callable[[], HistoryColumns]] = None):
         super().__init__(parent)
         
+        # Saved history (usually a storage reader) plus workouts saved since.
+        # Without storage the workouts are held here, as columns.
         self.workout_history = workout_history
+        self.added_workouts: List[Dict[str, Any]] = []
+        self.details_callback = details_callback
+        
+        # Statistics and rollups over the saved history come from storage if it keeps them
+        self.stats_callback = stats_callback
+        self.rollups_callback = rollups_callback
+        self.statistics = HistoryStats()
+        self.rollups = HistoryRollups()
+        
+        # The history as columns, loaded from storage the first time a filter needs it
+        self.columns_callback = columns_callback
+        self.history_columns: Optional[HistoryColumns] = None
+        
+        # The filtered workouts, of which only a window is rendered
+        self.entries: Optional[VirtualList] = None
+        self.formatted: "OrderedDict[Tuple[str, int], Tuple[str, bool]]" = OrderedDict()
+        self._page_pending = False
         
         self.setup_ui()
         self.refresh_history()
@@ -65,6 +106,28 @@ class HistoryFrame(ctk.CTkFrame):
         )
         filter_menu.grid(row=0, column=1, padx=10, pady=15, sticky="w")
         
+        # Period and exercise filters combine with the one above
+        self.period_var = ctk.StringVar(value="all time")
+        period_menu = ctk.CTkOptionMenu(
+            controls_frame,
+            values=list(PERIOD_DAYS),
+            variable=self.period_var,
+            command=self.apply_filter,
+            width=130
+        )
+        period_menu.grid(row=1, column=1, padx=10, pady=(0, 15), sticky="w")
+        
+        self.exercise_var = ctk.StringVar(value=ALL_EXERCISES)
+        self.exercise_combo = ctk.CTkComboBox(
+            controls_frame,
+            values=[ALL_EXERCISES],
+            variable=self.exercise_var,
+            command=self.apply_filter,
+            width=170
+        )
+        self.exercise_combo.grid(row=1, column=2, padx=(10, 20), pady=(0, 15), sticky="w")
+        self.exercise_combo.bind("<Return>", self.apply_filter)
+        
         # Clear history button
         clear_btn = ctk.CTkButton(
             controls_frame,
@@ -98,6 +161,13 @@ class HistoryFrame(ctk.CTkFrame):
             height=300
         )
         self.history_text.grid(row=1, column=0, sticky="nsew", padx=20, pady=(0, 20))
+        self.history_text.tag_config("expand", foreground="#3B8ED0", underline=True)
+        
+        # CTkTextbox has no public scroll callback, so wrap the one feeding its scrollbar
+        scrollbar_set = self.history_text._y_scrollbar.set
+        self.history_text._textbox.configure(
+            yscrollcommand=lambda first, last: (scrollbar_set(first, last), self.on_history_scroll(first, last))
+        )
         
         # Statistics frame
         stats_frame = ctk.CTkFrame(history_frame)
@@ -132,107 +202,334 @@ class HistoryFrame(ctk.CTkFrame):
             font=ctk.CTkFont(size=12, weight="bold")
         )
         self.total_reps_label.grid(row=0, column=3, padx=10, pady=10)
+        
+        self.trends_label = ctk.CTkLabel(
+            stats_frame,
+            text="This Week: 0 deaths · This Month: 0 deaths",
+            font=ctk.CTkFont(size=12)
+        )
+        self.trends_label.grid(row=1, column=0, columnspan=4, padx=10, pady=(0, 10))
+        
+        # Statistics of the filtered workouts, while a filter is applied
+        self.filtered_label = ctk.CTkLabel(
+            stats_frame,
+            text="",
+            font=ctk.CTkFont(size=12)
+        )
+        self.filtered_label.grid(row=2, column=0, columnspan=4, padx=10, pady=(0, 10))
     
-    def refresh_history(self, workout_history: List[Dict[str, Any]] = None):
+    def refresh_history(self, workout_history: Optional[Sequence[Dict[str, Any]]] = None):
         """Refresh the history display"""
         if workout_history is not None:
             self.workout_history = workout_history
+            self.added_workouts = []
+            # Storage's statistics describe the saved history, not this one
+            self.stats_callback = None
+            self.rollups_callback = None
+            self.columns_callback = None
+        self.history_columns = None
+        
+        if self.columns_callback is None:
+            if not isinstance(self.workout_history, HistoryColumns):
+                self.workout_history = HistoryColumns(self.workout_history, self.details_names)
+            self.history_columns = self.workout_history
+            self.exercise_combo.configure(values=[ALL_EXERCISES] + self.history_columns.exercises())
         
         self.apply_filter()
         self.update_statistics()
     
+    def add_workout(self, workout: Dict[str, Any]):
+        """Add a newly saved workout to the display"""
+        if self.history_columns is not self.workout_history:
+            # Shown after the storage reader's records until the next refresh
+            self.added_workouts.append(workout)
+        if self.history_columns is not None:
+            self.history_columns.append(workout)
+            self.exercise_combo.configure(values=[ALL_EXERCISES] + self.history_columns.exercises())
+        self.statistics.add(workout)
+        if self.rollups_callback is None:
+            # Storage's rollups already include it
+            self.rollups.add(workout)
+        self.apply_filter()
+        self.show_statistics()
+    
+    def iter_newest(self) -> Iterator[Dict[str, Any]]:
+        """Yield workouts newest first, reading saved history only as far as needed"""
+        yield from reversed(self.added_workouts)
+        yield from reversed(self.workout_history)
+    
     def apply_filter(self, *args):
-        """Apply the selected filter"""
+        """Apply the selected filters"""
         filter_type = self.filter_var.get()
-        filtered_history = self.workout_history.copy()
-        
-        if filter_type == "recent":
-            # Show only last 10 workouts
-            filtered_history = filtered_history[-10:]
-        elif filter_type == "high_deaths":
-            # Show workouts with 10+ deaths
-            filtered_history = [w for w in filtered_history if w.get("deaths", 0) >= 10]
-        elif filter_type == "low_deaths":
-            # Show workouts with < 10 deaths
-            filtered_history = [w for w in filtered_history if w.get("deaths", 0) < 10]
-        
-        self.display_history(filtered_history)
-    
-    def display_history(self, history: List[Dict[str, Any]]):
-        """Display the workout history"""
+        days = PERIOD_DAYS.get(self.period_var.get())
+        exercise = self.exercise_var.get().strip()
+        if exercise in ("", ALL_EXERCISES):
+            exercise = None
+        
+        # "recent" shows only the last 10 workouts; the death filters split at 10
+        limit = 10 if filter_type == "recent" else None
+        min_deaths = 10 if filter_type == "high_deaths" else None
+        max_deaths = 9 if filter_type == "low_deaths" else None
+        
+        if days is None and exercise is None and min_deaths is None and max_deaths is None:
+            # Nothing to look up: entries are read from the history as they scroll into view
+            self.filtered_label.configure(text="")
+            self.display_history(islice(self.iter_newest(), limit))
+            return
+        
+        # Compare whole columns at once, then look up only the entries shown
+        since = (datetime.now() - timedelta(days=days)).isoformat() if days is not None else None
+        history = self.get_history_columns()
+        positions = history.select(since=since, min_deaths=min_deaths, max_deaths=max_deaths,
+                                   exercise=exercise, limit=limit)
+        self.show_filtered_statistics(history, positions)
+        self.display_history(history[position] for position in reversed(positions))
+    
+    def get_history_columns(self) -> HistoryColumns:
+        """Get the history as columns, loading it from storage on first use"""
+        if self.history_columns is None:
+            # Loaded after the added workouts were saved, so it has them
+            self.history_columns = self.columns_callback()
+            self.exercise_combo.configure(values=[ALL_EXERCISES] + self.history_columns.exercises())
+        return self.history_columns
+    
+    def details_names(self, workout: Dict[str, Any]) -> List[str]:
+        """Get the exercise names of a workout, for filtering without storage"""
+        return [exercise.get("name", "Unknown") for exercise in self.get_exercises(workout) or []]
+    
+    def display_history(self, history: Iterable[Dict[str, Any]]):
+        """Display workouts, newest first, rendering only the first page for now"""
         self.history_text.delete("1.0", tk.END)
+        for mark in self.history_text.mark_names():
+            if mark.startswith("entry-"):
+                self.history_text.mark_unset(mark)
         
-        if not history:
+        self.entries = VirtualList(history, HISTORY_PAGE_SIZE, HISTORY_MAX_RENDERED)
+        if self.entries.is_empty():
+            self.entries = None
             self.history_text.insert("1.0", "No workout history found.\nGenerate some workouts to see them here!")
             return
         
-        # Sort by timestamp (newest first)
-        sorted_history = sorted(history, key=lambda x: x.get("timestamp", ""), reverse=True)
-        
-        for i, workout in enumerate(sorted_history, 1):
-            # Parse timestamp
-            timestamp = workout.get("timestamp", "")
-            try:
-                dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
-                date_str = dt.strftime("%Y-%m-%d %H:%M")
-            except:
-                date_str = "Unknown date"
-            
-            # Format workout entry
-            deaths = workout.get("deaths", 0)
-            summary = workout.get("summary", "No summary")
-            
-            entry = f"📅 {date_str}\n"
-            entry += f"💀 Deaths: {deaths}\n"
-            entry += f"📊 Summary: {summary}\n"
-            
-            # Add exercises if available
-            exercises = workout.get("exercises", [])
-            if exercises:
-                entry += "🏃‍♂️ Exercises:\n"
-                for exercise in exercises:
-                    name = exercise.get("name", "Unknown")
-                    amount = exercise.get("amount", 0)
-                    unit = exercise.get("unit", "")
-                    deaths_allocated = exercise.get("deaths_allocated", 0)
-                    entry += f"  • {amount} {name} ({deaths_allocated} deaths)\n"
-            
-            entry += "\n" + "─" * 50 + "\n\n"
-            
-            self.history_text.insert(tk.END, entry)
+        for index in self.entries.extend_end():
+            self.render_entry(index, "end-1c")
+    
+    def on_history_scroll(self, first: str, last: str):
+        """Page entries in once the view nears either end of what is rendered"""
+        if self.entries is None or self._page_pending:
+            return
+        if float(last) > 0.9 or float(first) < 0.1:
+            # Not while Tk is still laying out the text that moved the view
+            self._page_pending = True
+            self.after_idle(self.page_history)
+    
+    def page_history(self):
+        """Render the page past whichever end of the view is near, dropping pages far behind"""
+        self._page_pending = False
+        if self.entries is None:
+            return
+        
+        first, last = self.history_text.yview()
+        self.history_text.mark_set("view", "@0,0")
+        self.history_text.mark_gravity("view", "right")
+        
+        if last > 0.9 and self.entries.has_more():
+            for index in self.entries.extend_end():
+                self.render_entry(index, "end-1c")
+            dropped = self.entries.trim_start()
+            if dropped:
+                self.history_text.delete("1.0", f"entry-{self.entries.start}")
+                self.forget_entries(dropped)
+        elif first < 0.1 and self.entries.start > 0:
+            for index in reversed(self.entries.extend_start()):
+                self.render_entry(index, "1.0")
+            dropped = self.entries.trim_end()
+            if dropped:
+                self.history_text.delete(f"entry-{self.entries.end}", tk.END)
+                self.forget_entries(dropped)
+        else:
+            return
+        
+        # Keep the same entries on screen
+        self.history_text.yview("view")
+    
+    def render_entry(self, index: int, at: str):
+        """Insert one entry at a text position and mark where it starts"""
+        workout = self.entries[index]
+        text, expandable = self.format_entry(workout)
+        
+        # Text inserted at a right-gravity mark lands before it, in order
+        self.history_text.mark_set("render", at)
+        self.history_text.mark_gravity("render", "right")
+        start = self.history_text.index("render")
+        self.history_text.insert("render", text)
+        
+        # Compact records are rebuilt only when the user asks for them
+        if expandable:
+            tag = f"expand-{index}"
+            self.history_text.insert("render", "🏃‍♂️ ▶ Show exercises\n", ("expand", tag))
+            self.history_text.tag_bind(
+                tag, "<Button-1>",
+                lambda event, w=workout, t=tag: self.expand_entry(w, t)
+            )
+        
+        self.history_text.insert("render", "\n" + "─" * 50 + "\n\n")
+        self.history_text.mark_set(f"entry-{index}", start)
+        self.history_text.mark_gravity(f"entry-{index}", "right")
+    
+    def forget_entries(self, indexes: range):
+        """Remove the marks and links of entries no longer rendered"""
+        for index in indexes:
+            self.history_text.mark_unset(f"entry-{index}")
+            self.history_text.tag_unbind(f"expand-{index}", "<Button-1>")
+    
+    def format_entry(self, workout: Dict[str, Any]) -> Tuple[str, bool]:
+        """Get a workout's entry text and whether it needs a link to show its exercises
+        
+        Entries are formatted once and cached, so scrolling back costs nothing.
+        """
+        key = (workout.get("timestamp", ""), workout.get("deaths", 0))
+        cached = self.formatted.get(key)
+        if cached is not None:
+            self.formatted.move_to_end(key)
+            return cached
+        
+        # Parse timestamp
+        timestamp = workout.get("timestamp", "")
+        try:
+            dt = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+            date_str = dt.strftime("%Y-%m-%d %H:%M")
+        except:
+            date_str = "Unknown date"
+        
+        # Format workout entry
+        deaths = workout.get("deaths", 0)
+        summary = workout.get("summary", "No summary")
+        
+        entry = f"📅 {date_str}\n"
+        entry += f"💀 Deaths: {deaths}\n"
+        entry += f"📊 Summary: {summary}\n"
+        
+        # Add exercises if available
+        exercises = self._merge_exercise_entries(self.get_exercises(workout) or [])
+        if exercises:
+            entry += self.format_exercises(exercises)
+        
+        self.formatted[key] = (entry, "exercises" not in workout and workout.get("seed") is not None)
+        if len(self.formatted) > FORMAT_CACHE_SIZE:
+            self.formatted.popitem(last=False)
+        return self.formatted[key]
+    
+    def get_exercises(self, workout: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Get the exercise breakdown of a stored (non-compact) workout"""
+        if "exercises" not in workout:
+            return None
+        if self.details_callback:
+            return self.details_callback(workout)
+        return workout["exercises"]
+    
+    def format_exercises(self, exercises: List[Dict[str, Any]]) -> str:
+        """Format the exercise breakdown of a history entry"""
+        text = "🏃‍♂️ Exercises:\n"
+        for exercise in exercises:
+            name = exercise.get("name", "Unknown")
+            amount = exercise.get("amount", 0)
+            deaths_allocated = exercise.get("deaths_allocated", 0)
+            text += f"  • {amount} {name} ({deaths_allocated} deaths)\n"
+        return text
+    
+    def expand_entry(self, workout: Dict[str, Any], tag: str):
+        """Replace a compact entry's expand link with its rebuilt exercises"""
+        ranges = self.history_text.tag_ranges(tag)
+        if not ranges:
+            return
+        
+        exercises = self.details_callback(workout) if self.details_callback else None
+        if exercises:
+            exercises = self._merge_exercise_entries(exercises)
+            text = self.format_exercises(exercises)
+        else:
+            text = "🏃‍♂️ Exercise details unavailable\n"
+        
+        start, end = ranges[0], ranges[1]
+        self.history_text.delete(start, end)
+        self.history_text.insert(start, text)
+        self.history_text.tag_unbind(tag, "<Button-1>")
+        
+        # Stay expanded if the entry scrolls out and back
+        key = (workout.get("timestamp", ""), workout.get("deaths", 0))
+        if key in self.formatted:
+            self.formatted[key] = (self.formatted[key][0] + text, False)
+    
+    @staticmethod
+    def _merge_exercise_entries(exercises: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Merge repeated picks of the same exercise from older history records"""
+        merged: Dict[tuple, Dict[str, Any]] = {}
+        for exercise in exercises:
+            key = (exercise.get("name", "Unknown"), exercise.get("unit", ""))
+            if key in merged:
+                merged[key]["amount"] += exercise.get("amount", 0)
+                merged[key]["deaths_allocated"] += exercise.get("deaths_allocated", 0)
+            else:
+                merged[key] = {
+                    "name": key[0],
+                    "unit": key[1],
+                    "amount": exercise.get("amount", 0),
+                    "deaths_allocated": exercise.get("deaths_allocated", 0)
+                }
+        return list(merged.values())
     
     def update_statistics(self):
+        """Get the statistics and rollups from storage, or count them over the history shown"""
+        # Workouts added since were saved, so storage counts them too
+        if self.stats_callback is not None:
+            self.statistics = self.stats_callback()
+        elif isinstance(self.workout_history, HistoryColumns):
+            self.statistics = self.workout_history.stats()
+        else:
+            self.statistics = HistoryStats()
+            for workout in self.iter_newest():
+                self.statistics.add(workout)
+        
+        self.rollups = self.rollups_callback() if self.rollups_callback else HistoryRollups()
+        if self.rollups_callback is None:
+            for workout in self.iter_newest():
+                self.rollups.add(workout)
+        self.show_statistics()
+    
+    def show_statistics(self):
         """Update the statistics display"""
-        if not self.workout_history:
+        stats = self.statistics
+        week = self.rollups.current("week")
+        month = self.rollups.current("month")
+        self.trends_label.configure(
+            text=f"This Week: {week['deaths']} deaths in {week['workouts']} workouts · "
+                 f"This Month: {month['deaths']} deaths in {month['workouts']} workouts"
+        )
+        
+        if not stats.count:
             self.total_workouts_label.configure(text="Total Workouts: 0")
             self.total_deaths_label.configure(text="Total Deaths: 0")
             self.avg_deaths_label.configure(text="Avg Deaths: 0")
             self.total_reps_label.configure(text="Total Reps: 0")
             return
         
-        total_workouts = len(self.workout_history)
-        total_deaths = sum(w.get("deaths", 0) for w in self.workout_history)
-        avg_deaths = total_deaths / total_workouts if total_workouts > 0 else 0
-        
-        # Calculate total reps (approximate from summary)
-        total_reps = 0
-        for workout in self.workout_history:
-            summary = workout.get("summary", "")
-            if "reps" in summary:
-                try:
-                    # Extract reps number from summary like "25 reps + 30 seconds"
-                    parts = summary.split("+")
-                    for part in parts:
-                        if "reps" in part:
-                            reps_str = part.strip().split()[0]
-                            total_reps += int(reps_str)
-                except:
-                    pass
-        
-        self.total_workouts_label.configure(text=f"Total Workouts: {total_workouts}")
-        self.total_deaths_label.configure(text=f"Total Deaths: {total_deaths}")
-        self.avg_deaths_label.configure(text=f"Avg Deaths: {avg_deaths:.1f}")
-        self.total_reps_label.configure(text=f"Total Reps: {total_reps}")
+        self.total_workouts_label.configure(text=f"Total Workouts: {stats.count}")
+        self.total_deaths_label.configure(text=f"Total Deaths: {stats.deaths}")
+        self.avg_deaths_label.configure(text=f"Avg Deaths: {stats.mean_deaths:.1f} ± {stats.deaths_stddev:.1f}")
+        self.total_reps_label.configure(text=f"Total Reps: {stats.reps}")
+    
+    def show_filtered_statistics(self, history: HistoryColumns, positions: List[int]):
+        """Show the count, deaths and median deaths of the filtered workouts"""
+        if not positions:
+            self.filtered_label.configure(text="Filtered: no workouts")
+            return
+        
+        stats = history.stats(positions)
+        median = history.percentile("deaths", 50, positions)
+        self.filtered_label.configure(
+            text=f"Filtered: {stats.count} workouts · {stats.deaths} deaths · "
+                 f"Avg {stats.mean_deaths:.1f} · Median {median:g} · Most {stats.max_deaths}"
+        )
     
     def clear_history(self):
         """Clear all workout history"""
@@ -244,6 +541,5 @@ class HistoryFrame(ctk.CTkFrame):
         )
         
         if result:
-            self.workout_history.clear()
-            self.refresh_history()
+            self.refresh_history([])
             messagebox.showinfo("Success", "Workout history cleared!")
@@ -42,6 +42,8 @@ class SettingsFrame(ctk.CTkFrame):
         self.create_appearance_section(self.main_scrollable_frame)
         self.create_auto_input_section(self.main_scrollable_frame)
         self.create_fitness_tracker_section(self.main_scrollable_frame)
+        self.create_generation_section(self.main_scrollable_frame)
+        self.create_history_section(self.main_scrollable_frame)
         self.create_about_section(self.main_scrollable_frame)
         
         # Save button
@@ -52,7 +54,7 @@ class SettingsFrame(ctk.CTkFrame):
             height=40,
             width=150
         )
-        save_btn.grid(row=5, column=0, pady=20)
+        save_btn.grid(row=7, column=0, pady=20)
     
     def create_appearance_section(self, parent):
         """Create appearance settings section"""
@@ -160,10 +162,114 @@ class SettingsFrame(ctk.CTkFrame):
         )
         trackers_info.grid(row=2, column=0, columnspan=2, padx=20, pady=(0, 15), sticky="w")
     
+    def create_generation_section(self, parent):
+        """Create workout generation settings section"""
+        section_frame = ctk.CTkFrame(parent)
+        section_frame.grid(row=4, column=0, sticky="ew", padx=20, pady=10)
+        section_frame.grid_columnconfigure(1, weight=1)
+        
+        # Section title
+        title = ctk.CTkLabel(
+            section_frame,
+            text="🎲 Workout Generation",
+            font=ctk.CTkFont(size=16, weight="bold")
+        )
+        title.grid(row=0, column=0, columnspan=2, pady=(20, 15), sticky="w", padx=20)
+        
+        # Generation mode
+        mode_label = ctk.CTkLabel(section_frame, text="Exercise Selection:")
+        mode_label.grid(row=1, column=0, padx=(20, 10), pady=10, sticky="w")
+        
+        self.generation_mode_var = ctk.StringVar(value=self.settings.get("generation_mode", "random"))
+        mode_menu = ctk.CTkOptionMenu(
+            section_frame,
+            values=["random", "balanced"],
+            variable=self.generation_mode_var,
+            width=150
+        )
+        mode_menu.grid(row=1, column=1, padx=10, pady=10, sticky="w")
+        
+        # Balancing window
+        window_label = ctk.CTkLabel(section_frame, text="Balance Over (days):")
+        window_label.grid(row=2, column=0, padx=(20, 10), pady=10, sticky="w")
+        
+        self.balance_window_var = ctk.StringVar(value=str(self.settings.get("balance_window_days", 14)))
+        window_menu = ctk.CTkOptionMenu(
+            section_frame,
+            values=["7", "14", "30", "90"],
+            variable=self.balance_window_var,
+            width=150
+        )
+        window_menu.grid(row=2, column=1, padx=10, pady=10, sticky="w")
+        
+        # Balanced mode info
+        balance_info = ctk.CTkLabel(
+            section_frame,
+            text="Balanced mode favours the exercises you have done least recently",
+            font=ctk.CTkFont(size=12),
+            text_color="gray"
+        )
+        balance_info.grid(row=3, column=0, columnspan=2, padx=20, pady=(0, 15), sticky="w")
+    
+    def create_history_section(self, parent):
+        """Create history storage settings section"""
+        section_frame = ctk.CTkFrame(parent)
+        section_frame.grid(row=5, column=0, sticky="ew", padx=20, pady=10)
+        section_frame.grid_columnconfigure(1, weight=1)
+        
+        # Section title
+        title = ctk.CTkLabel(
+            section_frame,
+            text="💾 History Storage",
+            font=ctk.CTkFont(size=16, weight="bold")
+        )
+        title.grid(row=0, column=0, columnspan=2, pady=(20, 15), sticky="w", padx=20)
+        
+        # Compact history records
+        self.compact_history_var = ctk.BooleanVar(value=self.settings.get("compact_history", False))
+        compact_check = ctk.CTkCheckBox(
+            section_frame,
+            text="Store compact history records",
+            variable=self.compact_history_var
+        )
+        compact_check.grid(row=1, column=0, columnspan=2, padx=20, pady=10, sticky="w")
+        
+        # Compact history info
+        compact_info = ctk.CTkLabel(
+            section_frame,
+            text="Saves only the seed and deaths; exercise details are rebuilt when you expand an entry",
+            font=ctk.CTkFont(size=12),
+            text_color="gray"
+        )
+        compact_info.grid(row=2, column=0, columnspan=2, padx=20, pady=(0, 15), sticky="w")
+        
+        # History retention
+        retention_label = ctk.CTkLabel(section_frame, text="Keep History (months):")
+        retention_label.grid(row=3, column=0, padx=(20, 10), pady=10, sticky="w")
+        
+        retention_months = self.settings.get("history_retention_months", 0)
+        self.retention_var = ctk.StringVar(value=str(retention_months) if retention_months else "forever")
+        retention_menu = ctk.CTkOptionMenu(
+            section_frame,
+            values=["forever", "3", "6", "12", "24"],
+            variable=self.retention_var,
+            width=150
+        )
+        retention_menu.grid(row=3, column=1, padx=10, pady=10, sticky="w")
+        
+        # Retention info
+        retention_info = ctk.CTkLabel(
+            section_frame,
+            text="Older months are deleted at startup; finished months are compressed in the background",
+            font=ctk.CTkFont(size=12),
+            text_color="gray"
+        )
+        retention_info.grid(row=4, column=0, columnspan=2, padx=20, pady=(0, 15), sticky="w")
+    
     def create_about_section(self, parent):
         """Create about section"""
         section_frame = ctk.CTkFrame(parent)
-        section_frame.grid(row=4, column=0, sticky="ew", padx=20, pady=10)
+        section_frame.grid(row=6, column=0, sticky="ew", padx=20, pady=10)
         section_frame.grid_columnconfigure(0, weight=1)
         
         # Section title
@@ -209,6 +315,11 @@ Version: 1.0.0
         self.settings["window_size"] = self.size_var.get()
         self.settings["auto_input_enabled"] = self.auto_input_var.get()
         self.settings["fitness_tracker_enabled"] = self.fitness_tracker_var.get()
+        self.settings["compact_history"] = self.compact_history_var.get()
+        self.settings["generation_mode"] = self.generation_mode_var.get()
+        self.settings["balance_window_days"] = int(self.balance_window_var.get())
+        retention = self.retention_var.get()
+        self.settings["history_retention_months"] = 0 if retention == "forever" else int(retention)
         
         # Save settings
         self.save_callback(self.settings)
@@ -3,6 +3,7 @@ Setup frame for GGOS
 """
 
 import customtkinter as ctk
+import math
 from typing import List, Callable
 import tkinter as tk
 from tkinter import messagebox
@@ -392,6 +393,7 @@ class SetupFrame(ctk.CTkFrame):
             self.selected_exercise.name = dialog.result["name"]
             self.selected_exercise.unit_type = dialog.result["unit_type"]
             self.selected_exercise.amount_per_death = dialog.result["amount"]
+            self.selected_exercise.weight = dialog.result["weight"]
             
             # Save and refresh
             self.save_callback(self.exercises)
@@ -505,7 +507,10 @@ class SetupFrame(ctk.CTkFrame):
             return
         
         for i, exercise in enumerate(self.exercises, 1):
-            line = f"{i}. {exercise.name} - {exercise.amount_per_death} {exercise.get_unit_display()} per death\n"
+            line = f"{i}. {exercise.name} - {exercise.amount_per_death} {exercise.get_unit_display()} per death"
+            if exercise.weight != 1.0:
+                line += f" (weight {exercise.weight:g})"
+            line += "\n"
             self.exercise_listbox.insert(tk.END, line)
     
     def update_exercises(self, exercises: List[Exercise]):
@@ -524,7 +529,7 @@ class EditExerciseDialog(ctk.CTkToplevel):
         self.result = None
         
         self.title("Edit Exercise")
-        self.geometry("400x300")
+        self.geometry("400x350")
         self.resizable(False, False)
         
         # Make dialog modal
@@ -594,6 +599,14 @@ class EditExerciseDialog(ctk.CTkToplevel):
         self.amount_entry.insert(0, str(self.exercise.amount_per_death))
         self.amount_entry.grid(row=2, column=1, padx=10, pady=10, sticky="w")
         
+        # Selection weight
+        weight_label = ctk.CTkLabel(form_frame, text="Selection Weight:")
+        weight_label.grid(row=3, column=0, padx=(20, 10), pady=10, sticky="w")
+        
+        self.weight_entry = ctk.CTkEntry(form_frame, width=100)
+        self.weight_entry.insert(0, f"{self.exercise.weight:g}")
+        self.weight_entry.grid(row=3, column=1, padx=10, pady=10, sticky="w")
+        
         # Buttons frame
         buttons_frame = ctk.CTkFrame(self)
         buttons_frame.grid(row=2, column=0, sticky="ew", padx=20, pady=20)
@@ -637,16 +650,23 @@ class EditExerciseDialog(ctk.CTkToplevel):
             
             unit_type = UnitType(self.unit_var.get())
             
+            weight_text = self.weight_entry.get().strip()
+            weight = float(weight_text) if weight_text else 1.0
+            if not math.isfinite(weight) or weight < 0:
+                messagebox.showwarning("Invalid Input", "Weight must be a non-negative number.")
+                return
+            
             self.result = {
                 "name": name,
                 "unit_type": unit_type,
-                "amount": amount
+                "amount": amount,
+                "weight": weight
             }
             
             self.destroy()
             
         except ValueError:
-            messagebox.showerror("Invalid Input", "Please enter a valid number for amount.")
+            messagebox.showerror("Invalid Input", "Please enter valid numbers for amount and weight.")
     
     def cancel(self):
         """Cancel the dialog"""
@@ -3,12 +3,12 @@ Workout frame for GGOS
 """
 
 import customtkinter as ctk
-from typing import List, Callable
+from typing import List, Callable, Dict, Optional
 import tkinter as tk
 from tkinter import messagebox
 
 from src.models.exercise import Exercise
-from src.models.workout import Workout
+from src.models.workout import Workout, WorkoutSession
 
 
 class WorkoutFrame(ctk.CTkFrame):
@@ -16,12 +16,18 @@ class WorkoutFrame(ctk.CTkFrame):
     
     def __init__(self, parent, exercises: List[Exercise], 
                  generate_callback: Callable[[int], Workout],
-                 save_callback: Callable[[Workout, int], None]):
+                 save_callback: Callable[[Workout, int], None],
+                 session_callback: Optional[Callable[[], WorkoutSession]] = None):
         super().__init__(parent)
         
         self.exercises = exercises
         self.generate_callback = generate_callback
         self.save_callback = save_callback
+        self.session_callback = session_callback
+        
+        # Live session state: exercise index -> line in the results text
+        self.session: Optional[WorkoutSession] = None
+        self.session_lines: Dict[int, int] = {}
         
         self.setup_ui()
     
@@ -86,6 +92,50 @@ class WorkoutFrame(ctk.CTkFrame):
         
         # Bind Enter key
         self.deaths_entry.bind("<Return>", lambda event: self.generate_workout())
+        
+        if self.session_callback is not None:
+            self.create_session_controls(input_frame)
+    
+    def create_session_controls(self, parent):
+        """Create the live session controls"""
+        session_label = ctk.CTkLabel(
+            parent,
+            text="Live Session:",
+            font=ctk.CTkFont(size=16, weight="bold")
+        )
+        session_label.grid(row=1, column=0, padx=(20, 10), pady=(0, 20), sticky="w")
+        
+        session_buttons = ctk.CTkFrame(parent, fg_color="transparent")
+        session_buttons.grid(row=1, column=1, columnspan=2, padx=10, pady=(0, 20), sticky="w")
+        
+        self.start_session_btn = ctk.CTkButton(
+            session_buttons,
+            text="Start Session",
+            command=self.start_session,
+            height=40,
+            width=120
+        )
+        self.start_session_btn.pack(side="left", padx=(0, 10))
+        
+        self.add_death_btn = ctk.CTkButton(
+            session_buttons,
+            text="+1 Death",
+            command=self.add_session_death,
+            height=40,
+            width=120,
+            state="disabled"
+        )
+        self.add_death_btn.pack(side="left", padx=(0, 10))
+        
+        self.end_session_btn = ctk.CTkButton(
+            session_buttons,
+            text="End Session",
+            command=self.end_session,
+            height=40,
+            width=120,
+            state="disabled"
+        )
+        self.end_session_btn.pack(side="left")
     
     def create_results_section(self, parent):
         """Create the results section"""
@@ -214,6 +264,86 @@ class WorkoutFrame(ctk.CTkFrame):
         
         self.results_text.insert(tk.END, summary)
     
+    def start_session(self):
+        """Start a live session that takes deaths as they happen"""
+        if not self.exercises:
+            messagebox.showwarning("No Exercises", "Please add some exercises in the Setup tab first.")
+            return
+        
+        try:
+            self.session = self.session_callback()
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred: {str(e)}")
+            return
+        
+        self.session_lines = {}
+        self.current_workout = None
+        self.current_deaths = 0
+        self.save_btn.configure(state="disabled")
+        self.generate_btn.configure(state="disabled")
+        self.start_session_btn.configure(state="disabled")
+        self.add_death_btn.configure(state="normal")
+        self.end_session_btn.configure(state="normal")
+        
+        # Header, blank line, (exercise lines), blank line, summary
+        self.results_text.delete("1.0", tk.END)
+        self.results_text.insert("1.0", self.get_session_header() + "\n\n\n" + self.get_session_summary() + "\n")
+    
+    def add_session_death(self):
+        """Add one death to the live session and redraw only what changed"""
+        if self.session is None:
+            return
+        
+        index = self.session.add_death()
+        line_text = f"  • {self.session.get_workout_exercise(index).get_display_text()}"
+        
+        if index in self.session_lines:
+            line = self.session_lines[index]
+            self.replace_line(line, line_text)
+        else:
+            # New exercises go after the ones already shown
+            line = 3 + len(self.session_lines)
+            self.results_text.insert(f"{line}.0", line_text + "\n")
+            self.session_lines[index] = line
+        
+        self.replace_line(1, self.get_session_header())
+        self.replace_line(4 + len(self.session_lines), self.get_session_summary())
+    
+    def end_session(self):
+        """End the live session and keep its workout for saving"""
+        if self.session is None:
+            return
+        
+        session = self.session
+        self.session = None
+        self.session_lines = {}
+        self.generate_btn.configure(state="normal")
+        self.start_session_btn.configure(state="normal")
+        self.add_death_btn.configure(state="disabled")
+        self.end_session_btn.configure(state="disabled")
+        
+        if session.deaths == 0:
+            self.results_text.delete("1.0", tk.END)
+            return
+        
+        self.current_workout = session.to_workout()
+        self.current_deaths = session.deaths
+        self.display_workout(self.current_workout)
+        self.save_btn.configure(state="normal")
+    
+    def get_session_header(self) -> str:
+        """Get the header line for the live session"""
+        return f"🎯 Live session: {self.session.deaths} deaths so far"
+    
+    def get_session_summary(self) -> str:
+        """Get the summary line for the live session"""
+        return f"📊 Summary: {self.session.get_summary()}"
+    
+    def replace_line(self, line: int, text: str):
+        """Replace the text of a single line in the results"""
+        self.results_text.delete(f"{line}.0", f"{line}.end")
+        self.results_text.insert(f"{line}.0", text)
+    
     def save_workout(self):
         """Save the current workout"""
         if self.current_workout and self.current_deaths > 0:
@@ -222,6 +352,8 @@ class WorkoutFrame(ctk.CTkFrame):
     
     def clear_results(self):
         """Clear the results and input"""
+        if self.session is not None:
+            self.end_session()
         self.results_text.delete("1.0", tk.END)
         self.deaths_entry.delete(0, tk.END)
         self.save_btn.configure(state="disabled")
@@ -0,0 +1,74 @@
+"""
+Windowed list model for GGOS's long scrolling views
+
+Kept free of Tk so the paging logic can be tested on its own.
+"""
+
+from typing import Any, Iterable, List
+
+
+class VirtualList:
+    """Entries pulled lazily from an iterable, of which only a window is shown
+    
+    The window [start, end) grows a page at a time at either edge as the
+    user scrolls, and is trimmed at the far edge once it holds more than
+    max_rendered entries. Entries are taken from the iterable only when
+    the window first reaches them.
+    """
+    
+    def __init__(self, entries: Iterable[Any], page_size: int = 20, max_rendered: int = 100):
+        """Create an empty window over entries"""
+        self.page_size = page_size
+        self.max_rendered = max(max_rendered, 2 * page_size)
+        self.start = 0
+        self.end = 0
+        self._source = iter(entries)
+        self._fetched: List[Any] = []
+        self._exhausted = False
+    
+    def __getitem__(self, index: int) -> Any:
+        self._fetch(index + 1)
+        return self._fetched[index]
+    
+    def is_empty(self) -> bool:
+        """Check whether there are no entries at all"""
+        self._fetch(1)
+        return not self._fetched
+    
+    def has_more(self) -> bool:
+        """Check whether there are entries after the window"""
+        self._fetch(self.end + 1)
+        return len(self._fetched) > self.end
+    
+    def extend_end(self) -> range:
+        """Add the next page after the window; returns the indexes added"""
+        self._fetch(self.end + self.page_size)
+        added = range(self.end, min(self.end + self.page_size, len(self._fetched)))
+        self.end = added.stop
+        return added
+    
+    def extend_start(self) -> range:
+        """Add the page before the window; returns the indexes added, in order"""
+        added = range(max(0, self.start - self.page_size), self.start)
+        self.start = added.start
+        return added
+    
+    def trim_start(self) -> range:
+        """Drop entries from the start of an oversized window; returns the indexes dropped"""
+        dropped = range(self.start, max(self.start, self.end - self.max_rendered))
+        self.start = dropped.stop
+        return dropped
+    
+    def trim_end(self) -> range:
+        """Drop entries from the end of an oversized window; returns the indexes dropped"""
+        dropped = range(min(self.end, self.start + self.max_rendered), self.end)
+        self.end = dropped.start
+        return dropped
+    
+    def _fetch(self, count: int):
+        """Pull entries from the source until there are count, or it runs out"""
+        while len(self._fetched) < count and not self._exhausted:
+            try:
+                self._fetched.append(next(self._source))
+            except StopIteration:
+                self._exhausted = True
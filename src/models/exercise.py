@@ -4,7 +4,10 @@ Exercise model for GGOS
 
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional
+from typing import List, Optional
+import hashlib
+import json
+import math
 
 
 class UnitType(Enum):
@@ -20,6 +23,7 @@ class Exercise:
     unit_type: UnitType
     amount_per_death: int
     id: Optional[str] = None
+    weight: float = 1.0
     
     def __post_init__(self):
         """Generate ID if not provided"""
@@ -41,15 +45,28 @@ class Exercise:
             'id': self.id,
             'name': self.name,
             'unit_type': self.unit_type.value,
-            'amount_per_death': self.amount_per_death
+            'amount_per_death': self.amount_per_death,
+            'weight': self.weight
         }
     
     @classmethod
     def from_dict(cls, data: dict) -> 'Exercise':
         """Create from dictionary"""
+        # A NaN or infinite weight saved before weights were validated counts as the default
+        weight = data.get('weight', 1.0)
+        if not math.isfinite(weight):
+            weight = 1.0
         return cls(
             id=data['id'],
             name=data['name'],
             unit_type=UnitType(data['unit_type']),
-            amount_per_death=data['amount_per_death']
+            amount_per_death=data['amount_per_death'],
+            weight=weight
         )
+
+
+def exercise_set_hash(exercises: List[Exercise]) -> str:
+    """Get a content hash identifying an exercise configuration"""
+    data = [exercise.to_dict() for exercise in exercises]
+    payload = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,66 @@
+"""
+Weighted sampling helpers for GGOS
+"""
+
+import math
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+
+class AliasTable:
+    """Walker's alias table for O(1) weighted draws after an O(n) build"""
+    
+    def __init__(self, weights: Sequence[float]):
+        """Build the table with Vose's method"""
+        count = len(weights)
+        if count == 0:
+            raise ValueError("cannot build an alias table from no weights")
+        if not all(math.isfinite(weight) for weight in weights):
+            raise ValueError("cannot build an alias table from non-finite weights")
+        
+        total = float(sum(weights))
+        if total <= 0:
+            # Nothing is preferred, so fall back to uniform picks
+            weights = [1.0] * count
+            total = float(count)
+        
+        self.probabilities: List[float] = [0.0] * count
+        self.aliases: List[int] = [0] * count
+        
+        scaled = [weight * count / total for weight in weights]
+        small = [index for index, value in enumerate(scaled) if value < 1.0]
+        large = [index for index, value in enumerate(scaled) if value >= 1.0]
+        
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            
+            # The large column donates what the small one was missing
+            scaled[more] = (scaled[more] + scaled[less]) - 1.0
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        
+        # Whatever is left is full up to rounding error
+        for index in large + small:
+            self.probabilities[index] = 1.0
+            self.aliases[index] = index
+    
+    def __len__(self) -> int:
+        return len(self.probabilities)
+    
+    def sample(self, rng) -> int:
+        """Draw one index in O(1)"""
+        column = rng.randrange(len(self.probabilities))
+        if rng.random() < self.probabilities[column]:
+            return column
+        return self.aliases[column]
+
+
+@lru_cache(maxsize=8)
+def get_alias_table(weights: Tuple[float, ...]) -> AliasTable:
+    """Get the alias table for a weight vector, reusing recent builds"""
+    return AliasTable(weights)
@@ -2,10 +2,18 @@
 Workout model for GGOS
 """
 
-from dataclasses import dataclass
-from typing import List, Dict
+from dataclasses import dataclass, field
+from typing import List, Dict, Iterator, Optional, Sequence
+import hashlib
+import math
 import random
-from src.models.exercise import Exercise
+from src.models.exercise import Exercise, UnitType, exercise_set_hash
+from src.models.sampling import get_alias_table
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch generation falls back to pure Python
+    np = None
 
 
 @dataclass
@@ -22,84 +30,502 @@ class WorkoutExercise:
 
 @dataclass
 class Workout:
-    """Represents a complete workout session"""
+    """Represents a complete workout session
+    
+    Reps/seconds totals and the unit-type grouping are kept up to date as
+    exercises are added, so reading them is O(1). Add exercises with
+    add_exercise rather than appending to exercises directly.
+    """
     exercises: List[WorkoutExercise]
     total_deaths: int
+    seed: Optional[int] = None
+    exercise_set: Optional[str] = None
+    weights: Optional[List[float]] = None
+    reps_total: int = field(default=0, init=False, compare=False)
+    seconds_total: int = field(default=0, init=False, compare=False)
+    _by_unit_type: Dict[str, List[WorkoutExercise]] = field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    
+    def __post_init__(self):
+        """Compute the running totals for the initial exercises"""
+        self._by_unit_type = {"reps": [], "seconds": []}
+        for workout_exercise in self.exercises:
+            self._track(workout_exercise)
+    
+    def add_exercise(self, workout_exercise: WorkoutExercise):
+        """Add an exercise and update the running totals"""
+        self.exercises.append(workout_exercise)
+        self._track(workout_exercise)
     
     def get_summary(self) -> str:
         """Get summary of the workout"""
-        reps_total = 0
-        seconds_total = 0
+        return _format_summary(self.reps_total, self.seconds_total)
+    
+    def get_exercises_by_unit_type(self) -> Dict[str, List[WorkoutExercise]]:
+        """Group exercises by unit type (shared, do not modify)"""
+        return self._by_unit_type
+    
+    def _track(self, workout_exercise: WorkoutExercise):
+        """Fold one exercise into the running totals"""
+        if workout_exercise.exercise.unit_type is UnitType.REPS:
+            self.reps_total += workout_exercise.allocated_amount
+            self._by_unit_type["reps"].append(workout_exercise)
+        else:  # seconds
+            self.seconds_total += workout_exercise.allocated_amount
+            self._by_unit_type["seconds"].append(workout_exercise)
+    
+    def aggregated(self) -> 'Workout':
+        """Merge exercises that appear more than once into a single entry.
         
+        Entries are merged by Exercise.id and keep the order in which each
+        exercise first appears.
+        """
+        merged: Dict[str, WorkoutExercise] = {}
         for workout_exercise in self.exercises:
-            if workout_exercise.exercise.unit_type.value == "reps":
-                reps_total += workout_exercise.allocated_amount
-            else:  # seconds
-                seconds_total += workout_exercise.allocated_amount
+            exercise_id = workout_exercise.exercise.id
+            if exercise_id in merged:
+                existing = merged[exercise_id]
+                existing.allocated_amount += workout_exercise.allocated_amount
+                existing.deaths_allocated += workout_exercise.deaths_allocated
+            else:
+                merged[exercise_id] = WorkoutExercise(
+                    exercise=workout_exercise.exercise,
+                    allocated_amount=workout_exercise.allocated_amount,
+                    deaths_allocated=workout_exercise.deaths_allocated
+                )
+        
+        return Workout(
+            exercises=list(merged.values()),
+            total_deaths=self.total_deaths,
+            seed=self.seed,
+            exercise_set=self.exercise_set,
+            weights=self.weights
+        )
+
+
+class WorkoutBatch:
+    """A deck of workouts held as a workouts x exercises allocation matrix
+    
+    Workout objects are only built when an entry is accessed, so a batch of
+    thousands of workouts costs one integer matrix until it is read.
+    """
+    
+    def __init__(self, exercises: List[Exercise], deaths: Sequence[int], allocations):
+        self.exercises = list(exercises)
+        self.deaths = deaths
+        self.allocations = allocations
+    
+    def __len__(self) -> int:
+        return len(self.deaths)
+    
+    def __getitem__(self, index: int) -> Workout:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("workout batch index out of range")
         
-        summary_parts = []
-        if reps_total > 0:
-            summary_parts.append(f"{reps_total} reps")
-        if seconds_total > 0:
-            summary_parts.append(f"{seconds_total} seconds")
+        deaths = int(self.deaths[index])
+        row = self.allocations[index]
         
-        return " + ".join(summary_parts) if summary_parts else "No exercises"
+        workout_exercises = []
+        total_deaths = 0
+        for exercise, allocation in zip(self.exercises, row):
+            allocation = int(allocation)
+            if allocation <= 0:
+                continue
+            workout_exercises.append(WorkoutExercise(
+                exercise=exercise,
+                allocated_amount=exercise.amount_per_death * allocation,
+                deaths_allocated=allocation
+            ))
+            total_deaths += allocation
+        
+        if not workout_exercises:
+            return Workout(exercises=[], total_deaths=deaths)
+        return Workout(exercises=workout_exercises, total_deaths=total_deaths)
     
-    def get_exercises_by_unit_type(self) -> Dict[str, List[WorkoutExercise]]:
-        """Group exercises by unit type"""
-        grouped = {"reps": [], "seconds": []}
-        for workout_exercise in self.exercises:
-            unit_type = workout_exercise.exercise.unit_type.value
-            grouped[unit_type].append(workout_exercise)
-        return grouped
+    def __iter__(self) -> Iterator[Workout]:
+        for index in range(len(self)):
+            yield self[index]
 
 
 class WorkoutGenerator:
-    """Generates randomized workouts based on exercises and deaths"""
+    """Generates randomized workouts based on exercises and deaths
+    
+    Static methods use the module-level random state unless given an rng.
+    Instances own a seeded stream and stamp each workout with the seed it
+    was drawn from (see regenerate); give each thread its own via spawn().
+    """
+    
+    def __init__(self, seed: Optional[int] = None):
+        """Initialize a generator with its own random stream"""
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(64)
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._spawned = 0
+    
+    def next_seed(self) -> int:
+        """Draw the seed for the next workout from this generator's stream"""
+        return self._rng.getrandbits(64)
+    
+    def generate(self, exercises: List[Exercise], deaths: int, aggregate: bool = True,
+                 weights: Optional[List[float]] = None) -> Workout:
+        """Generate a workout from this generator's stream and record its seed"""
+        return WorkoutGenerator.regenerate(exercises, deaths, self.next_seed(), aggregate, weights)
+    
+    def start_session(self, exercises: List[Exercise],
+                      weights: Optional[List[float]] = None) -> 'WorkoutSession':
+        """Start a live session that draws from a fresh seed of this stream"""
+        return WorkoutSession(exercises, rng=random.Random(self.next_seed()), weights=weights)
+    
+    def spawn(self, count: int) -> List['WorkoutGenerator']:
+        """Create independent child generators, e.g. one per worker thread
+        
+        Child seeds are derived by hashing this generator's seed with a
+        running spawn index, so they are reproducible and do not overlap
+        with the parent stream or with each other.
+        """
+        children = []
+        for _ in range(count):
+            children.append(WorkoutGenerator(_derive_seed(self.seed, self._spawned)))
+            self._spawned += 1
+        return children
     
     @staticmethod
-    def generate_workout(exercises: List[Exercise], deaths: int) -> Workout:
-        """Generate a randomized workout"""
-        if not exercises or deaths <= 0:
-            return Workout(exercises=[], total_deaths=deaths)
+    def regenerate(exercises: List[Exercise], deaths: int, seed: int, aggregate: bool = True,
+                   weights: Optional[List[float]] = None) -> Workout:
+        """Rebuild the exact workout generated from a recorded seed (and weights)"""
+        workout = WorkoutGenerator.generate_workout(
+            exercises, deaths, rng=random.Random(seed), aggregate=aggregate, weights=weights
+        )
+        workout.seed = seed
+        workout.exercise_set = exercise_set_hash(exercises)
+        workout.weights = weights
+        return workout
+    
+    @staticmethod
+    def balance_weights(exercises: List[Exercise], recent_volume: Dict[str, int]) -> List[float]:
+        """Get selection weights biased toward the least recently trained exercises
         
-        # Calculate total amount for each exercise
-        exercise_totals = {}
+        recent_volume maps exercise id (or name, for older records) to deaths
+        spent on it recently. Each exercise's own weight is scaled down the
+        further its recent volume is above the average.
+        """
+        volumes = []
         for exercise in exercises:
-            exercise_totals[exercise.id] = exercise.calculate_total(deaths)
+            volume = recent_volume.get(exercise.id, 0)
+            if exercise.name != exercise.id:
+                volume += recent_volume.get(exercise.name, 0)
+            volumes.append(volume)
+        average = sum(volumes) / len(volumes) if volumes else 0
+        if average <= 0:
+            return [exercise.weight for exercise in exercises]
         
-        # Randomly distribute deaths among exercises
-        workout_exercises = []
+        return [
+            exercise.weight / (1.0 + volume / average)
+            for exercise, volume in zip(exercises, volumes)
+        ]
+    
+    @staticmethod
+    def allocate_deaths(deaths: int, count: int, rng=None,
+                        weights: Optional[Sequence[float]] = None) -> List[int]:
+        """Split deaths among count exercises in one multinomial draw.
+        
+        Each death lands on a random exercise, with chances proportional
+        to weights (uniform if omitted), but the split is drawn as a chain
+        of conditional binomials, so the cost depends on the number of
+        exercises rather than the number of deaths. The returned counts
+        always sum to deaths.
+        """
+        if rng is None:
+            rng = random
+        if weights is not None and not all(math.isfinite(weight) for weight in weights):
+            raise ValueError("exercise weights must be finite")
+        if weights is None or sum(weights) <= 0:
+            weights = [1.0] * count
+        
+        # Weight still ahead of each exercise, summed from the back so the
+        # last exercise with any weight always gets probability 1
+        remaining_weights = [0.0] * count
+        running_total = 0.0
+        for index in range(count - 1, -1, -1):
+            running_total += weights[index]
+            remaining_weights[index] = running_total
+        
+        counts = [0] * count
         remaining_deaths = deaths
-        available_exercises = exercises.copy()
         
-        while remaining_deaths > 0 and available_exercises:
-            # Randomly select an exercise
-            exercise = random.choice(available_exercises)
+        for index in range(count - 1):
+            if remaining_deaths <= 0:
+                break
+            if weights[index] <= 0:
+                continue
             
-            # Randomly allocate 1-3 deaths to this exercise (or remaining deaths if less)
-            max_allocation = min(3, remaining_deaths)
-            allocation = random.randint(1, max_allocation)
-            
-            # Calculate allocated amount
-            allocated_amount = exercise.amount_per_death * allocation
+            # Probability of landing here given it did not land earlier
+            allocation = _binomial(rng, remaining_deaths, weights[index] / remaining_weights[index])
+            counts[index] = allocation
+            remaining_deaths -= allocation
+        
+        if count > 0:
+            counts[-1] += remaining_deaths
+        return counts
+    
+    @staticmethod
+    def generate_workout(exercises: List[Exercise], deaths: int, rng=None,
+                         aggregate: bool = True,
+                         weights: Optional[Sequence[float]] = None) -> Workout:
+        """Generate a randomized workout
+        
+        Exercises are chosen in proportion to their weight, or to weights
+        if given (one per exercise). By default each
+        exercise appears at most once. Pass aggregate=False to get the
+        classic layout of small 1-3 death picks in random order; that
+        layout has one entry per pick and so grows with deaths.
+        """
+        if not exercises or deaths <= 0:
+            return Workout(exercises=[], total_deaths=deaths)
+        
+        if rng is None:
+            rng = random
+        
+        if weights is None:
+            weights = [exercise.weight for exercise in exercises]
+        if not aggregate:
+            return WorkoutGenerator._generate_picks(exercises, deaths, weights, rng)
+        
+        # Distribute every death among the exercises in one shot
+        allocations = WorkoutGenerator.allocate_deaths(deaths, len(exercises), rng, weights)
+        
+        workout_exercises = []
+        for exercise, allocation in zip(exercises, allocations):
+            if allocation <= 0:
+                continue
             
-            # Create workout exercise
             workout_exercise = WorkoutExercise(
                 exercise=exercise,
-                allocated_amount=allocated_amount,
+                allocated_amount=exercise.amount_per_death * allocation,
                 deaths_allocated=allocation
             )
             workout_exercises.append(workout_exercise)
-            
-            # Update remaining deaths
+        
+        return Workout(
+            exercises=workout_exercises,
+            total_deaths=sum(allocations)
+        )
+    
+    @staticmethod
+    def generate_batch(exercises: List[Exercise], deaths_array: Sequence[int],
+                       seed: Optional[int] = None) -> WorkoutBatch:
+        """Generate one workout per entry of deaths_array in a single call
+        
+        With NumPy installed all allocations are drawn in one vectorized
+        multinomial call; otherwise each row uses allocate_deaths. The two
+        paths give different (but equally distributed) results for a seed.
+        """
+        count = len(exercises)
+        
+        if np is not None:
+            deaths = np.maximum(np.asarray(deaths_array, dtype=np.int64), 0)
+            if count == 0:
+                allocations = np.zeros((len(deaths), 0), dtype=np.int64)
+            else:
+                weights = np.asarray([exercise.weight for exercise in exercises], dtype=np.float64)
+                if not np.isfinite(weights).all():
+                    raise ValueError("exercise weights must be finite")
+                if weights.sum() <= 0:
+                    weights = np.ones(count)
+                generator = np.random.default_rng(seed)
+                allocations = generator.multinomial(deaths, weights / weights.sum())
+            return WorkoutBatch(exercises, np.asarray(deaths_array, dtype=np.int64), allocations)
+        
+        rng = random.Random(seed)
+        deaths = list(deaths_array)
+        weights = [exercise.weight for exercise in exercises]
+        allocations = [
+            WorkoutGenerator.allocate_deaths(max(row_deaths, 0), count, rng, weights)
+            for row_deaths in deaths
+        ]
+        return WorkoutBatch(exercises, deaths, allocations)
+    
+    @staticmethod
+    def _generate_picks(exercises: List[Exercise], deaths: int,
+                        weights: List[float], rng) -> Workout:
+        """Hand out deaths in random picks of 1-3, one weighted draw per pick"""
+        sampler = get_alias_table(tuple(weights))
+        
+        workout_exercises = []
+        remaining_deaths = deaths
+        while remaining_deaths > 0:
+            exercise = exercises[sampler.sample(rng)]
+            allocation = rng.randint(1, min(3, remaining_deaths))
+            workout_exercises.append(WorkoutExercise(
+                exercise=exercise,
+                allocated_amount=exercise.amount_per_death * allocation,
+                deaths_allocated=allocation
+            ))
             remaining_deaths -= allocation
-            
-            # Remove exercise if all its potential deaths are used
-            if allocation >= exercise.amount_per_death * 3:  # Max allocation reached
-                available_exercises.remove(exercise)
         
+        return Workout(exercises=workout_exercises, total_deaths=deaths)
+
+class WorkoutSession:
+    """A live workout that grows one death at a time during a match
+    
+    Each death is assigned with a single alias-table draw, and the per
+    exercise allocation and summary totals are updated in place, so adding
+    a death costs O(1) no matter how long the session has run.
+    """
+    
+    def __init__(self, exercises: List[Exercise], rng=None,
+                 weights: Optional[Sequence[float]] = None):
+        """Start an empty session over the given exercises"""
+        if not exercises:
+            raise ValueError("a workout session needs at least one exercise")
+        
+        self.exercises = list(exercises)
+        self.weights = list(weights) if weights is not None else [e.weight for e in self.exercises]
+        self._rng = rng if rng is not None else random.Random()
+        self._sampler = get_alias_table(tuple(self.weights))
+        
+        self.deaths = 0
+        self.deaths_allocated = [0] * len(self.exercises)
+        self.reps_total = 0
+        self.seconds_total = 0
+    
+    def add_death(self) -> int:
+        """Assign one death and return the index of the exercise it went to"""
+        index = self._sampler.sample(self._rng)
+        self._allocate(index, 1)
+        return index
+    
+    def add_deaths(self, count: int) -> List[int]:
+        """Assign several deaths and return the indices of exercises that changed
+        
+        Small batches are drawn death by death; larger ones use a single
+        multinomial split, so the cost is O(min(count, exercises)).
+        """
+        if count <= 0:
+            return []
+        if count <= len(self.exercises):
+            return sorted({self.add_death() for _ in range(count)})
+        
+        allocations = WorkoutGenerator.allocate_deaths(count, len(self.exercises), self._rng, self.weights)
+        changed = []
+        for index, allocation in enumerate(allocations):
+            if allocation > 0:
+                self._allocate(index, allocation)
+                changed.append(index)
+        return changed
+    
+    def get_workout_exercise(self, index: int) -> WorkoutExercise:
+        """Get the current entry for one exercise"""
+        exercise = self.exercises[index]
+        allocation = self.deaths_allocated[index]
+        return WorkoutExercise(
+            exercise=exercise,
+            allocated_amount=exercise.amount_per_death * allocation,
+            deaths_allocated=allocation
+        )
+    
+    def get_summary(self) -> str:
+        """Get summary of the session so far"""
+        return _format_summary(self.reps_total, self.seconds_total)
+    
+    def to_workout(self) -> Workout:
+        """Get the session as a regular, aggregated workout"""
+        workout_exercises = [
+            self.get_workout_exercise(index)
+            for index, allocation in enumerate(self.deaths_allocated)
+            if allocation > 0
+        ]
         return Workout(
             exercises=workout_exercises,
-            total_deaths=deaths - remaining_deaths
+            total_deaths=self.deaths,
+            exercise_set=exercise_set_hash(self.exercises)
         )
+    
+    def _allocate(self, index: int, deaths: int):
+        """Add deaths to one exercise and keep the totals in step"""
+        exercise = self.exercises[index]
+        amount = exercise.amount_per_death * deaths
+        
+        self.deaths += deaths
+        self.deaths_allocated[index] += deaths
+        if exercise.unit_type is UnitType.REPS:
+            self.reps_total += amount
+        else:  # seconds
+            self.seconds_total += amount
+
+
+def _format_summary(reps_total: int, seconds_total: int) -> str:
+    """Format reps and seconds totals as a workout summary"""
+    summary_parts = []
+    if reps_total > 0:
+        summary_parts.append(f"{reps_total} reps")
+    if seconds_total > 0:
+        summary_parts.append(f"{seconds_total} seconds")
+    
+    return " + ".join(summary_parts) if summary_parts else "No exercises"
+
+
+def _derive_seed(seed: int, index: int) -> int:
+    """Derive a child seed from a parent seed and a spawn index"""
+    digest = hashlib.blake2b(f"{seed}:{index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _binomial(rng, n: int, p: float) -> int:
+    """Draw from Binomial(n, p) in O(1) expected time.
+    
+    Uses geometric waiting times for small means and Hormann's BTRS
+    transformed rejection sampler otherwise.
+    """
+    if n <= 0 or p <= 0.0:
+        return 0
+    if p >= 1.0:
+        return n
+    if p > 0.5:
+        return n - _binomial(rng, n, 1.0 - p)
+    
+    if n * p < 10.0:
+        # Count successes by skipping ahead over the failures in between
+        successes = 0
+        position = 0
+        # log1p keeps tiny p from rounding to log(1) == 0
+        log_q = math.log1p(-p)
+        while True:
+            skip = math.log(1.0 - rng.random()) / log_q
+            if skip >= n - position:
+                return successes
+            position += math.floor(skip) + 1
+            successes += 1
+    
+    spq = math.sqrt(n * p * (1.0 - p))
+    b = 1.15 + 2.53 * spq
+    a = -0.0873 + 0.0248 * b + 0.01 * p
+    c = n * p + 0.5
+    v_r = 0.92 - 4.2 / b
+    
+    alpha = (2.83 + 5.1 / b) * spq
+    lpq = math.log(p / (1.0 - p))
+    mode = math.floor((n + 1) * p)
+    h = math.lgamma(mode + 1) + math.lgamma(n - mode + 1)
+    
+    while True:
+        u = rng.random() - 0.5
+        us = 0.5 - abs(u)
+        if us <= 0.0:
+            continue
+        k = math.floor((2.0 * a / us + b) * u + c)
+        if k < 0 or k > n:
+            continue
+        
+        # Cheap squeeze test accepts most candidates
+        v = rng.random()
+        if us >= 0.07 and v <= v_r:
+            return k
+        
+        v *= alpha / (a / (us * us) + b)
+        if v > 0.0 and math.log(v) <= h - math.lgamma(k + 1) - math.lgamma(n - k + 1) + (k - mode) * lpq:
+            return k
@@ -0,0 +1,43 @@
+"""
+Crash-safe file writes for GGOS
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+
+def write_text_atomic(path: Path, text: str):
+    """Replace a file's contents so a crash leaves either the old or the new file
+    
+    The text goes to a temporary file in the same directory, is fsynced,
+    and is then renamed over the target.
+    """
+    path = Path(path)
+    fd, temp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_name, path)
+    except BaseException:
+        try:
+            os.unlink(temp_name)
+        except OSError:
+            pass
+        raise
+    
+    fsync_directory(path.parent)
+
+
+def fsync_directory(directory: Path):
+    """Make a rename in a directory durable, where the platform allows it"""
+    if os.name != 'posix':
+        return
+    
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
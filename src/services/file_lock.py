@@ -0,0 +1,58 @@
+"""
+Cross-process file locking for GGOS
+
+Several GGOS windows, or the app and a script, may share one data
+directory. Writers take an exclusive advisory lock on a lock file for the
+few milliseconds a write takes, so they never interleave.
+"""
+
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path: Path):
+    """Hold an exclusive lock on a lock file for the duration of the block
+    
+    The lock file is opened anew each time, so threads of one process
+    exclude each other as well as other processes. The lock is not
+    reentrant.
+    """
+    with open(path, 'a+b') as f:
+        _lock(f)
+        try:
+            yield
+        finally:
+            _unlock(f)
+
+
+def _lock(f):
+    """Wait for and take the lock on an open lock file"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    
+    f.seek(0)
+    while True:
+        try:
+            # LK_LOCK gives up after ten one-second tries, so keep trying
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            time.sleep(0.01)
+
+
+def _unlock(f):
+    """Release the lock on an open lock file"""
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
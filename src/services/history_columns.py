@@ -0,0 +1,288 @@
+"""
+Columnar in-memory workout history for GGOS
+
+HistoryColumns holds history records column by column instead of as
+dictionaries: epoch timestamps, deaths, reps and seconds in typed arrays,
+and exercise names as ids into one list of names. Filters, totals,
+percentiles and statistics run over the arrays, with NumPy if it is
+installed. The full records are kept as compact JSON, compressed a block
+at a time, and are decoded only when one is looked up for display.
+"""
+
+import json
+import math
+import zlib
+from array import array
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+from src.services.history_index import PossibleNames, entry_names
+from src.services.history_stats import HistoryStats, record_units
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the columns are then scanned in pure Python
+    np = None
+
+
+# Numeric columns, by the name aggregates refer to them
+COLUMNS = ("time", "deaths", "reps", "seconds")
+
+# Records compressed together; looking one up decompresses its whole block
+BLOCK_ROWS = 64
+
+
+class HistoryColumns(Sequence):
+    """History records stored as typed columns plus compressed rows, oldest first
+    
+    A record costs about a tenth of its dictionary form: four 8-byte
+    column values, a 4-byte id per exercise, and its share of a
+    compressed block. Indexing returns a freshly decoded dictionary, so
+    changing it does not change the stored record.
+    """
+    
+    def __init__(self, records: Iterable[Dict[str, Any]] = (),
+                 exercise_names: Optional[Callable[[Dict[str, Any]], Iterable[str]]] = None,
+                 resolve_names: Optional[Callable[[Dict[str, Any]], Iterable[str]]] = None):
+        """Store records, oldest first
+        
+        exercise_names gets a record's exercise names; without it the
+        names in its exercise entries are used. If it returns
+        PossibleNames, resolve_names gets the record's actual names, but
+        only once an exercise filter has matched the record on everything
+        else.
+        """
+        self.exercise_names = exercise_names or entry_names
+        self.resolve_names = resolve_names
+        self._columns: Dict[str, array] = {
+            "time": array('d'), "deaths": array('q'), "reps": array('q'), "seconds": array('q')
+        }
+        
+        # Exercise ids of record i are _exercise_ids[_exercise_starts[i]:_exercise_starts[i + 1]]
+        self._exercise_starts = array('Q', [0])
+        self._exercise_ids = array('I')
+        self._names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        
+        # Positions stored with possible names -> their actual lowercase names, once resolved
+        self._unresolved: Dict[int, Optional[set]] = {}
+        
+        # Compressed full blocks, and the rows of the block still being filled
+        self._blocks: List[bytes] = []
+        self._pending: List[bytes] = []
+        self._cached_block = -1
+        self._cached_rows: List[bytes] = []
+        
+        self.extend(records)
+    
+    def __len__(self) -> int:
+        return len(self._columns["deaths"])
+    
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history record index out of range")
+        
+        block, row = divmod(index, BLOCK_ROWS)
+        if block == len(self._blocks):
+            return json.loads(self._pending[row])
+        if block != self._cached_block:
+            # Reading in order, forwards or backwards, decompresses each block once
+            self._cached_rows = zlib.decompress(self._blocks[block]).split(b"\n")
+            self._cached_block = block
+        return json.loads(self._cached_rows[row])
+    
+    def append(self, record: Dict[str, Any]):
+        """Add a record after the others"""
+        names = self.exercise_names(record)
+        if isinstance(names, PossibleNames) and self.resolve_names is not None:
+            self._unresolved[len(self)] = None
+        
+        reps, seconds = record_units(record)
+        self._columns["time"].append(_epoch(record.get("timestamp")))
+        self._columns["deaths"].append(record.get("deaths", 0))
+        self._columns["reps"].append(reps)
+        self._columns["seconds"].append(seconds)
+        
+        for name in dict.fromkeys(names):
+            name_id = self._name_ids.get(name)
+            if name_id is None:
+                name_id = self._name_ids[name] = len(self._names)
+                self._names.append(name)
+            self._exercise_ids.append(name_id)
+        self._exercise_starts.append(len(self._exercise_ids))
+        
+        self._pending.append(json.dumps(record, separators=(",", ":")).encode('utf-8'))
+        if len(self._pending) == BLOCK_ROWS:
+            self._blocks.append(zlib.compress(b"\n".join(self._pending)))
+            self._pending = []
+    
+    def extend(self, records: Iterable[Dict[str, Any]]):
+        """Add records after the others, in order"""
+        for record in records:
+            self.append(record)
+    
+    def exercises(self) -> List[str]:
+        """Get every exercise name in the records, sorted"""
+        return sorted(self._names, key=str.lower)
+    
+    def select(self, since: Optional[str] = None, until: Optional[str] = None,
+               min_deaths: Optional[int] = None, max_deaths: Optional[int] = None,
+               exercise: Optional[str] = None, limit: Optional[int] = None) -> List[int]:
+        """Get the positions of the records matching every given filter, oldest first
+        
+        since/until are ISO timestamps (until is exclusive) and exercise is
+        an exercise name, in any case. Records whose timestamp is not a
+        date never match a time filter. limit keeps only the last matches.
+        """
+        positions = self._select(since, until, min_deaths, max_deaths, exercise)
+        if exercise is not None and self._unresolved:
+            return self._confirm(positions, exercise.lower(), limit)
+        if limit is not None:
+            return positions[max(0, len(positions) - limit):]
+        return positions
+    
+    def total(self, name: str, positions: Optional[List[int]] = None) -> Union[int, float]:
+        """Sum a column (one of COLUMNS) over every record, or those at positions"""
+        values = self._values(name, positions)
+        if np is not None:
+            return values.sum().item()
+        return sum(values)
+    
+    def percentile(self, name: str, q: float, positions: Optional[List[int]] = None) -> Optional[float]:
+        """Get the q-th percentile (0-100) of a column, interpolating between values
+        
+        Only records at positions count if they are given. Returns None if
+        there are no values.
+        """
+        values = self._values(name, positions)
+        if not len(values):
+            return None
+        if np is not None:
+            return float(np.percentile(values, q))
+        
+        values = sorted(values)
+        rank = (len(values) - 1) * q / 100
+        lower = math.floor(rank)
+        upper = min(lower + 1, len(values) - 1)
+        return float(values[lower] + (values[upper] - values[lower]) * (rank - lower))
+    
+    def stats(self, positions: Optional[List[int]] = None) -> HistoryStats:
+        """Get the workout, deaths, reps and seconds statistics of every record, or those at positions
+        
+        Per-exercise totals are left empty.
+        """
+        values = self._values("deaths", positions)
+        count = len(values)
+        deaths = self.total("deaths", positions)
+        mean = deaths / count if count else 0.0
+        if not count:
+            low = high = None
+            m2 = 0.0
+        elif np is not None:
+            low, high = values.min().item(), values.max().item()
+            m2 = float(((values - mean) ** 2).sum())
+        else:
+            low, high = min(values), max(values)
+            m2 = sum((value - mean) ** 2 for value in values)
+        
+        return HistoryStats.from_dict({
+            "count": count, "deaths": deaths, "min_deaths": low, "max_deaths": high, "mean": mean, "m2": m2,
+            "units": {"reps": self.total("reps", positions), "seconds": self.total("seconds", positions)},
+            "exercises": {}
+        })
+    
+    def _select(self, since: Optional[str], until: Optional[str], min_deaths: Optional[int],
+                max_deaths: Optional[int], exercise: Optional[str]) -> List[int]:
+        """select() by the columns alone, counting possible names as matches"""
+        low = _epoch(since) if since is not None else None
+        high = _epoch(until) if until is not None else None
+        name_ids = None
+        if exercise is not None:
+            name_ids = {name_id for name, name_id in self._name_ids.items() if name.lower() == exercise.lower()}
+            if not name_ids:
+                return []
+        
+        if np is not None:
+            return self._select_numpy(low, high, min_deaths, max_deaths, name_ids)
+        
+        times = self._columns["time"]
+        deaths = self._columns["deaths"]
+        starts = self._exercise_starts
+        ids = self._exercise_ids
+        return [
+            index for index in range(len(self))
+            if (low is None or times[index] >= low) and (high is None or times[index] < high)
+            and (min_deaths is None or deaths[index] >= min_deaths)
+            and (max_deaths is None or deaths[index] <= max_deaths)
+            and (name_ids is None or not name_ids.isdisjoint(ids[starts[index]:starts[index + 1]]))
+        ]
+    
+    def _view(self, name: str):
+        """View a column as a NumPy array without copying it"""
+        values = self._columns[name]
+        return np.frombuffer(values, dtype=np.float64 if values.typecode == 'd' else np.int64)
+    
+    def _values(self, name: str, positions: Optional[List[int]]):
+        """Get a column's values, or those at positions, as a NumPy array if NumPy is installed"""
+        if np is not None:
+            values = self._view(name)
+            return values if positions is None else values[np.asarray(positions, dtype=np.int64)]
+        column = self._columns[name]
+        return column if positions is None else [column[index] for index in positions]
+    
+    def _confirm(self, positions: List[int], key: str, limit: Optional[int]) -> List[int]:
+        """Drop records matched only by a possible name, resolving them from the last back"""
+        confirmed = []
+        for position in reversed(positions):
+            if position in self._unresolved:
+                names = self._unresolved[position]
+                if names is None:
+                    names = self._unresolved[position] = {name.lower() for name in self.resolve_names(self[position])}
+                if key not in names:
+                    continue
+            confirmed.append(position)
+            if limit is not None and len(confirmed) >= limit:
+                break
+        confirmed.reverse()
+        return confirmed
+    
+    def _select_numpy(self, low: Optional[float], high: Optional[float], min_deaths: Optional[int],
+                      max_deaths: Optional[int], name_ids: Optional[set]) -> List[int]:
+        """select() as whole-column comparisons"""
+        mask = np.ones(len(self), dtype=bool)
+        times = self._view("time")
+        deaths = self._view("deaths")
+        if low is not None:
+            mask &= times >= low
+        if high is not None:
+            mask &= times < high
+        if min_deaths is not None:
+            mask &= deaths >= min_deaths
+        if max_deaths is not None:
+            mask &= deaths <= max_deaths
+        
+        if name_ids is not None:
+            # The record each matching id belongs to, found from the start offsets
+            ids = np.frombuffer(self._exercise_ids, dtype=np.uint32)
+            matching = np.zeros(len(ids), dtype=bool)
+            for name_id in name_ids:
+                matching |= ids == name_id
+            hits = np.flatnonzero(matching)
+            starts = np.frombuffer(self._exercise_starts, dtype=np.int64)
+            has_exercise = np.zeros(len(self), dtype=bool)
+            has_exercise[np.searchsorted(starts, hits, side='right') - 1] = True
+            mask &= has_exercise
+        return np.flatnonzero(mask).tolist()
+
+
+def _epoch(timestamp: Optional[str]) -> float:
+    """Convert an ISO timestamp to epoch seconds, or NaN if it is not one"""
+    try:
+        return datetime.fromisoformat(str(timestamp).replace('Z', '+00:00')).timestamp()
+    except (ValueError, OverflowError, OSError):
+        return math.nan
@@ -0,0 +1,200 @@
+"""
+In-memory history indexes for GGOS
+
+HistoryIndex answers combined filters, such as "the last 30 days, at least
+15 deaths, included Burpees", from sorted indexes instead of rescanning
+the history.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Sequence
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+
+class PossibleNames(list):
+    """Exercise names a record may include, returned by exercise_names when finding the actual ones is costly"""
+
+
+class HistoryIndex:
+    """Timestamp, deaths and exercise indexes over a sequence of history records
+    
+    Records are referred to by position: the saved records first, then any
+    added later. Timestamps and deaths are kept sorted alongside the
+    positions they belong to, so a range is found with bisect, and each
+    exercise name maps to the positions of the workouts that included it.
+    A query starts from whichever filter matches the fewest records and
+    checks only those against the rest. Records themselves are fetched
+    from the sequence only for the results.
+    """
+    
+    def __init__(self, records: Sequence,
+                 exercise_names: Optional[Callable[[Dict[str, Any]], Iterable[str]]] = None,
+                 resolve_names: Optional[Callable[[Dict[str, Any]], Iterable[str]]] = None):
+        """Index a sequence of records in one pass
+        
+        exercise_names gets a record's exercise names; without it the
+        names in its exercise entries are used. If it returns
+        PossibleNames, resolve_names gets the record's actual names, but
+        only once a query has matched the record on everything else.
+        """
+        self.records = records
+        self.exercise_names = exercise_names or entry_names
+        self.resolve_names = resolve_names
+        self._added: List[Dict[str, Any]] = []
+        
+        # Per position
+        self._timestamps: List[str] = []
+        self._deaths = array('q')
+        
+        # Sorted values, and the position each one belongs to
+        self._times: List[str] = []
+        self._by_time = array('q')
+        self._death_values = array('q')
+        self._by_deaths = array('q')
+        
+        # Lowercase exercise name -> positions, ascending
+        self._by_exercise: Dict[str, array] = {}
+        self._names: Dict[str, str] = {}
+        
+        # Positions indexed under possible names -> their actual lowercase names, once resolved
+        self._unresolved: Dict[int, Optional[set]] = {}
+        
+        for record in records:
+            self._index(record)
+        
+        # Sort once rather than inserting each value in place
+        self._by_time = array('q', sorted(range(len(self)), key=self._timestamps.__getitem__))
+        self._times = [self._timestamps[position] for position in self._by_time]
+        self._by_deaths = array('q', sorted(range(len(self)), key=self._deaths.__getitem__))
+        self._death_values = array('q', (self._deaths[position] for position in self._by_deaths))
+    
+    def __len__(self) -> int:
+        return len(self._timestamps)
+    
+    def __getitem__(self, position: int) -> Dict[str, Any]:
+        if position < len(self.records):
+            return self.records[position]
+        return self._added[position - len(self.records)]
+    
+    def add(self, record: Dict[str, Any]):
+        """Add a record saved after the index was built"""
+        self._added.append(record)
+        position = self._index(record)
+        timestamp = self._timestamps[position]
+        deaths = self._deaths[position]
+        
+        # Records mostly arrive in time order, so this is usually an append
+        if not self._times or timestamp >= self._times[-1]:
+            self._times.append(timestamp)
+            self._by_time.append(position)
+        else:
+            at = bisect_right(self._times, timestamp)
+            self._times.insert(at, timestamp)
+            self._by_time.insert(at, position)
+        
+        at = bisect_right(self._death_values, deaths)
+        self._death_values.insert(at, deaths)
+        self._by_deaths.insert(at, position)
+    
+    def exercises(self) -> List[str]:
+        """Get every exercise name in the history, sorted"""
+        return sorted(self._names.values(), key=str.lower)
+    
+    def query(self, since: Optional[str] = None, until: Optional[str] = None,
+              min_deaths: Optional[int] = None, max_deaths: Optional[int] = None,
+              exercise: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get the records matching every given filter, newest first
+        
+        since/until are ISO timestamps (until is exclusive) and exercise is
+        an exercise name, in any case. limit keeps the newest matches.
+        """
+        return [self[position] for position in self.query_positions(since, until, min_deaths, max_deaths,
+                                                                    exercise, limit)]
+    
+    def query_positions(self, since: Optional[str] = None, until: Optional[str] = None,
+                        min_deaths: Optional[int] = None, max_deaths: Optional[int] = None,
+                        exercise: Optional[str] = None, limit: Optional[int] = None) -> List[int]:
+        """Get the positions of the records query() would return"""
+        start = bisect_left(self._times, since) if since is not None else 0
+        end = bisect_left(self._times, until) if until is not None else len(self._times)
+        candidates = None
+        count = end - start
+        
+        if min_deaths is not None or max_deaths is not None:
+            low = bisect_left(self._death_values, min_deaths) if min_deaths is not None else 0
+            high = (bisect_right(self._death_values, max_deaths) if max_deaths is not None
+                    else len(self._death_values))
+            if high - low < count:
+                candidates = self._by_deaths[low:high]
+                count = len(candidates)
+        
+        if exercise is not None:
+            by_exercise = self._by_exercise.get(exercise.lower(), array('q'))
+            if len(by_exercise) < count:
+                candidates = by_exercise
+        
+        def matches(position: int) -> bool:
+            timestamp = self._timestamps[position]
+            deaths = self._deaths[position]
+            return ((since is None or timestamp >= since) and (until is None or timestamp < until)
+                    and (min_deaths is None or deaths >= min_deaths)
+                    and (max_deaths is None or deaths <= max_deaths)
+                    and (exercise is None or self._has_exercise(position, exercise.lower())))
+        
+        if candidates is None:
+            # The time range is narrowest and already in order, so stop once there are enough
+            positions = []
+            for index in range(end - 1, start - 1, -1):
+                position = self._by_time[index]
+                if matches(position):
+                    positions.append(position)
+                    if limit is not None and len(positions) >= limit:
+                        break
+            return positions
+        
+        # Newest first, so records left to resolve past the limit are never looked at
+        positions = []
+        for position in sorted(candidates, key=lambda position: (self._timestamps[position], position),
+                               reverse=True):
+            if matches(position):
+                positions.append(position)
+                if limit is not None and len(positions) >= limit:
+                    break
+        return positions
+    
+    def _index(self, record: Dict[str, Any]) -> int:
+        """Note the next record's timestamp, deaths and exercises; returns its position"""
+        position = len(self._timestamps)
+        self._timestamps.append(str(record.get("timestamp", "")))
+        self._deaths.append(record.get("deaths", 0))
+        
+        names = self.exercise_names(record)
+        if isinstance(names, PossibleNames) and self.resolve_names is not None:
+            self._unresolved[position] = None
+        for name in set(names):
+            key = name.lower()
+            self._names.setdefault(key, name)
+            self._by_exercise.setdefault(key, array('q')).append(position)
+        return position
+    
+    def _has_exercise(self, position: int, key: str) -> bool:
+        """Check whether a record included an exercise, by its lowercase name"""
+        positions = self._by_exercise.get(key)
+        if positions is None:
+            return False
+        at = bisect_left(positions, position)
+        if at == len(positions) or positions[at] != position:
+            return False
+        if position not in self._unresolved:
+            return True
+        
+        resolved = self._unresolved[position]
+        if resolved is None:
+            resolved = self._unresolved[position] = {name.lower() for name in self.resolve_names(self[position])}
+        return key in resolved
+
+
+def entry_names(record: Dict[str, Any]) -> List[str]:
+    """Get the names in a record's exercise entries"""
+    return [entry["name"] for entry in record.get("exercises", []) if "name" in entry]
@@ -0,0 +1,406 @@
+"""
+Append-only workout history log for GGOS
+
+The history is stored as JSON Lines: one compact JSON object per line,
+followed by a tab and the CRC-32 of the JSON text. Saving a workout
+appends a single line, and reading yields records one at a time instead
+of parsing the whole file up front. A damaged line fails its checksum and
+is skipped on its own; lines written before checksums were added are
+still read.
+"""
+
+import gzip
+import json
+import os
+import re
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.services.atomic_file import fsync_directory
+
+
+# The colon between a key and its value in a JSON object, and what may follow the value
+_KEY_SEPARATOR = re.compile(r'\s*:\s*')
+_ENTRY_END = re.compile(r'\s*([,}]|$)')
+
+
+@dataclass
+class CorruptRecord:
+    """A damaged part of a history or data file"""
+    path: Path
+    line_number: int
+    offset: int
+    data: bytes
+    reason: str
+    
+    def describe(self) -> str:
+        """Get a one-line description for the user"""
+        location = f"{self.path.name}:{self.line_number}" if self.line_number else self.path.name
+        return f"{location}: {self.reason}"
+
+
+def encode_record(record: Dict[str, Any]) -> bytes:
+    """Encode a record as one checksummed line"""
+    text = json.dumps(record, separators=(",", ":")).encode('utf-8')
+    return text + b"\t%08x\n" % zlib.crc32(text)
+
+
+def decode_line(line: bytes) -> Dict[str, Any]:
+    """Decode one line of a history log; raises ValueError if it is damaged"""
+    line = line.strip()
+    text, tab, checksum = line.rpartition(b"\t")
+    if tab:
+        try:
+            valid = int(checksum, 16) == zlib.crc32(text)
+        except ValueError:
+            valid = False
+        if not valid:
+            raise ValueError("checksum mismatch")
+    else:
+        text = line
+    
+    record = json.loads(text)
+    if not isinstance(record, dict):
+        raise ValueError("not a workout record")
+    return record
+
+
+def line_is_valid(line: bytes) -> bool:
+    """Check a line's checksum without parsing it; lines without one are parsed"""
+    line = line.strip()
+    text, tab, checksum = line.rpartition(b"\t")
+    if tab:
+        return checksum == b"%08x" % zlib.crc32(text)
+    try:
+        decode_line(line)
+        return True
+    except (ValueError, UnicodeDecodeError):
+        return False
+
+
+def append_record(path: Path, record: Dict[str, Any]):
+    """Append one record to a history log"""
+    append_records(path, [record])
+
+
+def append_records(path: Path, records: List[Dict[str, Any]]):
+    """Append records to a history log with a single write and fsync"""
+    lines = b"".join(encode_record(record) for record in records)
+    with open(path, 'ab+') as f:
+        # Never glue a record onto a line cut short by a crash
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                lines = b"\n" + lines
+        f.write(lines)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def iter_records(path: Path, on_corrupt: Optional[Callable[[CorruptRecord], None]] = None
+                 ) -> Iterator[Dict[str, Any]]:
+    """Yield the records of a history log in the order they were written
+    
+    Damaged lines are skipped and passed to on_corrupt, or printed if
+    there is no callback.
+    """
+    if not path.exists():
+        return
+    
+    with open(path, 'rb') as f:
+        for record, problem in _scan_lines(f, path):
+            if problem is None:
+                yield record
+            elif on_corrupt is not None:
+                on_corrupt(problem)
+            else:
+                print(f"Skipping unreadable history record at {problem.describe()}")
+
+
+def salvage_log(path: Path, quarantine_path: Path) -> List[CorruptRecord]:
+    """Move a history log's damaged lines to a quarantine file
+    
+    The log is read once; if any line is damaged, the good lines are
+    rewritten through a temporary file and the damaged ones are appended
+    to quarantine_path as they were. Returns the damaged lines.
+    """
+    problems: List[CorruptRecord] = []
+    temp_path = path.with_name(path.name + ".tmp")
+    
+    with open(path, 'rb') as source, open(temp_path, 'wb') as target:
+        for record, problem in _scan_lines(source, path, keep_lines=True):
+            if problem is None:
+                target.write(record)
+            else:
+                problems.append(problem)
+        target.flush()
+        os.fsync(target.fileno())
+    
+    if not problems:
+        os.remove(temp_path)
+        return problems
+    
+    quarantine(quarantine_path, [problem.data for problem in problems])
+    os.replace(temp_path, path)
+    fsync_directory(path.parent)
+    return problems
+
+
+def quarantine(quarantine_path: Path, chunks: List[bytes]):
+    """Append damaged data to a quarantine file, one chunk per line"""
+    with open(quarantine_path, 'ab') as f:
+        for chunk in chunks:
+            f.write(chunk.rstrip(b"\n") + b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _scan_lines(f, path: Path, keep_lines: bool = False) -> Iterator[Tuple[Any, Optional[CorruptRecord]]]:
+    """Yield (record or raw line, None) or (None, problem) for each non-blank line"""
+    offset = 0
+    for line_number, line in enumerate(f, 1):
+        start = offset
+        offset += len(line)
+        if not line.strip():
+            continue
+        try:
+            record = decode_line(line)
+        except (ValueError, UnicodeDecodeError) as e:
+            yield None, CorruptRecord(path, line_number, start, line, str(e))
+            continue
+        if keep_lines:
+            record = line if line.endswith(b"\n") else line + b"\n"
+        yield record, None
+
+
+def rewrite_log(path: Path, upgrade: Callable[[Dict[str, Any]], bool]) -> int:
+    """Rewrite a history log (plain or .gz) with upgrade applied to each record
+    
+    upgrade changes a record in place and returns True if it did. Records
+    are streamed through a temporary file, so memory use does not depend
+    on the size of the log; unreadable lines are kept as they are. The
+    file is replaced only if something changed. Returns the number of
+    records changed.
+    """
+    compressed = path.suffix == ".gz"
+    opener = gzip.open if compressed else open
+    temp_path = path.with_name(path.name + ".tmp")
+    changed = 0
+    
+    with opener(path, 'rb') as source, open(temp_path, 'wb') as raw:
+        target = gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) if compressed else raw
+        for line in source:
+            if line.strip():
+                try:
+                    record = decode_line(line)
+                except (ValueError, UnicodeDecodeError):
+                    record = None
+                if record is not None and upgrade(record):
+                    line = encode_record(record)
+                    changed += 1
+            target.write(line)
+        if compressed:
+            target.close()
+        raw.flush()
+        os.fsync(raw.fileno())
+    
+    if changed:
+        os.replace(temp_path, path)
+        fsync_directory(path.parent)
+    else:
+        os.remove(temp_path)
+    return changed
+
+
+def iter_json_array(path: Path, chunk_size: int = 65536) -> Iterator[Any]:
+    """Yield the items of a JSON array file without loading it all at once"""
+    decoder = json.JSONDecoder()
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ""
+        position = 0
+        started = False
+        eof = False
+        
+        while True:
+            # Skip whitespace, the opening bracket and separating commas
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','
+                                              or (not started and buffer[position] == '[')):
+                if buffer[position] == '[':
+                    started = True
+                position += 1
+            
+            if position < len(buffer) and buffer[position] == ']':
+                return
+            
+            if position < len(buffer):
+                try:
+                    item, end = decoder.raw_decode(buffer, position)
+                except ValueError:
+                    item = None
+                    end = None
+                
+                # An item ending at the buffer edge may be cut short, so
+                # only trust it once more data (or the end) has been seen
+                if end is not None and (end < len(buffer) or eof):
+                    yield item
+                    position = end
+                    continue
+                if eof:
+                    raise ValueError(f"Malformed JSON array in {path.name}")
+            elif eof:
+                return
+            
+            chunk = f.read(chunk_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[position:] + chunk
+            position = 0
+
+
+def salvage_json_array(data: bytes, path: Path) -> Tuple[List[Any], List[CorruptRecord]]:
+    """Recover the readable items of a damaged JSON array file
+    
+    Items are decoded one after another; when one cannot be, parsing
+    resumes at the next object that can be, so a damaged item costs only
+    itself. Returns the items and the damaged stretches.
+    """
+    text = data.decode('utf-8', errors='replace')
+    decoder = json.JSONDecoder()
+    items: List[Any] = []
+    problems: List[CorruptRecord] = []
+    position = text.find('[') + 1
+    
+    while position < len(text):
+        while position < len(text) and (text[position].isspace() or text[position] == ','):
+            position += 1
+        # A bracket before the end closed a list inside a damaged item
+        if position >= len(text) or (text[position] == ']' and not text[position + 1:].strip()):
+            break
+        
+        try:
+            item, position = decoder.raw_decode(text, position)
+            items.append(item)
+            continue
+        except ValueError as e:
+            reason = str(e)
+        
+        # Skip to the next object that decodes
+        resume = text.find('{', position + 1)
+        while resume != -1:
+            try:
+                decoder.raw_decode(text, resume)
+                break
+            except ValueError:
+                resume = text.find('{', resume + 1)
+        end = len(text) if resume == -1 else resume
+        problems.append(CorruptRecord(
+            path, text.count('\n', 0, position) + 1, position, text[position:end].encode('utf-8'), reason
+        ))
+        position = end
+    
+    return items, problems
+
+
+def salvage_json_object(data: bytes, path: Path) -> Tuple[Dict[str, Any], List[CorruptRecord]]:
+    """Recover the readable entries of a damaged JSON object file
+    
+    Entries are decoded one after another; when one cannot be, parsing
+    resumes at the next "key": value entry that can be, so a damaged
+    entry costs only itself. Returns the entries and the damaged stretches.
+    """
+    text = data.decode('utf-8', errors='replace')
+    decoder = json.JSONDecoder()
+    entries: Dict[str, Any] = {}
+    problems: List[CorruptRecord] = []
+    position = text.find('{') + 1
+    
+    def decode_entry(start: int) -> Tuple[str, Any, int]:
+        key, end = decoder.raw_decode(text, start)
+        separator = _KEY_SEPARATOR.match(text, end)
+        if not isinstance(key, str) or separator is None:
+            raise ValueError(f"Expecting a \"key\": value entry at char {start}")
+        value, end = decoder.raw_decode(text, separator.end())
+        if not _ENTRY_END.match(text, end):
+            raise ValueError(f"Expecting ',' delimiter at char {end}")
+        return key, value, end
+    
+    while position < len(text):
+        while position < len(text) and (text[position].isspace() or text[position] == ','):
+            position += 1
+        # A brace before the end closed an object inside a damaged entry
+        if position >= len(text) or (text[position] == '}' and not text[position + 1:].strip()):
+            break
+        
+        try:
+            key, value, position = decode_entry(position)
+            entries[key] = value
+            continue
+        except ValueError as e:
+            reason = str(e)
+        
+        # Skip to the next entry that decodes
+        resume = text.find('"', position + 1)
+        while resume != -1:
+            try:
+                decode_entry(resume)
+                break
+            except ValueError:
+                resume = text.find('"', resume + 1)
+        end = len(text) if resume == -1 else resume
+        problems.append(CorruptRecord(
+            path, text.count('\n', 0, position) + 1, position, text[position:end].encode('utf-8'), reason
+        ))
+        position = end
+    
+    return entries, problems
+
+
+def migrate_json_array(source: Path, target: Path,
+                       on_corrupt: Optional[Callable[[CorruptRecord], None]] = None):
+    """Convert a JSON array history file into a history log, one record at a time
+    
+    The log is written next to the target and renamed into place only once
+    complete, and the source is kept with a .migrated suffix. If the source
+    is damaged, its readable records are migrated, and the damaged ones are
+    moved to <source>.quarantine and passed to on_corrupt, or printed.
+    """
+    temp_path = target.with_name(target.name + ".tmp")
+    try:
+        try:
+            _write_log(temp_path, iter_json_array(source))
+        except ValueError:
+            records, problems = salvage_json_array(source.read_bytes(), source)
+            
+            # Resuming inside a damaged record can pick up one of its exercise entries
+            for item in records:
+                if not (isinstance(item, dict) and "timestamp" in item):
+                    problems.append(CorruptRecord(source, 0, 0, json.dumps(item).encode('utf-8'),
+                                                  "not a history record"))
+            _write_log(temp_path, (item for item in records if isinstance(item, dict) and "timestamp" in item))
+            
+            quarantine(source.with_name(source.name + ".quarantine"), [problem.data for problem in problems])
+            for problem in problems:
+                if on_corrupt is not None:
+                    on_corrupt(problem)
+                else:
+                    print(f"Skipping unreadable history record at {problem.describe()}")
+    except BaseException:
+        if temp_path.exists():
+            os.remove(temp_path)
+        raise
+    
+    os.replace(temp_path, target)
+    os.replace(source, source.with_name(source.name + ".migrated"))
+    fsync_directory(target.parent)
+
+
+def _write_log(path: Path, records: Iterable[Dict[str, Any]]):
+    """Write records to a new history log and sync it"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(encode_record(record).decode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
@@ -0,0 +1,229 @@
+"""
+Random-access history readers for GGOS
+
+A reader indexes where each record starts instead of parsing the history.
+Looking up record k, or the last N records, parses only those records, so
+paging through a multi-year history costs the same as paging through a
+short one.
+"""
+
+import gzip
+import mmap
+import zlib
+from array import array
+from bisect import bisect_right
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+from src.services import history_log
+from src.services.history_segments import dump_record
+
+
+class MappedLog(Sequence):
+    """One JSON Lines file, memory-mapped, with an array of line offsets
+    
+    The index holds an 8-byte start and end offset per record. The file is
+    append-only, so refresh() maps it again and indexes only the new tail;
+    if the file was replaced instead, it is indexed again from the start.
+    Compressed segments are decompressed into memory and indexed the same
+    way. Lines that fail their checksum are left out of the index, and so
+    are records in skip, given as their dump_record form.
+    """
+    
+    def __init__(self, path: Path, skip: Optional[Set[str]] = None):
+        """Map a log file and index its records"""
+        self.path = Path(path)
+        self.skip = skip
+        self.compressed = self.path.suffix == ".gz"
+        self._buffer: Any = b""
+        self._file = None
+        self._size = 0
+        self._inode = None
+        self._indexed = 0
+        self._starts = array('Q')
+        self._ends = array('Q')
+        self.refresh()
+    
+    def refresh(self) -> int:
+        """Index records appended since the last refresh; returns how many were added"""
+        if self.compressed:
+            if self._starts:
+                return 0
+            self._buffer = _read_gzip_prefix(self.path)
+            self._size = len(self._buffer)
+        else:
+            if not self.path.exists():
+                return 0
+            stat = self.path.stat()
+            if stat.st_size == self._size and stat.st_ino == self._inode:
+                return 0
+            if stat.st_ino != self._inode or stat.st_size < self._size:
+                self._starts = array('Q')
+                self._ends = array('Q')
+                self._indexed = 0
+            self.close()
+            self._file = open(self.path, 'rb')
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if stat.st_size else b""
+            self._size = stat.st_size
+            self._inode = stat.st_ino
+        
+        count = len(self._starts)
+        self._index_from(self._indexed)
+        return len(self._starts) - count
+    
+    def close(self):
+        """Release the mapping"""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buffer = b""
+    
+    def __len__(self) -> int:
+        return len(self._starts)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("history record index out of range")
+        return history_log.decode_line(self._buffer[self._starts[index]:self._ends[index]])
+    
+    def _index_from(self, position: int):
+        """Record the start and end of every complete line after position"""
+        buffer = self._buffer
+        size = self._size
+        while position < size:
+            end = buffer.find(b"\n", position)
+            if end == -1:
+                # A line still being written is indexed on the next refresh
+                break
+            line = buffer[position:end]
+            if (line.strip() and history_log.line_is_valid(line)
+                    and not (self.skip and dump_record(history_log.decode_line(line)) in self.skip)):
+                self._starts.append(position)
+                self._ends.append(end)
+            position = end + 1
+        self._indexed = position
+
+
+class HistoryReader(Sequence):
+    """The whole segmented history as one sequence of records, oldest first
+    
+    Months are mapped only when a lookup reaches them, so tail(n) opens
+    just the newest months. len() and indexing map every month once.
+    """
+    
+    def __init__(self, history):
+        """Create a reader over a SegmentedHistory"""
+        self.history = history
+        self._keys: List[str] = history.segment_keys()
+        self._logs: Dict[str, List[MappedLog]] = {}
+        
+        # Every mapped file, and the index of each one's first record
+        self._all_logs: Optional[List[MappedLog]] = None
+        self._log_starts = array('Q')
+    
+    def tail(self, count: int) -> List[Dict[str, Any]]:
+        """Get the last count records, oldest first, reading only the months they are in"""
+        records: List[Dict[str, Any]] = []
+        for key in reversed(self._keys):
+            for log in reversed(self._month(key)):
+                needed = count - len(records)
+                if needed <= 0:
+                    break
+                records.extend(reversed(log[max(0, len(log) - needed):]))
+            if len(records) >= count:
+                break
+        records.reverse()
+        return records
+    
+    def refresh(self):
+        """Pick up new records and months, and months that were compacted or deleted"""
+        self._keys = self.history.segment_keys()
+        for key in list(self._logs):
+            logs = self._logs[key]
+            if key not in self._keys or self.history.segment_paths(key) != [log.path for log in logs]:
+                for log in self._logs.pop(key):
+                    log.close()
+            else:
+                for log in logs:
+                    log.refresh()
+        self._all_logs = None
+    
+    def close(self):
+        """Release every mapping"""
+        for logs in self._logs.values():
+            for log in logs:
+                log.close()
+        self._logs = {}
+        self._all_logs = None
+    
+    def __len__(self) -> int:
+        self._build_offsets()
+        return self._log_starts[-1]
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        
+        total = len(self)
+        if index < 0:
+            index += total
+        if not 0 <= index < total:
+            raise IndexError("history record index out of range")
+        
+        position = bisect_right(self._log_starts, index) - 1
+        return self._all_logs[position][index - self._log_starts[position]]
+    
+    def __reversed__(self):
+        for key in reversed(self._keys):
+            for log in reversed(self._month(key)):
+                for index in range(len(log) - 1, -1, -1):
+                    yield log[index]
+    
+    def __iter__(self):
+        for key in self._keys:
+            for log in self._month(key):
+                for index in range(len(log)):
+                    yield log[index]
+    
+    def _build_offsets(self):
+        """Map every month and note where each file's records start"""
+        if self._all_logs is not None:
+            return
+        self._all_logs = [log for key in self._keys for log in self._month(key)]
+        self._log_starts = array('Q', [0])
+        for log in self._all_logs:
+            self._log_starts.append(self._log_starts[-1] + len(log))
+    
+    def _month(self, key: str) -> List[MappedLog]:
+        """Get a month's mapped files, mapping them on first use"""
+        if key not in self._logs:
+            logs: List[MappedLog] = []
+            for path in self.history.segment_paths(key):
+                # Compaction that did not get to remove the plain file leaves
+                # its records in both; read them once, as the history does
+                skip = {dump_record(record) for log in logs for record in log} if logs else None
+                logs.append(MappedLog(path, skip))
+            self._logs[key] = logs
+        return self._logs[key]
+
+
+def _read_gzip_prefix(path: Path) -> bytes:
+    """Decompress as much of a compressed segment as can be read"""
+    chunks = []
+    try:
+        with gzip.open(path, 'rb') as f:
+            while True:
+                chunk = f.read(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except (OSError, EOFError, zlib.error):
+        pass
+    return b"".join(chunks)
@@ -0,0 +1,321 @@
+"""
+Month-segmented workout history for GGOS
+
+Records are appended to one JSON Lines file per calendar month, such as
+2025-05.jsonl. Months that are over are compacted into 2025-05.jsonl.gz,
+with exact duplicate records removed, and months older than the retention
+window can be deleted whole. Damaged records found while reading are
+moved to 2025-05.jsonl.quarantine; a damaged compressed file is kept as
+2025-05.jsonl.gz.damaged and rewritten with what could be read.
+"""
+
+import gzip
+import json
+import os
+import re
+import shutil
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.services import history_log
+from src.services.atomic_file import fsync_directory
+from src.services.file_lock import file_lock
+from src.services.history_log import CorruptRecord
+from src.services.read_cache import ReadCache
+
+
+SEGMENT_PATTERN = re.compile(r"^(\d{4}-\d{2})\.jsonl(\.gz)?$")
+
+
+def segment_key(record: Dict[str, Any]) -> str:
+    """Get the month a record belongs to, as YYYY-MM"""
+    key = str(record.get("timestamp", ""))[:7]
+    if re.match(r"^\d{4}-\d{2}$", key):
+        return key
+    return datetime.now().strftime("%Y-%m")
+
+
+def month_key(today: datetime, months_back: int = 0) -> str:
+    """Get the YYYY-MM key of the month months_back before today's"""
+    index = today.year * 12 + today.month - 1 - months_back
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+class SegmentedHistory:
+    """Workout history split into one file per month
+    
+    Reading a recent month only touches that month's files, so the size
+    of the whole history does not matter at startup. Appends, compaction
+    and deletion share a lock, held across processes through a .lock file
+    in the directory, so a month is never compacted while a record is
+    being added to it, even by another GGOS instance.
+    """
+    
+    def __init__(self, directory: Path, read_cache: Optional[ReadCache] = None,
+                 on_corrupt: Optional[Callable[[CorruptRecord], None]] = None):
+        """Initialize the history in a directory"""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.read_cache = read_cache
+        self.on_corrupt = on_corrupt
+        self._lock = threading.Lock()
+    
+    def segment_keys(self) -> List[str]:
+        """Get the months that have records, oldest first"""
+        keys = set()
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                keys.add(match.group(1))
+        return sorted(keys)
+    
+    def segment_paths(self, key: str) -> List[Path]:
+        """Get the files holding a month's records, compacted file first"""
+        return [path for path in (self._gzip_path(key), self._plain_path(key)) if path.exists()]
+    
+    def append_records(self, records: List[Dict[str, Any]]):
+        """Append records to their months' files, one write and fsync per month"""
+        by_segment: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            by_segment.setdefault(segment_key(record), []).append(record)
+        
+        with self._locked():
+            for key, segment_records in by_segment.items():
+                history_log.append_records(self._plain_path(key), segment_records)
+    
+    def rewrite_records(self, upgrade) -> int:
+        """Apply upgrade to every record, one file at a time; returns the number changed"""
+        changed = 0
+        for key in self.segment_keys():
+            with self._locked():
+                for path in self.segment_paths(key):
+                    changed += history_log.rewrite_log(path, upgrade)
+        return changed
+    
+    def read_segment(self, key: str) -> List[Dict[str, Any]]:
+        """Get one month's records, through the read cache if there is one
+        
+        The list may be shared with the cache and must not be modified.
+        """
+        with self._locked():
+            return self._read_segment(key, self.read_cache)
+    
+    def read_compacted(self, key: str) -> List[Dict[str, Any]]:
+        """Get the records in a month's compacted file, through the read cache"""
+        with self._locked():
+            return self._read_file(self._gzip_path(key), self._read_gzip, self.read_cache)
+    
+    def compacted_signature(self, key: str) -> Optional[List[int]]:
+        """Get the size and modification time of a month's compacted file, if it has one"""
+        try:
+            stat = self._gzip_path(key).stat()
+        except FileNotFoundError:
+            return None
+        return [stat.st_size, stat.st_mtime_ns]
+    
+    def read_appended(self, key: str, offset: int = 0,
+                      inode: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int, Optional[int]]:
+        """Read the records appended to a month's plain file since offset
+        
+        Returns the records, the offset to continue from and the file's
+        inode. If the file is not the one with that inode any more, it is
+        read from the start. A line still being written is left for the
+        next call, and damaged lines are skipped.
+        """
+        path = self._plain_path(key)
+        try:
+            with open(path, 'rb') as f:
+                current_inode = os.fstat(f.fileno()).st_ino
+                if current_inode != inode:
+                    offset = 0
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], 0, None
+        
+        complete = data.rfind(b"\n") + 1
+        records = []
+        for line in data[:complete].splitlines():
+            if line.strip():
+                try:
+                    records.append(history_log.decode_line(line))
+                except (ValueError, UnicodeDecodeError):
+                    pass
+        return records, offset + complete, current_inode
+    
+    def iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Yield every record, oldest month first, one month in memory at a time"""
+        for key in self.segment_keys():
+            with self._locked():
+                records = self._read_segment(key, None)
+            yield from records
+    
+    def compact_before(self, key: str) -> int:
+        """Compress every month before key that still has a plain file; returns the count"""
+        compacted = 0
+        for segment in self.segment_keys():
+            if segment < key and self._plain_path(segment).exists():
+                self.compact_segment(segment)
+                compacted += 1
+        return compacted
+    
+    def compact_segment(self, key: str):
+        """Merge a month into one compressed file without duplicate records
+        
+        The compressed file is replaced atomically before the plain file is
+        removed; reads skip records already in the compressed file, so a
+        crash in between loses nothing and duplicates nothing.
+        """
+        with self._locked():
+            unique: Dict[str, Dict[str, Any]] = {}
+            for record in self._read_segment(key, None):
+                unique.setdefault(dump_record(record), record)
+            _write_gzip(self._gzip_path(key), list(unique.values()))
+            
+            plain_path = self._plain_path(key)
+            if plain_path.exists():
+                os.remove(plain_path)
+    
+    def check_segment(self, key: str):
+        """Read a month once, so any damaged records in it are quarantined"""
+        with self._locked():
+            self._read_segment(key, None)
+    
+    def delete_before(self, key: str) -> int:
+        """Delete every month before key; returns the number of months deleted"""
+        deleted = 0
+        with self._locked():
+            for segment in self.segment_keys():
+                if segment >= key:
+                    continue
+                for path in (self._plain_path(segment), self._gzip_path(segment)):
+                    if path.exists():
+                        os.remove(path)
+                deleted += 1
+        return deleted
+    
+    def _read_segment(self, key: str, cache: Optional[ReadCache]) -> List[Dict[str, Any]]:
+        """Read a month's compressed and plain records; the caller holds the locks"""
+        compressed = self._read_file(self._gzip_path(key), self._read_gzip, cache)
+        plain = self._read_file(self._plain_path(key), self._read_plain, cache)
+        if not compressed:
+            return plain
+        if not plain:
+            return compressed
+        
+        seen = {dump_record(record) for record in compressed}
+        return compressed + [record for record in plain if dump_record(record) not in seen]
+    
+    def _read_file(self, path: Path, parse, cache: Optional[ReadCache]) -> List[Dict[str, Any]]:
+        """Read one segment file, or nothing if it does not exist"""
+        if cache is not None:
+            return cache.get(path, parse, [])
+        if not path.exists():
+            return []
+        return parse(path)
+    
+    def _read_plain(self, path: Path) -> List[Dict[str, Any]]:
+        """Read an uncompressed segment, quarantining any damaged lines"""
+        problems: List[CorruptRecord] = []
+        records = list(history_log.iter_records(path, problems.append))
+        if problems:
+            for problem in history_log.salvage_log(path, path.with_name(path.name + ".quarantine")):
+                self._report(problem)
+        return records
+    
+    def _read_gzip(self, path: Path) -> List[Dict[str, Any]]:
+        """Read a compacted segment, keeping whatever can be read if it is damaged"""
+        records: List[Dict[str, Any]] = []
+        problems: List[CorruptRecord] = []
+        line_number = 0
+        try:
+            with gzip.open(path, 'rb') as f:
+                for line_number, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    try:
+                        records.append(history_log.decode_line(line))
+                    except (ValueError, UnicodeDecodeError) as e:
+                        problems.append(CorruptRecord(path, line_number, 0, line, str(e)))
+        except (OSError, EOFError, zlib.error) as e:
+            problems.append(CorruptRecord(
+                path, line_number + 1, 0, b"", f"compressed data unreadable after {len(records)} records: {e}"
+            ))
+        
+        if problems:
+            shutil.copyfile(path, path.with_name(path.name + ".damaged"))
+            _write_gzip(path, records)
+            for problem in problems:
+                self._report(problem)
+        return records
+    
+    @contextmanager
+    def _locked(self):
+        """Hold the history lock, for this process's threads and for other processes"""
+        with self._lock, file_lock(self.directory / ".lock"):
+            yield
+    
+    def _report(self, problem: CorruptRecord):
+        """Pass a damaged record to the callback, or print it"""
+        if self.on_corrupt is not None:
+            self.on_corrupt(problem)
+        else:
+            print(f"Quarantined unreadable history record at {problem.describe()}")
+    
+    def _plain_path(self, key: str) -> Path:
+        """Get the path of a month's appendable file"""
+        return self.directory / f"{key}.jsonl"
+    
+    def _gzip_path(self, key: str) -> Path:
+        """Get the path of a month's compacted file"""
+        return self.directory / f"{key}.jsonl.gz"
+
+
+def migrate_log(source: Path, directory: Path):
+    """Split a single history log into month segments
+    
+    The segments are built in a temporary directory that is renamed into
+    place only once complete, and the source is kept with a .migrated suffix.
+    """
+    temp_directory = directory.with_name(directory.name + ".tmp")
+    if temp_directory.exists():
+        for name in os.listdir(temp_directory):
+            os.remove(temp_directory / name)
+    
+    history = SegmentedHistory(temp_directory)
+    batch: List[Dict[str, Any]] = []
+    for record in history_log.iter_records(source):
+        batch.append(record)
+        if len(batch) >= 1000:
+            history.append_records(batch)
+            batch = []
+    if batch:
+        history.append_records(batch)
+    
+    if directory.exists():
+        directory.rmdir()
+    os.replace(temp_directory, directory)
+    os.replace(source, source.with_name(source.name + ".migrated"))
+    fsync_directory(directory.parent)
+
+
+def _write_gzip(path: Path, records: List[Dict[str, Any]]):
+    """Atomically replace a compressed segment"""
+    temp_path = path.with_name(path.name + ".tmp")
+    with open(temp_path, 'wb') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as f:
+            f.write(b"".join(history_log.encode_record(record) for record in records))
+        raw.flush()
+        os.fsync(raw.fileno())
+    
+    os.replace(temp_path, path)
+    fsync_directory(path.parent)
+
+
+def dump_record(record: Dict[str, Any]) -> str:
+    """Serialize a record the same way every time, for duplicate checks"""
+    return json.dumps(record, separators=(",", ":"), sort_keys=True)
@@ -0,0 +1,345 @@
+"""
+Incremental workout history statistics for GGOS
+
+HistoryStats keeps running totals over history records, and HistoryRollups
+keeps totals per day, ISO week and month, so adding a workout costs the
+same however long the history is. SegmentedHistoryStats keeps both for
+each month of a segmented history and saves them with how far into each
+month's files they have read, so reopening only reads what was appended
+since.
+"""
+
+import json
+import math
+from datetime import date
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.services.atomic_file import write_text_atomic
+from src.services.history_segments import dump_record
+
+
+class HistoryStats:
+    """Running totals over workout records
+    
+    Keeps the workout count, deaths sum, minimum and maximum, reps and
+    seconds totals, per-exercise amounts, and the deaths mean and variance
+    by Welford's method, which needs no second pass over the records.
+    """
+    
+    def __init__(self):
+        """Initialize empty statistics"""
+        self.count = 0
+        self.deaths = 0
+        self.min_deaths: Optional[int] = None
+        self.max_deaths: Optional[int] = None
+        self.unit_totals: Dict[str, int] = {"reps": 0, "seconds": 0}
+        self.exercise_totals: Dict[str, int] = {}
+        self._mean = 0.0
+        self._m2 = 0.0
+    
+    @property
+    def reps(self) -> int:
+        return self.unit_totals["reps"]
+    
+    @property
+    def seconds(self) -> int:
+        return self.unit_totals["seconds"]
+    
+    @property
+    def mean_deaths(self) -> float:
+        return self._mean
+    
+    @property
+    def deaths_variance(self) -> float:
+        """Sample variance of deaths per workout"""
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+    
+    @property
+    def deaths_stddev(self) -> float:
+        return math.sqrt(self.deaths_variance)
+    
+    def add(self, record: Dict[str, Any]):
+        """Add one history record"""
+        deaths = record.get("deaths", 0)
+        self.count += 1
+        self.deaths += deaths
+        self.min_deaths = deaths if self.min_deaths is None else min(self.min_deaths, deaths)
+        self.max_deaths = deaths if self.max_deaths is None else max(self.max_deaths, deaths)
+        
+        delta = deaths - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (deaths - self._mean)
+        
+        reps, seconds = record_units(record)
+        self.unit_totals["reps"] += reps
+        self.unit_totals["seconds"] += seconds
+        
+        for key, amount in record.get("volume", {}).items():
+            self.exercise_totals[key] = self.exercise_totals.get(key, 0) + amount
+    
+    def merge(self, other: 'HistoryStats'):
+        """Add another set of statistics to this one"""
+        if not other.count:
+            return
+        
+        count = self.count + other.count
+        delta = other._mean - self._mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / count
+        self._mean += delta * other.count / count
+        self.count = count
+        self.deaths += other.deaths
+        self.min_deaths = other.min_deaths if self.min_deaths is None else min(self.min_deaths, other.min_deaths)
+        self.max_deaths = other.max_deaths if self.max_deaths is None else max(self.max_deaths, other.max_deaths)
+        for unit, amount in other.unit_totals.items():
+            self.unit_totals[unit] = self.unit_totals.get(unit, 0) + amount
+        for key, amount in other.exercise_totals.items():
+            self.exercise_totals[key] = self.exercise_totals.get(key, 0) + amount
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a dictionary for storage"""
+        return {
+            "count": self.count,
+            "deaths": self.deaths,
+            "min_deaths": self.min_deaths,
+            "max_deaths": self.max_deaths,
+            "mean": self._mean,
+            "m2": self._m2,
+            "units": self.unit_totals,
+            "exercises": self.exercise_totals
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HistoryStats':
+        """Create from a dictionary made by to_dict"""
+        stats = cls()
+        stats.count = data["count"]
+        stats.deaths = data["deaths"]
+        stats.min_deaths = data["min_deaths"]
+        stats.max_deaths = data["max_deaths"]
+        stats._mean = data["mean"]
+        stats._m2 = data["m2"]
+        stats.unit_totals.update(data["units"])
+        stats.exercise_totals = dict(data["exercises"])
+        return stats
+
+
+# Totals kept in each rollup bucket, in the order they are stored
+ROLLUP_FIELDS = ("workouts", "deaths", "reps", "seconds")
+
+
+class HistoryRollups:
+    """Workouts, deaths, reps and seconds per day, ISO week and month
+    
+    Each record updates one bucket of each period, found from the date at
+    the start of its timestamp; a day's ISO week is worked out once per
+    day rather than once per record. Looking up a period's totals is a
+    dictionary lookup. Only the daily buckets are saved; weeks and months
+    are summed from them when loaded.
+    """
+    
+    PERIODS = ("day", "week", "month")
+    
+    def __init__(self):
+        """Initialize empty rollups"""
+        self._buckets: Dict[str, Dict[str, List[int]]] = {period: {} for period in self.PERIODS}
+        
+        # ISO week of each day seen, or None for timestamps that are not dates
+        self._weeks: Dict[str, Optional[str]] = {}
+    
+    @staticmethod
+    def period_key(period: str, day: date) -> str:
+        """Get the bucket key of the period containing a day, like 2025-05-01, 2025-W18 or 2025-05"""
+        if period == "day":
+            return day.isoformat()
+        if period == "week":
+            year, week, _ = day.isocalendar()
+            return f"{year}-W{week:02d}"
+        if period == "month":
+            return day.strftime("%Y-%m")
+        raise ValueError(f"Unknown rollup period: {period}")
+    
+    def add(self, record: Dict[str, Any]):
+        """Add one history record to its day, week and month"""
+        day = str(record.get("timestamp", ""))[:10]
+        week = self._week_of(day)
+        if week is None:
+            return
+        
+        reps, seconds = record_units(record)
+        values = (1, record.get("deaths", 0), reps, seconds)
+        self._add_bucket("day", day, values)
+        self._add_bucket("week", week, values)
+        self._add_bucket("month", day[:7], values)
+    
+    def merge(self, other: 'HistoryRollups'):
+        """Add another set of rollups to this one"""
+        for day, values in other._buckets["day"].items():
+            self._add_bucket("day", day, values)
+            self._add_bucket("week", self._week_of(day), values)
+            self._add_bucket("month", day[:7], values)
+    
+    def get(self, period: str, key: str) -> Dict[str, int]:
+        """Get the totals of one bucket, such as get("week", "2025-W18")"""
+        values = self._buckets[period].get(key)
+        return dict(zip(ROLLUP_FIELDS, values or (0,) * len(ROLLUP_FIELDS)))
+    
+    def current(self, period: str, today: Optional[date] = None) -> Dict[str, int]:
+        """Get the totals of the day, week or month containing today"""
+        return self.get(period, self.period_key(period, today or date.today()))
+    
+    def series(self, period: str, since: Optional[str] = None,
+               until: Optional[str] = None) -> List[Tuple[str, Dict[str, int]]]:
+        """Get (key, totals) for every bucket with workouts, oldest first
+        
+        since and until are bucket keys; until is exclusive.
+        """
+        return [
+            (key, dict(zip(ROLLUP_FIELDS, values)))
+            for key, values in sorted(self._buckets[period].items())
+            if (since is None or key >= since) and (until is None or key < until)
+        ]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to a dictionary for storage"""
+        return {"days": self._buckets["day"]}
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HistoryRollups':
+        """Create from a dictionary made by to_dict"""
+        rollups = cls()
+        for day, values in data["days"].items():
+            if rollups._week_of(day) is not None:
+                rollups._add_bucket("day", day, values)
+                rollups._add_bucket("week", rollups._week_of(day), values)
+                rollups._add_bucket("month", day[:7], values)
+        return rollups
+    
+    def _add_bucket(self, period: str, key: str, values):
+        """Add totals to a bucket, creating it if needed"""
+        bucket = self._buckets[period].get(key)
+        if bucket is None:
+            self._buckets[period][key] = list(values)
+        else:
+            for index, value in enumerate(values):
+                bucket[index] += value
+    
+    def _week_of(self, day: str) -> Optional[str]:
+        """Get the ISO week key of a YYYY-MM-DD day, or None if it is not a date"""
+        if day not in self._weeks:
+            try:
+                self._weeks[day] = self.period_key("week", date.fromisoformat(day))
+            except ValueError:
+                self._weeks[day] = None
+        return self._weeks[day]
+
+
+class SegmentedHistoryStats:
+    """Statistics and rollups over a SegmentedHistory, kept per month and saved to a file
+    
+    Each month remembers the compacted file it counted and how far into the
+    month's appendable file it has read. refresh() reads only the records
+    appended since; a month is counted again only when its files were
+    compacted, rewritten or salvaged. Deleted months are dropped.
+    """
+    
+    def __init__(self, history, path: Path):
+        """Load the saved statistics for a history, if there are any"""
+        self.history = history
+        self.path = Path(path)
+        self._months: Dict[str, Dict[str, Any]] = {}
+        
+        try:
+            if self.path.exists():
+                data = json.loads(self.path.read_text(encoding='utf-8'))
+                for key, state in data.get("months", {}).items():
+                    self._months[key] = dict(state, stats=HistoryStats.from_dict(state["stats"]),
+                                             rollups=HistoryRollups.from_dict(state["rollups"]))
+        except (ValueError, KeyError, TypeError) as e:
+            # Only a cache; it is rebuilt from the history
+            print(f"Recounting history statistics: {e}")
+            self._months = {}
+    
+    def refresh(self) -> bool:
+        """Bring every month up to date; returns True if anything changed"""
+        keys = self.history.segment_keys()
+        changed = False
+        for key in list(self._months):
+            if key not in keys:
+                del self._months[key]
+                changed = True
+        
+        for key in keys:
+            state = self._refresh_month(key, self._months.get(key))
+            if state is not None:
+                self._months[key] = state
+                changed = True
+        
+        if changed:
+            self.save()
+        return changed
+    
+    def totals(self) -> HistoryStats:
+        """Get the statistics for the whole history, as of the last refresh"""
+        total = HistoryStats()
+        for key in sorted(self._months):
+            total.merge(self._months[key]["stats"])
+        return total
+    
+    def rollups(self) -> HistoryRollups:
+        """Get the rollups for the whole history, as of the last refresh"""
+        total = HistoryRollups()
+        for key in sorted(self._months):
+            total.merge(self._months[key]["rollups"])
+        return total
+    
+    def save(self):
+        """Save the per-month statistics, rollups and read positions"""
+        months = {key: dict(state, stats=state["stats"].to_dict(), rollups=state["rollups"].to_dict())
+                  for key, state in self._months.items()}
+        write_text_atomic(self.path, json.dumps({"months": months}))
+    
+    def _refresh_month(self, key: str, state: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Count a month's new records; returns its new state, or None if nothing changed"""
+        compacted = self.history.compacted_signature(key)
+        recount = state is None or state["compacted"] != compacted
+        offset = 0 if recount else state["offset"]
+        inode = None if recount else state["inode"]
+        
+        records, new_offset, new_inode = self.history.read_appended(key, offset, inode)
+        if not recount and new_inode != inode:
+            # The file was replaced and has been read from the start
+            recount = True
+        if not recount and new_offset == offset:
+            return None
+        
+        if recount:
+            stats, rollups = HistoryStats(), HistoryRollups()
+            older = self.history.read_compacted(key) if compacted else []
+            if older:
+                seen = {dump_record(record) for record in older}
+                records = older + [record for record in records if dump_record(record) not in seen]
+        else:
+            stats, rollups = state["stats"], state["rollups"]
+        
+        for record in records:
+            stats.add(record)
+            rollups.add(record)
+        return {"compacted": compacted, "inode": new_inode, "offset": new_offset, "stats": stats, "rollups": rollups}
+
+
+def record_units(record: Dict[str, Any]) -> Tuple[int, int]:
+    """Get a record's total reps and seconds
+    
+    Records saved before totals were stored are approximated from a
+    summary like "25 reps + 30 seconds".
+    """
+    if record.get("reps_total") is not None:
+        return record["reps_total"], record.get("seconds_total", 0)
+    
+    units = {"reps": 0, "seconds": 0}
+    for part in str(record.get("summary", "")).split("+"):
+        words = part.split()
+        if len(words) >= 2 and words[1] in units and words[0].isdigit():
+            units[words[1]] += int(words[0])
+    return units["reps"], units["seconds"]
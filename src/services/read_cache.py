@@ -0,0 +1,46 @@
+"""
+Read-through file cache for GGOS storage
+"""
+
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+
+class ReadCache:
+    """Keeps parsed file contents until the file changes on disk
+    
+    Entries are validated against the file's st_mtime_ns and st_size on
+    every lookup, so writes from other processes are picked up without
+    any notification. Cached values are shared between callers and must
+    not be modified.
+    """
+    
+    def __init__(self):
+        """Initialize an empty cache"""
+        self._entries: Dict[Path, Tuple[Tuple[int, int], Any]] = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, path: Path, parse: Callable[[Path], Any], default: Any = None) -> Any:
+        """Get a file's parsed contents, parsing it only if it changed"""
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            self._entries.pop(path, None)
+            return default
+        
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == signature:
+            self.hits += 1
+            return entry[1]
+        
+        self.misses += 1
+        value = parse(path)
+        self._entries[path] = (signature, value)
+        return value
+    
+    def invalidate(self, path: Path):
+        """Forget a file, for writes that may not change its size or mtime"""
+        self._entries.pop(path, None)
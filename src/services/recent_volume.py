@@ -0,0 +1,83 @@
+"""
+Rolling per-exercise training volume for GGOS
+"""
+
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Deque, Dict, Optional, Tuple
+
+
+class RecentVolume:
+    """Per-exercise deaths over a rolling window of recent days
+    
+    Workouts are added one at a time into per-day buckets, and running
+    totals are kept for the whole window. Buckets that fall out of the
+    window are subtracted as time moves on, so neither adding a workout
+    nor reading the totals rescans the history.
+    """
+    
+    def __init__(self, window_days: int):
+        """Initialize an empty window"""
+        self.window_days = window_days
+        self._days: Deque[Tuple[date, Dict[str, int]]] = deque()
+        self._totals: Dict[str, int] = {}
+    
+    def add_workout(self, timestamp: str, exercise_deaths: Dict[str, int]):
+        """Add a workout's deaths per exercise key"""
+        day = _day(timestamp)
+        if day is None or day <= self._cutoff(date.today()):
+            return
+        
+        # Workouts normally arrive in order; keep buckets sorted if not
+        if self._days and self._days[-1][0] == day:
+            bucket = self._days[-1][1]
+        elif not self._days or self._days[-1][0] < day:
+            bucket = {}
+            self._days.append((day, bucket))
+        else:
+            bucket = self._insert_bucket(day)
+        
+        for key, deaths in exercise_deaths.items():
+            bucket[key] = bucket.get(key, 0) + deaths
+            self._totals[key] = self._totals.get(key, 0) + deaths
+    
+    def covers(self, timestamp: str) -> bool:
+        """Check whether a workout at timestamp falls inside the window"""
+        day = _day(timestamp)
+        return day is not None and day > self._cutoff(date.today())
+    
+    def get_totals(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Get per-exercise deaths within the window ending today"""
+        cutoff = self._cutoff(today or date.today())
+        while self._days and self._days[0][0] <= cutoff:
+            _, bucket = self._days.popleft()
+            for key, deaths in bucket.items():
+                remaining = self._totals[key] - deaths
+                if remaining:
+                    self._totals[key] = remaining
+                else:
+                    del self._totals[key]
+        return dict(self._totals)
+    
+    def _cutoff(self, today: date) -> date:
+        """Get the last day that is outside the window"""
+        return today - timedelta(days=self.window_days)
+    
+    def _insert_bucket(self, day: date) -> Dict[str, int]:
+        """Find or create the bucket for an out-of-order day"""
+        for existing_day, bucket in self._days:
+            if existing_day == day:
+                return bucket
+        
+        bucket: Dict[str, int] = {}
+        days = sorted(list(self._days) + [(day, bucket)], key=lambda item: item[0])
+        self._days = deque(days)
+        return bucket
+
+
+def _day(timestamp: str) -> Optional[date]:
+    """Get the day of an ISO timestamp, or None if it is not one"""
+    try:
+        return datetime.fromisoformat(timestamp.replace('Z', '+00:00')).date()
+    except (AttributeError, ValueError):
+        return None
@@ -0,0 +1,357 @@
+"""
+SQLite storage backend for GGOS
+"""
+
+import json
+import sqlite3
+import threading
+from array import array
+from collections.abc import Sequence
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Iterator, Optional, Tuple
+from src.models.exercise import Exercise
+from src.services.storage import BaseStorageService, HISTORY_LOAD_LIMIT
+from src.services.history_log import CorruptRecord
+from src.services.history_segments import month_key
+from src.services.history_stats import HistoryRollups, HistoryStats
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS exercises (
+    position INTEGER PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    deaths INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp);
+CREATE INDEX IF NOT EXISTS history_deaths ON history (deaths);
+CREATE TABLE IF NOT EXISTS exercise_snapshots (
+    hash TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS history_stats (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    last_id INTEGER NOT NULL,
+    row_count INTEGER NOT NULL,
+    data TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStorageService(BaseStorageService):
+    """Handles data persistence for GGOS in a SQLite database
+    
+    The history is a table indexed on timestamp and deaths, so appends,
+    recent-workout loads and filters are indexed queries whose cost does
+    not grow with the size of the history. When writing behind, the writer
+    thread has its own connection; WAL mode lets it commit while the UI
+    thread reads.
+    """
+    
+    DATABASE_NAME = "ggos.db"
+    
+    def __init__(self, data_dir: Optional[str] = None, write_behind: bool = False,
+                 on_corrupt: Optional[Callable[[CorruptRecord], None]] = None):
+        """Initialize storage service"""
+        super().__init__(data_dir, write_behind, on_corrupt)
+        
+        self.database_file = self.data_dir / self.DATABASE_NAME
+        self.connection = sqlite3.connect(str(self.database_file))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SCHEMA)
+        
+        # Only the writer thread uses this one
+        self.write_connection = self.connection
+        self._in_batch_commit = False
+        if write_behind:
+            self.write_connection = sqlite3.connect(str(self.database_file), check_same_thread=False)
+            self.write_connection.execute("PRAGMA synchronous=NORMAL")
+    
+    def close(self):
+        """Finish queued writes and close the database connections"""
+        super().close()
+        if self.write_connection is not self.connection:
+            self.write_connection.close()
+        self.connection.close()
+    
+    def _write(self, key: Optional[str], statements: List[Any]):
+        """Run (sql, rows) statements in one transaction, now or on the writer thread"""
+        self._submit_write(key, lambda: self._execute(statements))
+    
+    def _execute(self, statements: List[Any]):
+        """Execute write statements, committing unless a batch commits them"""
+        try:
+            for sql, rows in statements:
+                self.write_connection.executemany(sql, rows)
+        except Exception:
+            self.write_connection.rollback()
+            raise
+        
+        if not self._in_batch_commit:
+            self.write_connection.commit()
+    
+    def _commit_batch(self, writes):
+        """Run a batch's writes in a single transaction"""
+        self._in_batch_commit = True
+        try:
+            super()._commit_batch(writes)
+        except BaseException:
+            self.write_connection.rollback()
+            raise
+        finally:
+            self._in_batch_commit = False
+        self.write_connection.commit()
+    
+    def save_exercises(self, exercises: List[Exercise]) -> bool:
+        """Save exercises to the database"""
+        try:
+            self._write("exercises", [
+                ("DELETE FROM exercises", [()]),
+                ("INSERT INTO exercises (position, data) VALUES (?, ?)",
+                 [(position, json.dumps(exercise.to_dict())) for position, exercise in enumerate(exercises)])
+            ])
+            return True
+        except Exception as e:
+            print(f"Error saving exercises: {e}")
+            return False
+    
+    def load_exercises(self) -> List[Exercise]:
+        """Load exercises from the database"""
+        try:
+            self.flush()
+            rows = self.connection.execute("SELECT data FROM exercises ORDER BY position")
+            return [Exercise.from_dict(json.loads(data)) for (data,) in rows]
+        except Exception as e:
+            print(f"Error loading exercises: {e}")
+            return []
+    
+    def save_settings(self, settings: Dict[str, Any]) -> bool:
+        """Save settings to the database"""
+        try:
+            self._write("settings", [
+                ("DELETE FROM settings", [()]),
+                ("INSERT INTO settings (key, value) VALUES (?, ?)",
+                 [(key, json.dumps(value)) for key, value in settings.items()])
+            ])
+            return True
+        except Exception as e:
+            print(f"Error saving settings: {e}")
+            return False
+    
+    def _read_settings(self) -> Optional[Dict[str, Any]]:
+        """Read settings from the database"""
+        self.flush()
+        rows = self.connection.execute("SELECT key, value FROM settings").fetchall()
+        if not rows:
+            return None
+        return {key: json.loads(value) for key, value in rows}
+    
+    def _append_workouts(self, records: List[Dict[str, Any]]):
+        """Insert workouts into the history table"""
+        self._write(None, [(
+            "INSERT INTO history (timestamp, deaths, data) VALUES (?, ?, ?)",
+            [(workout_data.get("timestamp", ""), workout_data.get("deaths", 0),
+              json.dumps(workout_data, separators=(",", ":")))
+             for workout_data in records]
+        )])
+    
+    def iter_workout_history(self) -> Iterator[Dict[str, Any]]:
+        """Yield every saved workout, oldest first"""
+        self.flush()
+        for (data,) in self.connection.execute("SELECT data FROM history ORDER BY id"):
+            yield json.loads(data)
+    
+    def load_workout_history(self, limit: Optional[int] = HISTORY_LOAD_LIMIT) -> List[Dict[str, Any]]:
+        """Load the most recent workouts (all of them if limit is None)"""
+        try:
+            return self.query_workout_history(limit=limit)
+        except Exception as e:
+            print(f"Error loading workout history: {e}")
+            return []
+    
+    def query_workout_history(self, since: Optional[str] = None, until: Optional[str] = None,
+                              min_deaths: Optional[int] = None, max_deaths: Optional[int] = None,
+                              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get workouts matching a filter, oldest first, using the table indexes"""
+        conditions = []
+        parameters: List[Any] = []
+        for clause, value in (("timestamp >= ?", since), ("timestamp < ?", until),
+                              ("deaths >= ?", min_deaths), ("deaths <= ?", max_deaths)):
+            if value is not None:
+                conditions.append(clause)
+                parameters.append(value)
+        
+        query = "SELECT id, data FROM history"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY id DESC"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        
+        self.flush()
+        rows = self.connection.execute(query, parameters).fetchall()
+        return [json.loads(data) for _, data in reversed(rows)]
+    
+    def load_history_stats(self) -> HistoryStats:
+        """Get the history statistics, reading only rows added since they were saved"""
+        try:
+            self.flush()
+            return self._refresh_history_totals()[0]
+        except Exception as e:
+            print(f"Error loading history statistics: {e}")
+            return HistoryStats()
+    
+    def _load_history_rollups(self) -> HistoryRollups:
+        """Load the rollups saved with the statistics, reading only rows added since"""
+        self.flush()
+        return self._refresh_history_totals()[1]
+    
+    def _refresh_history_totals(self) -> Tuple[HistoryStats, HistoryRollups]:
+        """Bring the saved statistics and rollups up to date with the history table
+        
+        They are used only if none of the rows they counted were deleted
+        since; otherwise they are counted again.
+        """
+        stats, rollups, last_id, row_count = HistoryStats(), HistoryRollups(), 0, 0
+        reused = False
+        row = self.connection.execute("SELECT last_id, row_count, data FROM history_stats").fetchone()
+        if row is not None:
+            (counted,) = self.connection.execute("SELECT COUNT(*) FROM history WHERE id <= ?", (row[0],)).fetchone()
+            data = json.loads(row[2])
+            if counted == row[1] and "rollups" in data:
+                stats, rollups = HistoryStats.from_dict(data["stats"]), HistoryRollups.from_dict(data["rollups"])
+                last_id, row_count = row[0], row[1]
+                reused = True
+        
+        added = 0
+        for last_id, data in self.connection.execute("SELECT id, data FROM history WHERE id > ? ORDER BY id", (last_id,)):
+            workout_data = json.loads(data)
+            stats.add(workout_data)
+            rollups.add(workout_data)
+            added += 1
+        
+        if added or (row is not None and not reused):
+            self._write("history_stats", [(
+                "INSERT OR REPLACE INTO history_stats (id, last_id, row_count, data) VALUES (1, ?, ?, ?)",
+                [(last_id, row_count + added, json.dumps({"stats": stats.to_dict(), "rollups": rollups.to_dict()}))]
+            )])
+        return stats, rollups
+    
+    def backfill_history_totals(self) -> int:
+        """Update history rows with totals added, a few hundred rows at a time"""
+        self.flush()
+        changed = 0
+        last_id = 0
+        while True:
+            rows = self.connection.execute(
+                "SELECT id, data FROM history WHERE id > ? ORDER BY id LIMIT 500", (last_id,)
+            ).fetchall()
+            if not rows:
+                if changed:
+                    # Upgraded rows count differently; recount them next time
+                    self._write("history_stats", [("DELETE FROM history_stats", [()])])
+                return changed
+            
+            updates = []
+            for row_id, data in rows:
+                workout_data = json.loads(data)
+                if self._backfill_record(workout_data):
+                    updates.append((json.dumps(workout_data, separators=(",", ":")), row_id))
+            if updates:
+                self._write(None, [("UPDATE history SET data = ? WHERE id = ?", updates)])
+                self.flush()
+                changed += len(updates)
+            last_id = rows[-1][0]
+    
+    def open_history_reader(self) -> 'SQLiteHistoryReader':
+        """Get a reader that fetches history rows by position"""
+        self.flush()
+        return SQLiteHistoryReader(self.connection)
+    
+    def start_history_maintenance(self, retention_months: int = 0) -> Optional[threading.Thread]:
+        """Delete history older than the retention window; rows need no compaction"""
+        if retention_months > 0:
+            cutoff = month_key(datetime.now(), retention_months - 1)
+            self._write(None, [("DELETE FROM history WHERE timestamp < ?", [(cutoff,)])])
+        return None
+    
+    def _read_snapshots(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Read exercise snapshots from the database"""
+        self.flush()
+        rows = self.connection.execute("SELECT hash, data FROM exercise_snapshots")
+        return {snapshot_hash: json.loads(data) for snapshot_hash, data in rows}
+    
+    def _write_snapshot(self, snapshot_hash: str, data: List[Dict[str, Any]]):
+        """Insert one exercise snapshot"""
+        self._write(None, [(
+            "INSERT OR IGNORE INTO exercise_snapshots (hash, data) VALUES (?, ?)",
+            [(snapshot_hash, json.dumps(data))]
+        )])
+
+
+class SQLiteHistoryReader(Sequence):
+    """The history table as a sequence of records, oldest first
+    
+    Row ids are kept in an array, so record k is a primary key lookup.
+    """
+    
+    def __init__(self, connection: sqlite3.Connection):
+        """Index the ids of the history rows"""
+        self.connection = connection
+        self._ids = array('q')
+        self.refresh()
+    
+    def refresh(self):
+        """Index rows added or removed since the reader was created"""
+        self._ids = array('q', (row_id for (row_id,) in self.connection.execute("SELECT id FROM history ORDER BY id")))
+    
+    def tail(self, count: int) -> List[Dict[str, Any]]:
+        """Get the last count records, oldest first"""
+        return self[max(0, len(self) - count):]
+    
+    def __len__(self) -> int:
+        return len(self._ids)
+    
+    def __iter__(self):
+        if not self._ids:
+            return
+        for (data,) in self.connection.execute(
+            "SELECT data FROM history WHERE id <= ? ORDER BY id", (self._ids[-1],)
+        ):
+            yield json.loads(data)
+    
+    def __reversed__(self):
+        if not self._ids:
+            return
+        for (data,) in self.connection.execute(
+            "SELECT data FROM history WHERE id <= ? ORDER BY id DESC", (self._ids[-1],)
+        ):
+            yield json.loads(data)
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            ids = self._ids[index]
+            rows: Dict[int, str] = {}
+            
+            # Stay well under SQLite's limit on query parameters
+            for start in range(0, len(ids), 500):
+                chunk = list(ids[start:start + 500])
+                rows.update(self.connection.execute(
+                    f"SELECT id, data FROM history WHERE id IN ({','.join('?' * len(chunk))})", chunk
+                ))
+            return [json.loads(rows[row_id]) for row_id in ids if row_id in rows]
+        
+        row = self.connection.execute("SELECT data FROM history WHERE id = ?", (self._ids[index],)).fetchone()
+        if row is None:
+            raise IndexError("history record was deleted")
+        return json.loads(row[0])
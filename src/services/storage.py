@@ -4,15 +4,59 @@ Storage service for GGOS
 
 import json
 import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Any, Optional
-from src.models.exercise import Exercise, UnitType
+from typing import List, Dict, Any, Callable, Iterator, Optional, Sequence
+from src.models.exercise import Exercise, UnitType, exercise_set_hash
+from src.models.workout import WorkoutGenerator
+from src.services.recent_volume import RecentVolume
+from src.services import history_log
+from src.services.history_log import CorruptRecord
+from src.services.atomic_file import write_text_atomic
+from src.services.file_lock import file_lock
+from src.services.read_cache import ReadCache
+from src.services.history_segments import SegmentedHistory, migrate_log, month_key
+from src.services.history_reader import HistoryReader
+from src.services.history_index import HistoryIndex, PossibleNames
+from src.services.history_columns import HistoryColumns
+from src.services.history_stats import HistoryRollups, HistoryStats, SegmentedHistoryStats
+from src.services.write_queue import WriteBehindQueue
 
 
-class StorageService:
-    """Handles data persistence for GGOS"""
+# Number of most recent workouts returned by load_workout_history
+HISTORY_LOAD_LIMIT = 100
+
+DEFAULT_SETTINGS = {
+    "auto_input_enabled": False,
+    "fitness_tracker_enabled": False,
+    "theme": "dark",
+    "window_size": "800x600",
+    "compact_history": False,
+    "generation_mode": "random",
+    "balance_window_days": 14,
+    "history_retention_months": 0
+}
+
+
+class BaseStorageService(ABC):
+    """Storage interface for GGOS, with the logic shared by every backend
+    
+    Backends store exercises, settings, exercise snapshots and the workout
+    history; snapshot resolution, history indexes and defaults live here.
     
-    def __init__(self, data_dir: Optional[str] = None):
+    With write_behind, backends hand their disk writes to a background
+    thread so callers on the UI thread never wait on I/O. Reads flush the
+    queue first, so they always see earlier saves. Inside batch(), writes
+    are held back and committed together when the batch ends.
+    """
+    
+    def __init__(self, data_dir: Optional[str] = None, write_behind: bool = False,
+                 on_corrupt: Optional[Callable[[CorruptRecord], None]] = None):
         """Initialize storage service"""
         if data_dir is None:
             # Use user's home directory
@@ -23,62 +67,178 @@ class StorageService:
         # Ensure data directory exists
         self.data_dir.mkdir(parents=True, exist_ok=True)
         
-        # File paths
-        self.exercises_file = self.data_dir / "exercises.json"
-        self.settings_file = self.data_dir / "settings.json"
-        self.workout_history_file = self.data_dir / "workout_history.json"
+        # Exercise snapshots by hash, and history records by snapshot hash
+        self._snapshots: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        self._snapshot_exercises: Dict[str, Dict[str, Exercise]] = {}
+        self._snapshot_index: Optional[Dict[str, List[Dict[str, Any]]]] = None
+        
+        # Rolling per-exercise volume, built on first use
+        self._recent_volume: Optional[RecentVolume] = None
+        
+        # Per-day, week and month totals, loaded on first use
+        self._rollups: Optional[HistoryRollups] = None
+        
+        self._writer = WriteBehindQueue() if write_behind else None
+        
+        # Called with each damaged record that was set aside; prints if unset
+        self.on_corrupt = on_corrupt
+        
+        # Writes and history records held back by batch()
+        self._batch: Optional["OrderedDict[Any, Callable[[], Any]]"] = None
+        self._batch_records: List[Dict[str, Any]] = []
     
+    @abstractmethod
     def save_exercises(self, exercises: List[Exercise]) -> bool:
-        """Save exercises to file"""
-        try:
-            data = [exercise.to_dict() for exercise in exercises]
-            with open(self.exercises_file, 'w') as f:
-                json.dump(data, f, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving exercises: {e}")
-            return False
+        """Save exercises"""
     
+    @abstractmethod
     def load_exercises(self) -> List[Exercise]:
-        """Load exercises from file"""
-        try:
-            if not self.exercises_file.exists():
-                return []
-            
-            with open(self.exercises_file, 'r') as f:
-                data = json.load(f)
-            
-            return [Exercise.from_dict(item) for item in data]
-        except Exception as e:
-            print(f"Error loading exercises: {e}")
-            return []
+        """Load exercises"""
     
+    @abstractmethod
     def save_settings(self, settings: Dict[str, Any]) -> bool:
-        """Save settings to file"""
-        try:
-            with open(self.settings_file, 'w') as f:
-                json.dump(settings, f, indent=2)
+        """Save settings"""
+    
+    @abstractmethod
+    def _read_settings(self) -> Optional[Dict[str, Any]]:
+        """Read stored settings, or None if there are none yet"""
+    
+    @abstractmethod
+    def _append_workouts(self, records: List[Dict[str, Any]]):
+        """Add records to the end of the history in one durable write"""
+    
+    @abstractmethod
+    def iter_workout_history(self) -> Iterator[Dict[str, Any]]:
+        """Yield every saved workout, oldest first"""
+    
+    @abstractmethod
+    def open_history_reader(self) -> Sequence[Dict[str, Any]]:
+        """Get a random-access view of the history, oldest first
+        
+        The reader indexes record positions and parses records only when
+        they are looked up; it has tail(n) for the newest records and
+        refresh() to pick up later saves.
+        """
+    
+    @abstractmethod
+    def load_history_stats(self) -> HistoryStats:
+        """Get statistics over the whole history
+        
+        The statistics are saved with the history and brought up to date
+        by reading only the records added since, so this costs the same
+        however long the history is.
+        """
+    
+    @abstractmethod
+    def _load_history_rollups(self) -> HistoryRollups:
+        """Load the saved rollups, counting only the records added since they were saved"""
+    
+    @abstractmethod
+    def backfill_history_totals(self) -> int:
+        """Add reps_total, seconds_total and volume to records saved without them
+        
+        Records are upgraded one at a time in constant memory. Returns the
+        number of records upgraded.
+        """
+    
+    @abstractmethod
+    def start_history_maintenance(self, retention_months: int = 0) -> Optional[threading.Thread]:
+        """Delete history older than retention_months (0 keeps it all) and tidy the rest
+        
+        Returns the background thread doing the work, if there is one.
+        """
+    
+    @abstractmethod
+    def _read_snapshots(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Read all stored exercise snapshots"""
+    
+    @abstractmethod
+    def _write_snapshot(self, snapshot_hash: str, data: List[Dict[str, Any]]):
+        """Store one new exercise snapshot"""
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait for queued writes to reach storage; False on timeout"""
+        if self._writer is None:
             return True
-        except Exception as e:
-            print(f"Error saving settings: {e}")
-            return False
+        return self._writer.flush(timeout)
+    
+    def close(self):
+        """Finish queued writes and release the service's resources"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+    
+    @contextmanager
+    def batch(self):
+        """Group the writes made inside the block into one commit
+        
+        History appends are written and synced once, repeated saves of
+        the same file collapse to the last one, and SQLite commits
+        everything in one transaction. Reads inside the block do not see
+        its writes until it ends. If the block raises, none of its writes
+        are made.
+        """
+        if self._batch is not None:
+            yield
+            return
+        
+        self._batch = OrderedDict()
+        try:
+            yield
+        except BaseException:
+            self._batch = None
+            self._batch_records = []
+            # These counted the discarded workouts and snapshots; rebuild them on next use
+            self._snapshots = None
+            self._snapshot_exercises = {}
+            self._snapshot_index = None
+            self._recent_volume = None
+            self._rollups = None
+            raise
+        
+        if self._batch_records:
+            records, self._batch_records = self._batch_records, []
+            self._append_workouts(records)
+        
+        writes, self._batch = list(self._batch.values()), None
+        if writes:
+            self._submit_write(None, lambda: self._commit_batch(writes))
+    
+    def _commit_batch(self, writes: List[Callable[[], Any]]):
+        """Run the writes collected by a batch"""
+        for write in writes:
+            write()
+    
+    def _report_corrupt(self, problem: CorruptRecord):
+        """Pass a damaged record to on_corrupt, or print it"""
+        if self.on_corrupt is not None:
+            self.on_corrupt(problem)
+        else:
+            print(f"Set aside damaged data at {problem.describe()}")
+    
+    def _submit_write(self, key: Optional[str], write: Callable[[], Any]):
+        """Run a write now, hold it for the current batch, or queue it when writing behind
+        
+        Pending writes with the same key replace each other; key None
+        adds a write that always runs. Payloads must be built before
+        submitting, since the write may run after the caller moves on.
+        """
+        if self._batch is not None:
+            self._batch[key if key is not None else object()] = write
+        elif self._writer is None:
+            write()
+        else:
+            self._writer.submit(key, write)
     
     def load_settings(self) -> Dict[str, Any]:
-        """Load settings from file"""
-        default_settings = {
-            "auto_input_enabled": False,
-            "fitness_tracker_enabled": False,
-            "theme": "dark",
-            "window_size": "800x600"
-        }
+        """Load settings"""
+        default_settings = dict(DEFAULT_SETTINGS)
         
         try:
-            if not self.settings_file.exists():
+            data = self._read_settings()
+            if data is None:
                 return default_settings
             
-            with open(self.settings_file, 'r') as f:
-                data = json.load(f)
-            
             # Merge with defaults to ensure all keys exist
             for key, value in default_settings.items():
                 if key not in data:
@@ -92,32 +252,285 @@ class StorageService:
     def save_workout_history(self, workout_data: Dict[str, Any]) -> bool:
         """Save workout to history"""
         try:
-            history = self.load_workout_history()
-            history.append(workout_data)
-            
-            # Keep only last 100 workouts
-            if len(history) > 100:
-                history = history[-100:]
+            if self._batch is not None:
+                self._batch_records.append(workout_data)
+            else:
+                self._append_workouts([workout_data])
             
-            with open(self.workout_history_file, 'w') as f:
-                json.dump(history, f, indent=2)
+            if self._snapshot_index is not None:
+                self._index_workout(workout_data)
+            if self._recent_volume is not None:
+                self._add_recent_volume(workout_data)
+            if self._rollups is not None:
+                self._rollups.add(workout_data)
             return True
         except Exception as e:
             print(f"Error saving workout history: {e}")
             return False
     
-    def load_workout_history(self) -> List[Dict[str, Any]]:
-        """Load workout history"""
+    def load_workout_history(self, limit: Optional[int] = HISTORY_LOAD_LIMIT) -> List[Dict[str, Any]]:
+        """Load the most recent workouts (all of them if limit is None)"""
         try:
-            if not self.workout_history_file.exists():
-                return []
-            
-            with open(self.workout_history_file, 'r') as f:
-                return json.load(f)
+            if limit is None:
+                return list(self.iter_workout_history())
+            return list(deque(self.iter_workout_history(), maxlen=limit))
         except Exception as e:
             print(f"Error loading workout history: {e}")
             return []
     
+    def query_workout_history(self, since: Optional[str] = None, until: Optional[str] = None,
+                              min_deaths: Optional[int] = None, max_deaths: Optional[int] = None,
+                              limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get workouts matching a filter, oldest first
+        
+        since/until are ISO timestamps (until is exclusive); limit keeps
+        only the most recent matches. This scans the history; backends
+        with indexes override it.
+        """
+        matches = (
+            workout_data for workout_data in self.iter_workout_history()
+            if _matches_filter(workout_data, since, until, min_deaths, max_deaths)
+        )
+        if limit is None:
+            return list(matches)
+        return list(deque(matches, maxlen=limit))
+    
+    def save_exercise_snapshot(self, exercises: List[Exercise]) -> str:
+        """Store an exercise configuration once and return its content hash"""
+        snapshot_hash = exercise_set_hash(exercises)
+        snapshots = self._load_snapshots()
+        if snapshot_hash in snapshots:
+            return snapshot_hash
+        
+        snapshots[snapshot_hash] = [exercise.to_dict() for exercise in exercises]
+        try:
+            self._write_snapshot(snapshot_hash, snapshots[snapshot_hash])
+        except Exception as e:
+            print(f"Error saving exercise snapshot: {e}")
+        return snapshot_hash
+    
+    def load_exercise_snapshot(self, snapshot_hash: Optional[str]) -> Optional[List[Exercise]]:
+        """Load the exercise configuration stored under a snapshot hash"""
+        data = self._load_snapshots().get(snapshot_hash)
+        if data is None:
+            return None
+        return [Exercise.from_dict(item) for item in data]
+    
+    def find_workouts_by_snapshot(self, snapshot_hash: str) -> List[Dict[str, Any]]:
+        """Get the history records generated from an exercise configuration"""
+        if self._snapshot_index is None:
+            self._snapshot_index = {}
+            for workout_data in self.iter_workout_history():
+                self._index_workout(workout_data)
+        return list(self._snapshot_index.get(snapshot_hash, []))
+    
+    def get_workout_exercises(self, workout_data: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        """Get a history record's exercise breakdown with names and units filled in
+        
+        Records either carry their own exercise entries, refer to their
+        snapshot by exercise id, or are compact and are regenerated from
+        their seed. Returns None if the breakdown cannot be recovered.
+        """
+        snapshot_hash = workout_data.get("exercise_set")
+        entries = workout_data.get("exercises")
+        
+        if entries is None:
+            exercises = self.load_exercise_snapshot(snapshot_hash)
+            if exercises is None or workout_data.get("seed") is None:
+                return None
+            workout = WorkoutGenerator.regenerate(
+                exercises, workout_data.get("deaths", 0), workout_data["seed"],
+                weights=workout_data.get("weights")
+            )
+            return [
+                {
+                    "id": we.exercise.id,
+                    "name": we.exercise.name,
+                    "amount": we.allocated_amount,
+                    "unit": we.exercise.get_unit_display(),
+                    "deaths_allocated": we.deaths_allocated
+                }
+                for we in workout.exercises
+            ]
+        
+        exercises_by_id = self._get_snapshot_exercises(snapshot_hash)
+        resolved = []
+        for entry in entries:
+            exercise = exercises_by_id.get(entry.get("id"))
+            if exercise is None or "name" in entry:
+                resolved.append(entry)
+                continue
+            resolved.append({
+                "id": exercise.id,
+                "name": exercise.name,
+                "amount": entry.get("amount", 0),
+                "unit": exercise.get_unit_display(),
+                "deaths_allocated": entry.get("deaths_allocated", 0)
+            })
+        return resolved
+    
+    def history_exercise_names(self, workout_data: Dict[str, Any]) -> List[str]:
+        """Get the names of a history record's exercises without regenerating it
+        
+        Ids are resolved through the record's snapshot, and compact records
+        are named from their volume if they have one. Compact records
+        without volume get every exercise in their snapshot, as
+        PossibleNames; regenerated_exercise_names finds the actual ones.
+        """
+        exercises_by_id = self._get_snapshot_exercises(workout_data.get("exercise_set"))
+        entries = workout_data.get("exercises")
+        if entries is None and "volume" in workout_data:
+            entries = [{"id": key} for key in workout_data["volume"]]
+        elif entries is None:
+            return PossibleNames(exercise.name for exercise in exercises_by_id.values())
+        
+        names = []
+        for entry in entries:
+            exercise = exercises_by_id.get(entry.get("id"))
+            name = entry.get("name") or (exercise.name if exercise is not None else entry.get("id"))
+            if name:
+                names.append(name)
+        return names
+    
+    def regenerated_exercise_names(self, workout_data: Dict[str, Any]) -> List[str]:
+        """Get the names of a compact record's exercises by regenerating it from its seed"""
+        return [entry["name"] for entry in self.get_workout_exercises(workout_data) or [] if entry.get("name")]
+    
+    def open_history_index(self) -> HistoryIndex:
+        """Index the history by timestamp, deaths and exercise name for filtering
+        
+        The history is read once; add later saves with HistoryIndex.add.
+        Compact records are regenerated only when a query reaches them.
+        """
+        return HistoryIndex(self.open_history_reader(), self.history_exercise_names,
+                            self.regenerated_exercise_names)
+    
+    def open_history_columns(self) -> HistoryColumns:
+        """Load the history into columns for filters and aggregates in memory
+        
+        The history is read once; add later saves with HistoryColumns.append.
+        Compact records are regenerated only when an exercise filter reaches them.
+        """
+        return HistoryColumns(self.open_history_reader(), self.history_exercise_names,
+                              self.regenerated_exercise_names)
+    
+    def _backfill_record(self, workout_data: Dict[str, Any]) -> bool:
+        """Fill in a record's totals from its exercises; False if it needs nothing or cannot be resolved
+        
+        Compact records get no volume, which would outweigh the rest of the
+        record; it is rebuilt from the seed when needed.
+        """
+        compact = "exercises" not in workout_data
+        fields = ("reps_total", "seconds_total") if compact else ("reps_total", "seconds_total", "volume")
+        if all(field in workout_data for field in fields):
+            return False
+        
+        exercises = self.get_workout_exercises(workout_data)
+        if exercises is None or any("unit" not in exercise for exercise in exercises):
+            return False
+        
+        totals = record_totals(exercises)
+        if compact:
+            del totals["volume"]
+        workout_data.update(totals)
+        return True
+    
+    def get_history_rollups(self) -> HistoryRollups:
+        """Get workouts, deaths, reps and seconds per day, ISO week and month
+        
+        The rollups are loaded once; later saves update them in place, so
+        questions like rollups.current("week")["deaths"] are dictionary
+        lookups however long the history is.
+        """
+        if self._rollups is None:
+            try:
+                self._rollups = self._load_history_rollups()
+            except Exception as e:
+                print(f"Error loading history rollups: {e}")
+                return HistoryRollups()
+        return self._rollups
+    
+    def get_recent_volume(self, window_days: int) -> Dict[str, int]:
+        """Get deaths per exercise over the last window_days days
+        
+        Keys are exercise ids, or names for records saved before exercises
+        were referenced by id. The history is read once; later saves
+        update the totals incrementally.
+        """
+        if self._recent_volume is None or self._recent_volume.window_days != window_days:
+            self._recent_volume = RecentVolume(window_days)
+            for workout_data in self.iter_workout_history():
+                self._add_recent_volume(workout_data)
+        return self._recent_volume.get_totals()
+    
+    def _add_recent_volume(self, workout_data: Dict[str, Any]):
+        """Add a history record to the rolling volume"""
+        if not self._recent_volume.covers(workout_data.get("timestamp", "")):
+            return
+        
+        exercise_deaths: Dict[str, int] = {}
+        entries = workout_data.get("exercises")
+        if entries is None:
+            # Compact record: rebuild the allocation from its seed
+            exercises = self.load_exercise_snapshot(workout_data.get("exercise_set"))
+            if exercises is None or workout_data.get("seed") is None:
+                return
+            workout = WorkoutGenerator.regenerate(
+                exercises, workout_data.get("deaths", 0), workout_data["seed"],
+                weights=workout_data.get("weights")
+            )
+            entries = [
+                {"id": we.exercise.id, "deaths_allocated": we.deaths_allocated}
+                for we in workout.exercises
+            ]
+        
+        for entry in entries:
+            key = entry.get("id", entry.get("name"))
+            if key is not None:
+                exercise_deaths[key] = exercise_deaths.get(key, 0) + entry.get("deaths_allocated", 0)
+        
+        self._recent_volume.add_workout(workout_data.get("timestamp", ""), exercise_deaths)
+    
+    def import_from(self, source: 'BaseStorageService'):
+        """Copy everything stored in another backend into this one"""
+        with self.batch():
+            self.save_exercises(source.load_exercises())
+            settings = source._read_settings()
+            if settings is not None:
+                self.save_settings(settings)
+            
+            existing = self._load_snapshots()
+            for snapshot_hash, data in source._load_snapshots().items():
+                if snapshot_hash not in existing:
+                    existing[snapshot_hash] = data
+                    self._write_snapshot(snapshot_hash, data)
+            
+            for workout_data in source.iter_workout_history():
+                self.save_workout_history(workout_data)
+    
+    def _load_snapshots(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Load all exercise snapshots, once per service"""
+        if self._snapshots is None:
+            self._snapshots = {}
+            try:
+                self._snapshots = self._read_snapshots()
+            except Exception as e:
+                print(f"Error loading exercise snapshots: {e}")
+        return self._snapshots
+    
+    def _get_snapshot_exercises(self, snapshot_hash: Optional[str]) -> Dict[str, Exercise]:
+        """Get a snapshot's exercises keyed by id"""
+        if snapshot_hash not in self._snapshot_exercises:
+            exercises = self.load_exercise_snapshot(snapshot_hash) or []
+            self._snapshot_exercises[snapshot_hash] = {exercise.id: exercise for exercise in exercises}
+        return self._snapshot_exercises[snapshot_hash]
+    
+    def _index_workout(self, workout_data: Dict[str, Any]):
+        """Add a history record to the snapshot index"""
+        snapshot_hash = workout_data.get("exercise_set")
+        if snapshot_hash is not None:
+            self._snapshot_index.setdefault(snapshot_hash, []).append(workout_data)
+    
     def get_default_exercises(self) -> List[Exercise]:
         """Get default exercises for new users (equipment-free)"""
         return [
@@ -153,3 +566,364 @@ class StorageService:
             Exercise("Donkey Kicks", UnitType.REPS, 2),
             Exercise("Fire Hydrants", UnitType.REPS, 2)
         ]
+
+
+class StorageService(BaseStorageService):
+    """Handles data persistence for GGOS in JSON files
+    
+    Files are replaced atomically and history appends are fsynced, so a
+    crash mid-write never leaves a truncated file behind. The history is
+    kept in monthly segment files under history/, and parsed exercises and
+    segments are cached until the files change on disk.
+    
+    Several instances may share a data directory. Writes hold a lock on
+    the directory's .lock file, and saving exercises or settings merges
+    this instance's changes into whatever another instance saved since,
+    instead of overwriting it.
+    """
+    
+    def __init__(self, data_dir: Optional[str] = None, write_behind: bool = False,
+                 on_corrupt: Optional[Callable[[CorruptRecord], None]] = None):
+        """Initialize storage service"""
+        super().__init__(data_dir, write_behind, on_corrupt)
+        
+        # File paths
+        self.exercises_file = self.data_dir / "exercises.json"
+        self.settings_file = self.data_dir / "settings.json"
+        self.history_dir = self.data_dir / "history"
+        self.workout_history_file = self.data_dir / "workout_history.jsonl"
+        self.legacy_workout_history_file = self.data_dir / "workout_history.json"
+        self.exercise_snapshots_file = self.data_dir / "exercise_snapshots.json"
+        self.lock_file = self.data_dir / ".lock"
+        
+        self.history_stats_file = self.data_dir / "history_stats.json"
+        
+        self.read_cache = ReadCache()
+        self._history_stats: Optional[SegmentedHistoryStats] = None
+        
+        # The exercises and settings as this instance last loaded or saved
+        # them, which saves are merged against
+        self._merge_bases: Dict[Path, Any] = {}
+        
+        # One-time upgrades: JSON array file to single log to monthly segments
+        try:
+            with file_lock(self.lock_file):
+                if self.legacy_workout_history_file.exists() and not self.workout_history_file.exists():
+                    history_log.migrate_json_array(self.legacy_workout_history_file, self.workout_history_file,
+                                                   self._report_corrupt)
+                if self.workout_history_file.exists() and not self.history_dir.exists():
+                    migrate_log(self.workout_history_file, self.history_dir)
+        except Exception as e:
+            print(f"Error migrating workout history: {e}")
+        
+        self.history = SegmentedHistory(self.history_dir, self.read_cache, self._report_corrupt)
+    
+    def save_exercises(self, exercises: List[Exercise]) -> bool:
+        """Save exercises to file"""
+        try:
+            data = [exercise.to_dict() for exercise in exercises]
+            self.read_cache.invalidate(self.exercises_file)
+            self._submit_merged("exercises", self.exercises_file, data, [], _merge_exercises)
+            return True
+        except Exception as e:
+            print(f"Error saving exercises: {e}")
+            return False
+    
+    def load_exercises(self) -> List[Exercise]:
+        """Load exercises from file"""
+        try:
+            self.flush()
+            data = self.read_cache.get(self.exercises_file, self._read_json_salvaging, [])
+            self._merge_bases[self.exercises_file] = data
+            
+            # Fresh objects each time; the cached dicts stay untouched
+            exercises = []
+            for item in data:
+                try:
+                    exercises.append(Exercise.from_dict(item))
+                except (KeyError, TypeError, ValueError) as e:
+                    self._report_corrupt(CorruptRecord(self.exercises_file, 0, 0, json.dumps(item).encode('utf-8'),
+                                                       f"not an exercise: {e}"))
+            return exercises
+        except Exception as e:
+            print(f"Error loading exercises: {e}")
+            return []
+    
+    def save_settings(self, settings: Dict[str, Any]) -> bool:
+        """Save settings to file"""
+        try:
+            self._submit_merged("settings", self.settings_file, dict(settings), {}, _merge_settings)
+            return True
+        except Exception as e:
+            print(f"Error saving settings: {e}")
+            return False
+    
+    def _read_settings(self) -> Optional[Dict[str, Any]]:
+        """Read settings from file"""
+        self.flush()
+        if not self.settings_file.exists():
+            return None
+        
+        data = self._read_json_salvaging(self.settings_file)
+        if not isinstance(data, dict):
+            return None
+        
+        # Compare against what load_settings hands out, defaults included
+        self._merge_bases[self.settings_file] = {**DEFAULT_SETTINGS, **data}
+        return data
+    
+    def _submit_merged(self, key: str, path: Path, data: Any, empty: Any,
+                       merge: Callable[[Any, Any, Any], Any]):
+        """Queue a save of data that is merged with the file when it is written
+        
+        The merge base is what this instance last loaded or actually wrote,
+        so saves that replace each other in the queue or a batch never
+        merge against a state that did not reach the disk.
+        """
+        def write():
+            base = self._merge_bases.get(path, empty)
+            self._merge_bases[path] = self._write_merged(path, base, data, merge)
+        self._submit_write(key, write)
+    
+    def _write_merged(self, path: Path, base: Any, ours: Any, merge: Callable[[Any, Any, Any], Any]) -> Any:
+        """Merge this instance's changes into the file as it is now, under the lock
+        
+        merge(base, ours, theirs) gets what this instance last saw, what it
+        is saving and what is on disk, and returns what to write. Returns
+        what was written.
+        """
+        with file_lock(self.lock_file):
+            theirs = None
+            if path.exists():
+                try:
+                    theirs = json.loads(path.read_bytes())
+                except ValueError:
+                    pass
+            if theirs is not None and type(theirs) is type(ours):
+                ours = merge(base, ours, theirs)
+            _write_json(path, ours)
+        return ours
+    
+    def _read_json_salvaging(self, path: Path) -> Any:
+        """Read a JSON file; if it is damaged, keep a copy and recover what can be read
+        
+        The damaged file is copied to <name>.damaged before anything is
+        saved over it. Arrays keep their readable items and objects their
+        readable entries; anything else is lost and None is returned.
+        """
+        data = path.read_bytes()
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            reason = str(e)
+        
+        shutil.copyfile(path, path.with_name(path.name + ".damaged"))
+        salvaged, problems = None, []
+        if data.lstrip().startswith(b"["):
+            salvaged, problems = history_log.salvage_json_array(data, path)
+        elif data.lstrip().startswith(b"{"):
+            salvaged, problems = history_log.salvage_json_object(data, path)
+        
+        # A file cut short loses nothing readable, but is still reported
+        for problem in problems or [CorruptRecord(path, 0, 0, data, reason)]:
+            self._report_corrupt(problem)
+        return salvaged
+    
+    def _append_workouts(self, records: List[Dict[str, Any]]):
+        """Append workouts to their monthly history segments"""
+        self._submit_write(None, lambda: self.history.append_records(records))
+    
+    def load_workout_history(self, limit: Optional[int] = HISTORY_LOAD_LIMIT) -> List[Dict[str, Any]]:
+        """Load the most recent workouts (all of them if limit is None)
+        
+        Segments are read newest first until there are enough records, so
+        older months are never opened. Parsed segments are cached and
+        shared; the records must not be modified.
+        """
+        try:
+            self.flush()
+            segments = []
+            count = 0
+            for key in reversed(self.history.segment_keys()):
+                if limit is not None and count >= limit:
+                    break
+                segment = self.history.read_segment(key)
+                segments.append(segment)
+                count += len(segment)
+            
+            records = [record for segment in reversed(segments) for record in segment]
+            if limit is None:
+                return records
+            return records[-limit:] if limit > 0 else []
+        except Exception as e:
+            print(f"Error loading workout history: {e}")
+            return []
+    
+    def iter_workout_history(self) -> Iterator[Dict[str, Any]]:
+        """Yield every saved workout, oldest first, one month at a time"""
+        self.flush()
+        return self.history.iter_records()
+    
+    def load_history_stats(self) -> HistoryStats:
+        """Get the history statistics, reading only what was appended to each month since they were saved"""
+        try:
+            self.flush()
+            self._refresh_history_stats()
+            return self._history_stats.totals()
+        except Exception as e:
+            print(f"Error loading history statistics: {e}")
+            return HistoryStats()
+    
+    def _load_history_rollups(self) -> HistoryRollups:
+        """Load the per-month rollups saved with the statistics, bringing them up to date"""
+        self.flush()
+        self._refresh_history_stats()
+        return self._history_stats.rollups()
+    
+    def _refresh_history_stats(self):
+        """Read what was appended to each month since the saved statistics were last updated"""
+        if self._history_stats is None:
+            self._history_stats = SegmentedHistoryStats(self.history, self.history_stats_file)
+        self._history_stats.refresh()
+    
+    def backfill_history_totals(self) -> int:
+        """Rewrite each history segment file with totals added, streaming line by line"""
+        self.flush()
+        return self.history.rewrite_records(self._backfill_record)
+    
+    def open_history_reader(self) -> HistoryReader:
+        """Get a memory-mapped reader over the monthly segments"""
+        self.flush()
+        return HistoryReader(self.history)
+    
+    def start_history_maintenance(self, retention_months: int = 0) -> Optional[threading.Thread]:
+        """Delete expired months and compress finished ones on a background thread"""
+        thread = threading.Thread(
+            target=self._maintain_history, args=(retention_months,),
+            name="ggos-history-maintenance", daemon=True
+        )
+        thread.start()
+        return thread
+    
+    def _maintain_history(self, retention_months: int):
+        """Apply the retention policy, then compact every month before this one"""
+        try:
+            today = datetime.now()
+            if retention_months > 0:
+                # Keep retention_months months, this one included
+                self.history.delete_before(month_key(today, retention_months - 1))
+            self.history.compact_before(month_key(today))
+            
+            # Compaction has checked the older months; check the rest
+            for key in self.history.segment_keys():
+                if key >= month_key(today):
+                    self.history.check_segment(key)
+        except Exception as e:
+            print(f"Error maintaining workout history: {e}")
+    
+    def _read_snapshots(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Read exercise snapshots from file"""
+        self.flush()
+        if not self.exercise_snapshots_file.exists():
+            return {}
+        
+        data = self._read_json_salvaging(self.exercise_snapshots_file)
+        if not isinstance(data, dict):
+            return {}
+        # Salvage can pick up a pair from inside a damaged snapshot
+        return {key: value for key, value in data.items() if isinstance(value, list)}
+    
+    def _write_snapshot(self, snapshot_hash: str, data: List[Dict[str, Any]]):
+        """Rewrite the snapshot file with the new snapshot included"""
+        snapshots = dict(self._load_snapshots())
+        self._submit_write("exercise_snapshots", lambda: self._write_merged(
+            self.exercise_snapshots_file, {}, snapshots, lambda base, ours, theirs: {**theirs, **ours}
+        ))
+
+
+def create_storage_service(data_dir: Optional[str] = None, backend: Optional[str] = None,
+                           write_behind: bool = False,
+                           on_corrupt: Optional[Callable[[CorruptRecord], None]] = None) -> BaseStorageService:
+    """Create the storage service for a data directory
+    
+    backend is "json" or "sqlite". If omitted, SQLite is used when the
+    directory already holds a GGOS database and JSON files otherwise.
+    """
+    from src.services.sqlite_storage import SQLiteStorageService
+    
+    if backend is None:
+        directory = Path(data_dir) if data_dir is not None else Path.home() / ".ggos"
+        backend = "sqlite" if (directory / SQLiteStorageService.DATABASE_NAME).exists() else "json"
+    
+    if backend == "sqlite":
+        return SQLiteStorageService(data_dir, write_behind, on_corrupt)
+    if backend == "json":
+        return StorageService(data_dir, write_behind, on_corrupt)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+def record_totals(exercises: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Get the reps_total, seconds_total and volume fields for a record's exercises
+    
+    volume maps each exercise's id (or name, for old entries) to its amount.
+    """
+    totals = {"reps_total": 0, "seconds_total": 0, "volume": {}}
+    for exercise in exercises:
+        amount = exercise.get("amount", 0)
+        totals["reps_total" if exercise.get("unit") == "reps" else "seconds_total"] += amount
+        key = exercise.get("id") or exercise.get("name", "Unknown")
+        totals["volume"][key] = totals["volume"].get(key, 0) + amount
+    return totals
+
+
+def _write_json(path: Path, data: Any):
+    """Atomically replace a JSON file"""
+    write_text_atomic(path, json.dumps(data, indent=2))
+
+
+def _merge_exercises(base: List[Dict[str, Any]], ours: List[Dict[str, Any]],
+                     theirs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Merge exercise lists by id, keeping what each side added, changed or removed"""
+    base_by_id = {item.get("id"): item for item in base}
+    theirs_by_id = {item.get("id"): item for item in theirs}
+    
+    merged = []
+    for item in ours:
+        exercise_id = item.get("id")
+        if item != base_by_id.get(exercise_id):
+            merged.append(item)
+        elif exercise_id in theirs_by_id:
+            # Unchanged here, so take their version
+            merged.append(theirs_by_id[exercise_id])
+    
+    ours_ids = {item.get("id") for item in ours}
+    merged.extend(item for item in theirs if item.get("id") not in ours_ids and item.get("id") not in base_by_id)
+    return merged
+
+
+def _merge_settings(base: Dict[str, Any], ours: Dict[str, Any], theirs: Dict[str, Any]) -> Dict[str, Any]:
+    """Merge settings key by key, with this instance's changes winning"""
+    merged = dict(theirs)
+    for key, value in ours.items():
+        if key not in base or base[key] != value:
+            merged[key] = value
+    for key in base:
+        if key not in ours:
+            merged.pop(key, None)
+    return merged
+
+
+def _matches_filter(workout_data: Dict[str, Any], since: Optional[str], until: Optional[str],
+                    min_deaths: Optional[int], max_deaths: Optional[int]) -> bool:
+    """Check a history record against query_workout_history's filter"""
+    timestamp = workout_data.get("timestamp", "")
+    deaths = workout_data.get("deaths", 0)
+    if since is not None and timestamp < since:
+        return False
+    if until is not None and timestamp >= until:
+        return False
+    if min_deaths is not None and deaths < min_deaths:
+        return False
+    if max_deaths is not None and deaths > max_deaths:
+        return False
+    return True
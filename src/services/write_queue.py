@@ -0,0 +1,79 @@
+"""
+Write-behind queue for GGOS storage
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+
+class WriteBehindQueue:
+    """Runs storage writes on a background thread
+    
+    Writes are queued under a key. A new write for a key that is still
+    waiting replaces the old one, so only the latest snapshot of, say, the
+    exercise list reaches the disk. Writes submitted with key None are
+    never merged and run in submission order. The queue is bounded:
+    submit blocks while max_pending distinct writes are waiting.
+    """
+    
+    def __init__(self, max_pending: int = 64):
+        """Initialize the queue and start its writer thread"""
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[Any, Callable[[], Any]]" = OrderedDict()
+        self._condition = threading.Condition()
+        self._busy = False
+        self._closed = False
+        
+        self._thread = threading.Thread(target=self._run, name="ggos-writer", daemon=True)
+        self._thread.start()
+    
+    def submit(self, key: Optional[Any], write: Callable[[], Any]):
+        """Queue a write, replacing any queued write with the same key"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("write queue is closed")
+            
+            if key is None:
+                key = object()
+            
+            while key not in self._pending and len(self._pending) >= self.max_pending:
+                self._condition.wait()
+            
+            self._pending[key] = write
+            self._condition.notify_all()
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued write has finished; False on timeout"""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._pending and not self._busy, timeout)
+    
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """Finish queued writes and stop the writer thread"""
+        flushed = self.flush(timeout)
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        return flushed
+    
+    def _run(self):
+        """Take writes off the queue, oldest first, until closed"""
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                key, write = self._pending.popitem(last=False)
+                self._busy = True
+                self._condition.notify_all()
+            
+            try:
+                write()
+            except Exception as e:
+                name = key if isinstance(key, str) else "workout history"
+                print(f"Error writing {name} in background: {e}")
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
@@ -87,6 +87,227 @@ def test_workout_generation():
         print(f"❌ Workout generation test failed: {e}")
         return False
 
+def test_allocation_engine():
+    """Test that large death counts are fully allocated"""
+    print("\nTesting allocation engine...")
+    
+    try:
+        from src.models.exercise import Exercise, UnitType
+        from src.models.workout import WorkoutGenerator
+        
+        exercises = [Exercise(f"Exercise {i}", UnitType.REPS, 2) for i in range(20)]
+        
+        for deaths in (1, 7, 1000, 10**7):
+            allocations = WorkoutGenerator.allocate_deaths(deaths, len(exercises))
+            assert len(allocations) == len(exercises)
+            assert all(allocation >= 0 for allocation in allocations)
+            assert sum(allocations) == deaths
+            
+            workout = WorkoutGenerator.generate_workout(exercises, deaths)
+            assert workout.total_deaths == deaths
+            assert sum(we.deaths_allocated for we in workout.exercises) == deaths
+        
+        print("✅ Allocation engine accounts for every death")
+        return True
+    except Exception as e:
+        print(f"❌ Allocation engine test failed: {e}")
+        return False
+
+def test_workout_aggregation():
+    """Test merging workout picks by exercise"""
+    print("\nTesting workout aggregation...")
+    
+    try:
+        from src.models.exercise import Exercise, UnitType
+        from src.models.workout import WorkoutGenerator
+        
+        exercises = [
+            Exercise("Squats", UnitType.REPS, 2),
+            Exercise("Plank", UnitType.SECONDS, 5)
+        ]
+        
+        # Default output already has one entry per exercise
+        workout = WorkoutGenerator.generate_workout(exercises, 300)
+        assert len(workout.exercises) <= len(exercises)
+        
+        # Per-pick output merges back down to the same shape
+        picks = WorkoutGenerator.generate_workout(exercises, 300, aggregate=False)
+        assert len(picks.exercises) > len(exercises)
+        merged = picks.aggregated()
+        assert len(merged.exercises) == len({we.exercise.id for we in picks.exercises})
+        assert sum(we.deaths_allocated for we in merged.exercises) == 300
+        assert merged.get_summary() == picks.get_summary()
+        
+        print("✅ Workout aggregation works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Workout aggregation test failed: {e}")
+        return False
+
+def test_batch_generation():
+    """Test batch workout generation with and without NumPy"""
+    print("\nTesting batch generation...")
+    
+    try:
+        from src.models.exercise import Exercise, UnitType
+        from src.models import workout as workout_module
+        from src.models.workout import WorkoutGenerator
+        
+        exercises = [Exercise(f"Exercise {i}", UnitType.REPS, 2) for i in range(5)]
+        deaths = [0, 1, 10, 250]
+        
+        numpy_module = workout_module.np
+        try:
+            for backend in {numpy_module, None}:
+                workout_module.np = backend
+                batch = WorkoutGenerator.generate_batch(exercises, deaths, seed=42)
+                
+                assert len(batch) == len(deaths)
+                for expected, workout in zip(deaths, batch):
+                    assert workout.total_deaths == expected
+                    assert sum(we.deaths_allocated for we in workout.exercises) == expected
+                
+                # Same seed, same deck
+                again = WorkoutGenerator.generate_batch(exercises, deaths, seed=42)
+                assert [we.deaths_allocated for we in again[-1].exercises] == \
+                    [we.deaths_allocated for we in batch[-1].exercises]
+        finally:
+            workout_module.np = numpy_module
+        
+        print("✅ Batch generation works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Batch generation test failed: {e}")
+        return False
+
+def test_seeded_generation():
+    """Test reproducible, per-instance random streams"""
+    print("\nTesting seeded generation...")
+    
+    try:
+        from src.models.exercise import Exercise, UnitType
+        from src.models.workout import WorkoutGenerator
+        
+        exercises = [Exercise(f"Exercise {i}", UnitType.REPS, 2) for i in range(10)]
+        
+        def allocations(workout):
+            return [(we.exercise.id, we.deaths_allocated) for we in workout.exercises]
+        
+        # Same seed, same sequence of workouts
+        first = WorkoutGenerator(seed=7)
+        second = WorkoutGenerator(seed=7)
+        for deaths in (5, 50, 5000):
+            a = first.generate(exercises, deaths)
+            b = second.generate(exercises, deaths)
+            assert a.seed == b.seed
+            assert allocations(a) == allocations(b)
+            
+            # A recorded seed rebuilds the workout exactly
+            rebuilt = WorkoutGenerator.regenerate(exercises, deaths, a.seed)
+            assert allocations(rebuilt) == allocations(a)
+        
+        # Spawned streams are reproducible and independent
+        children = WorkoutGenerator(seed=7).spawn(3)
+        assert len({child.seed for child in children}) == 3
+        assert [c.seed for c in children] == [c.seed for c in WorkoutGenerator(seed=7).spawn(3)]
+        
+        print("✅ Seeded generation is reproducible")
+        return True
+    except Exception as e:
+        print(f"❌ Seeded generation test failed: {e}")
+        return False
+
+def test_compact_history_records():
+    """Test rebuilding a workout from a compact history record"""
+    print("\nTesting compact history records...")
+    
+    try:
+        from src.models.exercise import Exercise, UnitType, exercise_set_hash
+        from src.models.workout import WorkoutGenerator
+        
+        exercises = [
+            Exercise("Squats", UnitType.REPS, 2, id="squats"),
+            Exercise("Plank", UnitType.SECONDS, 5, id="plank")
+        ]
+        workout = WorkoutGenerator(seed=3).generate(exercises, 40)
+        record = {"deaths": 40, "seed": workout.seed, "exercise_set": workout.exercise_set}
+        
+        # The hash identifies the configuration, not the object identities
+        copies = [Exercise.from_dict(exercise.to_dict()) for exercise in exercises]
+        assert exercise_set_hash(copies) == record["exercise_set"]
+        assert exercise_set_hash(list(reversed(copies))) != record["exercise_set"]
+        
+        rebuilt = WorkoutGenerator.regenerate(copies, record["deaths"], record["seed"])
+        assert [(we.exercise.name, we.allocated_amount) for we in rebuilt.exercises] == \
+            [(we.exercise.name, we.allocated_amount) for we in workout.exercises]
+        
+        print("✅ Compact history records rebuild correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Compact history record test failed: {e}")
+        return False
+
+def test_weighted_sampling():
+    """Test alias-method sampling and exercise weights"""
+    print("\nTesting weighted sampling...")
+    
+    try:
+        import random
+        from src.models.exercise import Exercise, UnitType
+        from src.models.sampling import AliasTable, get_alias_table
+        from src.models.workout import WorkoutGenerator
+        
+        # Draw frequencies follow the weights
+        rng = random.Random(5)
+        table = AliasTable([1.0, 3.0, 0.0, 4.0])
+        draws = [0] * 4
+        for _ in range(40000):
+            draws[table.sample(rng)] += 1
+        assert draws[2] == 0
+        assert abs(draws[1] / 40000 - 0.375) < 0.02
+        assert abs(draws[3] / 40000 - 0.5) < 0.02
+        
+        # Tables are cached per weight vector
+        assert get_alias_table((1.0, 2.0)) is get_alias_table((1.0, 2.0))
+        
+        # Weight round-trips through storage and steers allocation
+        favourite = Exercise("Squats", UnitType.REPS, 2, weight=9.0)
+        injured = Exercise("Lunges", UnitType.REPS, 2, weight=0.0)
+        assert Exercise.from_dict(favourite.to_dict()).weight == 9.0
+        assert Exercise.from_dict({"id": "x", "name": "Old", "unit_type": "reps", "amount_per_death": 1}).weight == 1.0
+        
+        normal = Exercise("Push-ups", UnitType.REPS, 1)
+        for aggregate in (True, False):
+            workout = WorkoutGenerator.generate_workout([favourite, normal, injured], 1000, aggregate=aggregate)
+            totals = {we.exercise.name: 0 for we in workout.exercises}
+            for we in workout.exercises:
+                totals[we.exercise.name] += we.deaths_allocated
+            assert "Lunges" not in totals
+            assert totals["Squats"] > totals["Push-ups"]
+            assert sum(totals.values()) == 1000
+        
+        # Vanishingly small weights are drawn without dividing by log(1) == 0
+        tiny = WorkoutGenerator.generate_workout([normal, favourite], 300, weights=[1e-17, 1.0])
+        assert sum(we.deaths_allocated for we in tiny.exercises) == 300
+        
+        # Non-finite weights are refused, and ones already saved load as the default
+        for bad in (float("nan"), float("inf")):
+            for build in (lambda: AliasTable([1.0, bad]),
+                          lambda: WorkoutGenerator.allocate_deaths(10, 2, weights=[1.0, bad])):
+                try:
+                    build()
+                    assert False, "non-finite weight accepted"
+                except ValueError:
+                    pass
+            saved = Exercise.from_dict({**normal.to_dict(), "weight": bad})
+            assert saved.weight == 1.0
+        
+        print("✅ Weighted sampling works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Weighted sampling test failed: {e}")
+        return False
+
 def test_storage():
     """Test storage functionality"""
     print("\nTesting storage...")
@@ -123,6 +344,1266 @@ def test_storage():
         print(f"❌ Storage test failed: {e}")
         return False
 
+def test_exercise_snapshots():
+    """Test content-addressed exercise snapshots in storage"""
+    print("\nTesting exercise snapshots...")
+    
+    try:
+        from src.services.storage import StorageService
+        from src.models.exercise import Exercise, UnitType
+        from src.models.workout import WorkoutGenerator
+        import tempfile
+        import shutil
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            storage = StorageService(temp_dir)
+            exercises = [
+                Exercise("Squats", UnitType.REPS, 2, id="squats"),
+                Exercise("Plank", UnitType.SECONDS, 5, id="plank")
+            ]
+            
+            # Identical configurations are stored once
+            snapshot_hash = storage.save_exercise_snapshot(exercises)
+            copies = [Exercise.from_dict(exercise.to_dict()) for exercise in exercises]
+            assert storage.save_exercise_snapshot(copies) == snapshot_hash
+            assert len(StorageService(temp_dir)._load_snapshots()) == 1
+            
+            workout = WorkoutGenerator(seed=11).generate(exercises, 30)
+            full = {
+                "deaths": 30, "seed": workout.seed, "exercise_set": snapshot_hash,
+                "exercises": [
+                    {"id": we.exercise.id, "amount": we.allocated_amount, "deaths_allocated": we.deaths_allocated}
+                    for we in workout.exercises
+                ]
+            }
+            compact = {"deaths": 30, "seed": workout.seed, "exercise_set": snapshot_hash}
+            storage.save_workout_history(full)
+            storage.save_workout_history(compact)
+            
+            # Both record formats resolve to the same named breakdown
+            reloaded = StorageService(temp_dir)
+            expected = [
+                {"id": we.exercise.id, "name": we.exercise.name, "amount": we.allocated_amount,
+                 "unit": we.exercise.get_unit_display(), "deaths_allocated": we.deaths_allocated}
+                for we in workout.exercises
+            ]
+            assert reloaded.get_workout_exercises(full) == expected
+            assert reloaded.get_workout_exercises(compact) == expected
+            assert len(reloaded.find_workouts_by_snapshot(snapshot_hash)) == 2
+            assert reloaded.find_workouts_by_snapshot("missing") == []
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ Exercise snapshots work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Exercise snapshot test failed: {e}")
+        return False
+
+def test_balanced_generation():
+    """Test history-aware balancing with incrementally kept volume"""
+    print("\nTesting balanced generation...")
+    
+    try:
+        from datetime import datetime, timedelta
+        from src.services.storage import StorageService
+        from src.models.exercise import Exercise, UnitType
+        from src.models.workout import WorkoutGenerator
+        import tempfile
+        import shutil
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            storage = StorageService(temp_dir)
+            squats = Exercise("Squats", UnitType.REPS, 2, id="squats")
+            plank = Exercise("Plank", UnitType.SECONDS, 5, id="plank")
+            
+            now = datetime.now()
+            old = (now - timedelta(days=30)).isoformat()
+            storage.save_workout_history({
+                "timestamp": old, "deaths": 50,
+                "exercises": [{"id": "plank", "amount": 250, "deaths_allocated": 50}]
+            })
+            storage.save_workout_history({
+                "timestamp": now.isoformat(), "deaths": 20,
+                "exercises": [{"name": "Squats", "amount": 40, "unit": "reps", "deaths_allocated": 20}]
+            })
+            
+            # Only the window counts, and later saves are added incrementally
+            assert storage.get_recent_volume(7) == {"Squats": 20}
+            storage.save_workout_history({
+                "timestamp": now.isoformat(), "deaths": 4,
+                "exercises": [{"id": "squats", "amount": 8, "deaths_allocated": 4}]
+            })
+            volume = storage.get_recent_volume(7)
+            assert volume == {"Squats": 20, "squats": 4}
+            assert StorageService(temp_dir).get_recent_volume(60)["plank"] == 50
+            
+            # Compact records outside the window are never regenerated
+            snapshot_hash = storage.save_exercise_snapshot([squats, plank])
+            storage.save_workout_history({"timestamp": old, "deaths": 9, "exercise_set": snapshot_hash, "seed": 3})
+            reopened = StorageService(temp_dir)
+            loaded = []
+            load_snapshot = reopened.load_exercise_snapshot
+            reopened.load_exercise_snapshot = lambda snapshot: loaded.append(snapshot) or load_snapshot(snapshot)
+            assert reopened.get_recent_volume(7) == volume and not loaded
+            assert sum(reopened.get_recent_volume(60).values()) == 83 and loaded
+            
+            # The recently trained exercise gets the smaller weight
+            weights = WorkoutGenerator.balance_weights([squats, plank], volume)
+            assert weights[0] < weights[1]
+            
+            # Balanced workouts rebuild exactly from their recorded weights
+            workout = WorkoutGenerator(seed=1).generate([squats, plank], 100, weights=weights)
+            rebuilt = WorkoutGenerator.regenerate([squats, plank], 100, workout.seed, weights=workout.weights)
+            assert [we.deaths_allocated for we in rebuilt.exercises] == \
+                [we.deaths_allocated for we in workout.exercises]
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ Balanced generation works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Balanced generation test failed: {e}")
+        return False
+
+def test_workout_session():
+    """Test adding deaths to a live session one at a time"""
+    print("\nTesting workout session...")
+    
+    try:
+        from src.models.exercise import Exercise, UnitType
+        from src.models.workout import WorkoutGenerator
+        
+        exercises = [
+            Exercise("Squats", UnitType.REPS, 2),
+            Exercise("Plank", UnitType.SECONDS, 5),
+            Exercise("Burpees", UnitType.REPS, 1, weight=0.0)
+        ]
+        session = WorkoutGenerator(seed=9).start_session(exercises)
+        
+        for _ in range(25):
+            index = session.add_death()
+            assert exercises[index].name != "Burpees"
+        changed = session.add_deaths(500)
+        assert set(changed) <= {0, 1}
+        assert session.deaths == 525
+        
+        # Running totals match a from-scratch summary of the same workout
+        workout = session.to_workout()
+        assert workout.total_deaths == 525
+        assert sum(we.deaths_allocated for we in workout.exercises) == 525
+        assert session.get_summary() == workout.get_summary()
+        
+        print("✅ Workout session works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Workout session test failed: {e}")
+        return False
+
+def test_workout_totals():
+    """Test incrementally maintained workout totals"""
+    print("\nTesting workout totals...")
+    
+    try:
+        from src.models.exercise import Exercise, UnitType
+        from src.models.workout import Workout, WorkoutExercise
+        
+        squats = Exercise("Squats", UnitType.REPS, 2)
+        plank = Exercise("Plank", UnitType.SECONDS, 5)
+        
+        workout = Workout(exercises=[WorkoutExercise(squats, 6, 3)], total_deaths=3)
+        assert workout.get_summary() == "6 reps"
+        
+        workout.add_exercise(WorkoutExercise(plank, 10, 2))
+        workout.add_exercise(WorkoutExercise(squats, 2, 1))
+        assert workout.reps_total == 8
+        assert workout.seconds_total == 10
+        assert workout.get_summary() == "8 reps + 10 seconds"
+        
+        grouped = workout.get_exercises_by_unit_type()
+        assert len(grouped["reps"]) == 2
+        assert len(grouped["seconds"]) == 1
+        assert Workout(exercises=[], total_deaths=0).get_summary() == "No exercises"
+        
+        print("✅ Workout totals work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Workout totals test failed: {e}")
+        return False
+
+def test_history_log():
+    """Test the append-only history log and migration from JSON"""
+    print("\nTesting history log...")
+    
+    try:
+        from src.services.storage import StorageService
+        from src.services import history_log
+        import json
+        import tempfile
+        import shutil
+        from pathlib import Path
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            legacy = [
+                {"timestamp": f"2025-01-{i + 1:02d}T10:00:00", "deaths": i,
+                 "summary": f"{i} reps", "exercises": [{"name": "Squats ] , {", "amount": i}]}
+                for i in range(150)
+            ]
+            legacy_file = Path(temp_dir) / "workout_history.json"
+            with open(legacy_file, 'w') as f:
+                json.dump(legacy, f, indent=2)
+            
+            # The streaming parser copes with items split across chunks
+            assert list(history_log.iter_json_array(legacy_file, chunk_size=7)) == legacy
+            
+            storage = StorageService(temp_dir)
+            assert not legacy_file.exists()
+            assert list(storage.iter_workout_history()) == legacy
+            
+            # Saves append; loading keeps only the most recent workouts
+            storage.save_workout_history({"timestamp": "2025-06-01T10:00:00", "deaths": 3})
+            recent = storage.load_workout_history()
+            assert len(recent) == 100
+            assert recent[-1]["deaths"] == 3
+            assert len(storage.load_workout_history(limit=None)) == 151
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ History log works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ History log test failed: {e}")
+        return False
+
+def test_storage_backends():
+    """Test that the JSON and SQLite backends behave the same"""
+    print("\nTesting storage backends...")
+    
+    try:
+        from src.services.storage import StorageService, create_storage_service
+        from src.services.sqlite_storage import SQLiteStorageService
+        from src.models.exercise import Exercise, UnitType
+        import tempfile
+        import shutil
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            exercises = [Exercise("Squats", UnitType.REPS, 2, id="squats", weight=2.0)]
+            records = [
+                {"timestamp": f"2025-03-{day:02d}T12:00:00", "deaths": day % 20, "summary": f"{day} reps"}
+                for day in range(1, 29)
+            ] * 5
+            
+            backends = [StorageService(f"{temp_dir}/json"), SQLiteStorageService(f"{temp_dir}/sqlite")]
+            for storage in backends:
+                assert storage.save_exercises(exercises)
+                assert storage.load_exercises()[0].weight == 2.0
+                assert storage.save_settings({"theme": "light"})
+                settings = storage.load_settings()
+                assert settings["theme"] == "light" and settings["generation_mode"] == "random"
+                
+                snapshot_hash = storage.save_exercise_snapshot(exercises)
+                assert storage.load_exercise_snapshot(snapshot_hash)[0].name == "Squats"
+                
+                for record in records:
+                    assert storage.save_workout_history(record)
+                assert len(storage.load_workout_history()) == 100
+                assert storage.load_workout_history(limit=None) == records
+                
+                matches = storage.query_workout_history(
+                    since="2025-03-10", until="2025-03-20", min_deaths=15
+                )
+                assert matches == [r for r in records if "2025-03-10" <= r["timestamp"] < "2025-03-20"
+                                   and r["deaths"] >= 15]
+                assert storage.query_workout_history(min_deaths=19, limit=2) == records[18:19] * 2
+            
+            # A JSON data directory can be copied into SQLite
+            imported = SQLiteStorageService(f"{temp_dir}/imported")
+            imported.import_from(backends[0])
+            assert imported.load_workout_history(limit=None) == records
+            assert imported.load_exercises()[0].id == "squats"
+            assert isinstance(create_storage_service(f"{temp_dir}/imported"), SQLiteStorageService)
+            assert isinstance(create_storage_service(f"{temp_dir}/json"), StorageService)
+            backends[1].close()
+            imported.close()
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ Storage backends work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Storage backend test failed: {e}")
+        return False
+
+def test_write_behind():
+    """Test background writes, coalescing and flush"""
+    print("\nTesting write-behind storage...")
+    
+    try:
+        from src.services.write_queue import WriteBehindQueue
+        from src.services.storage import StorageService
+        from src.services.sqlite_storage import SQLiteStorageService
+        from src.models.exercise import Exercise, UnitType
+        import tempfile
+        import shutil
+        import threading
+        
+        # Writes queued behind a slow one collapse to the latest per key
+        queue = WriteBehindQueue()
+        gate = threading.Event()
+        written = []
+        queue.submit("slow", gate.wait)
+        for value in range(10):
+            queue.submit("settings", lambda value=value: written.append(("settings", value)))
+        queue.submit(None, lambda: written.append(("history", 1)))
+        queue.submit(None, lambda: written.append(("history", 2)))
+        assert not queue.flush(timeout=0.05)
+        gate.set()
+        assert queue.flush(timeout=5)
+        assert written == [("settings", 9), ("history", 1), ("history", 2)]
+        queue.close()
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for storage_class in (StorageService, SQLiteStorageService):
+                directory = f"{temp_dir}/{storage_class.__name__}"
+                storage = storage_class(directory, write_behind=True)
+                for amount in range(1, 6):
+                    assert storage.save_exercises([Exercise("Squats", UnitType.REPS, amount, id="squats")])
+                storage.save_settings({"theme": "light"})
+                for deaths in range(20):
+                    storage.save_workout_history({"timestamp": "2025-05-01T10:00:00", "deaths": deaths})
+                
+                # Reads see earlier saves, and close leaves everything on disk
+                assert storage.load_exercises()[0].amount_per_death == 5
+                storage.save_settings({"theme": "system"})
+                storage.close()
+                
+                reopened = storage_class(directory)
+                assert reopened.load_settings()["theme"] == "system"
+                assert [r["deaths"] for r in reopened.load_workout_history()] == list(range(20))
+                if storage_class is SQLiteStorageService:
+                    reopened.close()
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ Write-behind storage works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Write-behind test failed: {e}")
+        return False
+
+def test_atomic_writes():
+    """Test crash-safe file replacement and batched commits"""
+    print("\nTesting atomic writes...")
+    
+    try:
+        from src.services.storage import StorageService
+        from src.services.sqlite_storage import SQLiteStorageService
+        from src.models.exercise import Exercise, UnitType
+        import tempfile
+        import shutil
+        import os
+        
+        temp_dir = tempfile.mkdtemp()
+        real_fsync = os.fsync
+        try:
+            storage = StorageService(temp_dir)
+            assert storage.save_exercises([Exercise("Squats", UnitType.REPS, 2)])
+            
+            # A write that fails before the rename leaves the old file whole
+            def failing_fsync(fd):
+                raise OSError("disk full")
+            os.fsync = failing_fsync
+            assert not storage.save_exercises([Exercise("Plank", UnitType.SECONDS, 5)])
+            os.fsync = real_fsync
+            assert storage.load_exercises()[0].name == "Squats"
+            assert not [name for name in os.listdir(temp_dir) if name.endswith(".tmp")]
+            
+            # A batch syncs the history once and writes each file once
+            fsync_calls = []
+            def counting_fsync(fd):
+                fsync_calls.append(fd)
+                real_fsync(fd)
+            os.fsync = counting_fsync
+            with storage.batch():
+                for deaths in range(50):
+                    storage.save_workout_history({"timestamp": "2025-05-01T10:00:00", "deaths": deaths})
+                    storage.save_exercises([Exercise("Squats", UnitType.REPS, deaths + 1)])
+            os.fsync = real_fsync
+            assert len(fsync_calls) <= 4
+            assert len(storage.load_workout_history(limit=None)) == 50
+            assert storage.load_exercises()[0].amount_per_death == 50
+            
+            # SQLite commits a batch as one transaction
+            database = SQLiteStorageService(f"{temp_dir}/sqlite")
+            with database.batch():
+                for deaths in range(50):
+                    database.save_workout_history({"timestamp": "2025-05-01T10:00:00", "deaths": deaths})
+                assert database.load_workout_history() == []
+            assert len(database.load_workout_history(limit=None)) == 50
+            
+            # A batch that raises writes nothing
+            lunges = [Exercise("Lunges", UnitType.REPS, 3)]
+            for backend in (storage, database):
+                try:
+                    with backend.batch():
+                        backend.save_workout_history({"timestamp": "2025-05-02T10:00:00", "deaths": 99})
+                        backend.save_exercises(lunges)
+                        backend.save_exercise_snapshot(lunges)
+                        raise RuntimeError("abandoned")
+                except RuntimeError:
+                    pass
+                assert len(backend.load_workout_history(limit=None)) == 50
+                assert backend.get_history_rollups().get("day", "2025-05-02")["workouts"] == 0
+                assert [exercise.name for exercise in backend.load_exercises()] != ["Lunges"]
+                
+                # The discarded snapshot is written when it is saved again
+                snapshot_hash = backend.save_exercise_snapshot(lunges)
+                backend.flush()
+                reopened = type(backend)(str(backend.data_dir))
+                assert reopened.load_exercise_snapshot(snapshot_hash)[0].name == "Lunges"
+                reopened.close()
+            database.close()
+        finally:
+            os.fsync = real_fsync
+            shutil.rmtree(temp_dir)
+        
+        print("✅ Atomic writes work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Atomic write test failed: {e}")
+        return False
+
+def test_read_cache():
+    """Test the mtime/size-validated read cache"""
+    print("\nTesting read cache...")
+    
+    try:
+        from src.services.storage import StorageService
+        from src.models.exercise import Exercise, UnitType
+        import tempfile
+        import shutil
+        import os
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            storage = StorageService(temp_dir)
+            storage.save_exercises([Exercise("Squats", UnitType.REPS, 2)])
+            for deaths in range(5):
+                storage.save_workout_history({"timestamp": "2025-05-01T10:00:00", "deaths": deaths})
+            
+            # Unchanged files are parsed once
+            for _ in range(3):
+                assert storage.load_exercises()[0].name == "Squats"
+                assert len(storage.load_workout_history()) == 5
+            assert storage.read_cache.misses == 2 and storage.read_cache.hits == 4
+            
+            # Returned exercises are copies, so editing them leaves the cache alone
+            storage.load_exercises()[0].name = "Edited"
+            assert storage.load_exercises()[0].name == "Squats"
+            
+            # Our own same-size write and another process's write both invalidate
+            storage.save_exercises([Exercise("Squats", UnitType.REPS, 3)])
+            assert storage.load_exercises()[0].amount_per_death == 3
+            other = StorageService(temp_dir)
+            other.save_workout_history({"timestamp": "2025-05-02T10:00:00", "deaths": 9})
+            assert storage.load_workout_history()[-1]["deaths"] == 9
+            assert storage.load_workout_history(limit=2) == storage.load_workout_history(limit=None)[-2:]
+            
+            os.remove(storage.exercises_file)
+            assert storage.load_exercises() == []
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ Read cache works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Read cache test failed: {e}")
+        return False
+
+def test_history_segments():
+    """Test monthly history segments, retention and compaction"""
+    print("\nTesting history segments...")
+    
+    try:
+        from src.services.storage import StorageService
+        from src.services.sqlite_storage import SQLiteStorageService
+        from src.services.history_segments import month_key
+        from datetime import datetime
+        import tempfile
+        import shutil
+        import os
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            today = datetime.now()
+            months = [month_key(today, back) for back in (5, 3, 2, 0)]
+            records = [{"timestamp": f"{month}-01T10:00:00", "deaths": i} for i, month in enumerate(months)]
+            
+            storage = StorageService(temp_dir)
+            for record in records:
+                storage.save_workout_history(record)
+            storage.save_workout_history(records[2])
+            assert sorted(name for name in os.listdir(storage.history_dir) if name != ".lock") == [f"{month}.jsonl" for month in months]
+            
+            # Recent loads only open the newest month
+            reopened = StorageService(temp_dir)
+            assert reopened.load_workout_history(limit=1) == [records[3]]
+            assert reopened.read_cache.misses == 1
+            
+            # Only the last 3 months, this one included, are kept; finished ones are compressed and deduplicated
+            reopened.start_history_maintenance(retention_months=3).join()
+            assert sorted(name for name in os.listdir(storage.history_dir) if name != ".lock") == [f"{months[2]}.jsonl.gz", f"{months[3]}.jsonl"]
+            assert list(reopened.iter_workout_history()) == records[2:]
+            assert reopened.load_workout_history(limit=None) == records[2:]
+            
+            # Appending to a compacted month still works
+            reopened.save_workout_history({"timestamp": f"{months[2]}-02T10:00:00", "deaths": 7})
+            assert [r["deaths"] for r in reopened.load_workout_history()] == [2, 7, 3]
+            
+            database = SQLiteStorageService(f"{temp_dir}/sqlite")
+            for record in records:
+                database.save_workout_history(record)
+            database.start_history_maintenance(retention_months=3)
+            assert database.load_workout_history() == records[2:]
+            database.close()
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ History segments work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ History segments test failed: {e}")
+        return False
+
+def test_history_reader():
+    """Test random access to the history through the offset index"""
+    print("\nTesting history reader...")
+    
+    try:
+        from src.services.storage import StorageService
+        from src.services.sqlite_storage import SQLiteStorageService
+        import tempfile
+        import shutil
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            records = [
+                {"timestamp": f"2024-{month:02d}-{day:02d}T10:00:00", "deaths": month * 100 + day}
+                for month in range(1, 7) for day in range(1, 21)
+            ]
+            
+            json_storage = StorageService(f"{temp_dir}/json")
+            json_storage.history.append_records(records)
+            json_storage.history.compact_before("2024-03")
+            database = SQLiteStorageService(f"{temp_dir}/sqlite")
+            with database.batch():
+                for record in records:
+                    database.save_workout_history(record)
+            
+            for storage in (json_storage, database):
+                reader = storage.open_history_reader()
+                
+                # The newest records come from the newest month alone
+                assert reader.tail(25) == records[-25:]
+                if storage is json_storage:
+                    assert list(reader._logs) == ["2024-06", "2024-05"]
+                
+                assert len(reader) == 120
+                assert reader[0] == records[0] and reader[57] == records[57] and reader[-1] == records[-1]
+                assert reader[10:13] == records[10:13]
+                assert list(reader) == records and list(reversed(reader)) == records[::-1]
+                
+                # Later saves appear after a refresh
+                storage.save_workout_history({"timestamp": "2024-06-30T10:00:00", "deaths": 1})
+                storage.save_workout_history({"timestamp": "2024-07-01T10:00:00", "deaths": 2})
+                storage.flush()
+                reader.refresh()
+                assert len(reader) == 122 and [r["deaths"] for r in reader.tail(2)] == [1, 2]
+                if storage is json_storage:
+                    reader.close()
+            database.close()
+            
+            # A plain file left beside its compacted month is not read twice
+            from src.services import history_log
+            history_log.append_records(json_storage.history_dir / "2024-01.jsonl", records[:5])
+            reader = json_storage.open_history_reader()
+            assert len(reader) == 122 and list(reader)[:20] == records[:20]
+            assert len(json_storage.open_history_index()) == 122
+            reader.close()
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ History reader works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ History reader test failed: {e}")
+        return False
+
+def test_history_totals():
+    """Test structured record totals and the streaming backfill"""
+    print("\nTesting history totals backfill...")
+    
+    try:
+        from src.services.storage import StorageService, record_totals
+        from src.services.sqlite_storage import SQLiteStorageService
+        from src.models.exercise import Exercise, UnitType
+        from src.models.workout import WorkoutGenerator
+        import tempfile
+        import shutil
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            exercises = [
+                Exercise("Squats", UnitType.REPS, 2, id="squats"),
+                Exercise("Plank", UnitType.SECONDS, 5, id="plank")
+            ]
+            workout = WorkoutGenerator.regenerate(exercises, 12, seed=7)
+            
+            for storage_class in (StorageService, SQLiteStorageService):
+                storage = storage_class(f"{temp_dir}/{storage_class.__name__}")
+                snapshot_hash = storage.save_exercise_snapshot(exercises)
+                records = [
+                    # Named entries from old versions
+                    {"timestamp": "2024-01-05T10:00:00", "deaths": 3,
+                     "exercises": [{"name": "Squats", "amount": 4, "unit": "reps", "deaths_allocated": 2},
+                                   {"name": "Plank", "amount": 5, "unit": "seconds", "deaths_allocated": 1}]},
+                    # Entries that refer to the snapshot by id
+                    {"timestamp": "2024-02-05T10:00:00", "deaths": 2, "exercise_set": snapshot_hash,
+                     "exercises": [{"id": "squats", "amount": 4, "deaths_allocated": 2}]},
+                    # Compact record, rebuilt from its seed
+                    {"timestamp": "2024-02-06T10:00:00", "deaths": 12, "seed": 7, "exercise_set": snapshot_hash},
+                    # Already upgraded
+                    {"timestamp": "2024-02-07T10:00:00", "deaths": 1, "reps_total": 2, "seconds_total": 0,
+                     "volume": {"squats": 2}}
+                ]
+                for record in records:
+                    storage.save_workout_history(record)
+                if storage_class is StorageService:
+                    storage.history.compact_before("2024-02")
+                
+                assert storage.backfill_history_totals() == 3
+                assert storage.backfill_history_totals() == 0
+                upgraded = storage.load_workout_history()
+                assert upgraded[0]["reps_total"] == 4 and upgraded[0]["volume"] == {"Squats": 4, "Plank": 5}
+                assert upgraded[1]["seconds_total"] == 0 and upgraded[1]["volume"] == {"squats": 4}
+                assert upgraded[2]["reps_total"] == workout.reps_total
+                assert upgraded[2]["seconds_total"] == workout.seconds_total
+                assert "exercises" not in upgraded[2] and "volume" not in upgraded[2]
+                assert upgraded[3] == records[3]
+                storage.close()
+                
+                assert record_totals([]) == {"reps_total": 0, "seconds_total": 0, "volume": {}}
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ History totals backfill works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ History totals test failed: {e}")
+        return False
+
+def test_corruption_salvage():
+    """Test that damaged history and exercise data is skipped and quarantined"""
+    print("\nTesting corruption salvage...")
+    
+    try:
+        from src.services.storage import StorageService
+        from src.models.exercise import Exercise, UnitType
+        import tempfile
+        import shutil
+        import json
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            storage = StorageService(temp_dir)
+            reports = []
+            storage.on_corrupt = reports.append
+            records = [{"timestamp": f"2024-05-{day:02d}T10:00:00", "deaths": day} for day in range(1, 11)]
+            storage.history.append_records(records)
+            
+            # Flip one byte inside the fourth record
+            segment = storage.history_dir / "2024-05.jsonl"
+            data = bytearray(segment.read_bytes())
+            line_start = data.index(b'"2024-05-04')
+            data[line_start + 5] ^= 0x01
+            segment.write_bytes(bytes(data))
+            
+            reader = storage.open_history_reader()
+            assert list(reader) == records[:3] + records[4:]
+            reader.close()
+            
+            assert storage.load_workout_history() == records[:3] + records[4:]
+            assert len(reports) == 1 and reports[0].line_number == 4
+            quarantine = storage.history_dir / "2024-05.jsonl.quarantine"
+            assert b"\"deaths\":4}" in quarantine.read_bytes()
+            assert storage.load_workout_history() == records[:3] + records[4:] and len(reports) == 1
+            
+            # A record cut short by a crash does not swallow the next one
+            with open(segment, 'ab') as f:
+                f.write(b'{"timestamp":"2024-05-20T1')
+            storage.save_workout_history({"timestamp": "2024-05-21T10:00:00", "deaths": 21})
+            assert storage.load_workout_history()[-1]["deaths"] == 21 and len(reports) == 2
+            
+            # A truncated compressed month keeps what can still be read
+            storage.history.append_records([{"timestamp": f"2024-04-{day:02d}T10:00:00", "deaths": day}
+                                            for day in range(1, 301)])
+            storage.history.compact_before("2024-05")
+            compressed = storage.history_dir / "2024-04.jsonl.gz"
+            compressed.write_bytes(compressed.read_bytes()[:-200])
+            april = storage.history.read_segment("2024-04")
+            assert 0 < len(april) < 300 and april[0]["deaths"] == 1
+            assert (storage.history_dir / "2024-04.jsonl.gz.damaged").exists()
+            assert len(reports) == 3
+            
+            # A damaged exercise file keeps its readable exercises and a copy
+            storage.save_exercises([Exercise(name, UnitType.REPS, 2) for name in ("Squats", "Lunges", "Burpees")])
+            text = storage.exercises_file.read_text().replace('"Lunges"', '"Lunges', 1)
+            storage.exercises_file.write_text(text)
+            names = [exercise.name for exercise in storage.load_exercises()]
+            assert names == ["Squats", "Burpees"]
+            assert (storage.history_dir.parent / "exercises.json.damaged").read_text() == text
+            assert len(reports) == 4
+            
+            # Damaged settings keep their readable keys without losing the file
+            storage.settings_file.write_text('{"theme": "light", "window_size": 80x60}')
+            settings = storage.load_settings()
+            assert settings["theme"] == "light" and settings["window_size"] == "800x600"
+            assert (storage.history_dir.parent / "settings.json.damaged").exists()
+            assert len(reports) == 5
+            
+            # A damaged snapshot costs only itself, and saving another keeps the rest
+            snapshots = [[Exercise(name, UnitType.REPS, 2, id=name.lower())] for name in ("Squats", "Lunges", "Plank")]
+            hashes = [storage.save_exercise_snapshot(exercises) for exercises in snapshots]
+            text = storage.exercise_snapshots_file.read_text().replace('"Lunges"', '"Lunges', 1)
+            storage.exercise_snapshots_file.write_text(text)
+            reopened = StorageService(temp_dir, on_corrupt=reports.append)
+            assert reopened.load_exercise_snapshot(hashes[1]) is None
+            assert [reopened.load_exercise_snapshot(key)[0].name for key in (hashes[0], hashes[2])] == ["Squats", "Plank"]
+            assert len(reports) > 5
+            added = reopened.save_exercise_snapshot([Exercise("Burpees", UnitType.REPS, 1, id="burpees")])
+            reopened = StorageService(temp_dir)
+            assert all(reopened.load_exercise_snapshot(key) for key in (hashes[0], hashes[2], added))
+            shutil.rmtree(temp_dir)
+            
+            # A damaged legacy history is migrated without its damaged record
+            legacy = [{"timestamp": f"2024-03-{day:02d}T10:00:00", "deaths": day,
+                       "exercises": [{"id": "squats", "amount": day}]} for day in range(1, 6)]
+            os.makedirs(temp_dir)
+            text = json.dumps(legacy, indent=2)
+            at = text.index('"2024-03-03')
+            Path(temp_dir, "workout_history.json").write_text(text[:at] + "\x00" + text[at + 1:])
+            reports = []
+            storage = StorageService(temp_dir, on_corrupt=reports.append)
+            assert storage.load_workout_history() == legacy[:2] + legacy[3:]
+            assert reports and not Path(temp_dir, "workout_history.jsonl.tmp").exists()
+            assert b"2024-03-03" in Path(temp_dir, "workout_history.json.quarantine").read_bytes()
+            assert Path(temp_dir, "workout_history.json.migrated").exists()
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        print("✅ Corruption salvage works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Corruption salvage test failed: {e}")
+        return False
+
+def test_history_stats():
+    """Test incremental history statistics and their saved state"""
+    print("\nTesting history statistics...")
+    
+    try:
+        from src.services.history_stats import HistoryStats
+        from src.services.storage import StorageService
+        from src.services.sqlite_storage import SQLiteStorageService
+        import statistics
+        import tempfile
+        import shutil
+        import json
+        
+        records = [{"timestamp": f"2024-0{i % 3 + 1}-{i % 28 + 1:02d}T10:00:00", "deaths": i * 7 % 23,
+                    "reps_total": i, "seconds_total": 2 * i, "volume": {"squats": i}} for i in range(60)]
+        records.append({"timestamp": "2024-03-01T10:00:00", "deaths": 4, "summary": "12 reps + 30 seconds"})
+        deaths = [record["deaths"] for record in records]
+        
+        # Running totals match a full recount, and merged halves match the whole
+        stats = HistoryStats()
+        halves = HistoryStats(), HistoryStats()
+        for i, record in enumerate(records):
+            stats.add(record)
+            halves[i % 2].add(record)
+        halves[0].merge(halves[1])
+        for combined in (stats, halves[0], HistoryStats.from_dict(json.loads(json.dumps(stats.to_dict())))):
+            assert combined.count == len(records) and combined.deaths == sum(deaths)
+            assert (combined.min_deaths, combined.max_deaths) == (min(deaths), max(deaths))
+            assert abs(combined.deaths_variance - statistics.variance(deaths)) < 1e-9
+            assert combined.reps == sum(range(60)) + 12 and combined.seconds == 2 * sum(range(60)) + 30
+            assert combined.exercise_totals == {"squats": sum(range(60))}
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for storage_class in (StorageService, SQLiteStorageService):
+                directory = f"{temp_dir}/{storage_class.__name__}"
+                storage = storage_class(directory)
+                with storage.batch():
+                    for record in records[:40]:
+                        storage.save_workout_history(record)
+                assert storage.load_history_stats().count == 40
+                
+                # Another instance's saves are picked up, and the saved state is reused
+                other = storage_class(directory)
+                for record in records[40:]:
+                    other.save_workout_history(record)
+                loaded = storage.load_history_stats()
+                assert loaded.count == len(records) and abs(loaded.mean_deaths - statistics.mean(deaths)) < 1e-9
+                if storage_class is StorageService:
+                    saved = json.loads(storage.history_stats_file.read_text())
+                    assert sum(month["stats"]["count"] for month in saved["months"].values()) == len(records)
+                    
+                    # Compacted and deleted months are counted again or dropped
+                    storage.history.compact_before("2024-03")
+                    storage.history.delete_before("2024-02")
+                    remaining = [record for record in records if record["timestamp"] >= "2024-02"]
+                    assert storage_class(directory).load_history_stats().deaths == sum(r["deaths"] for r in remaining)
+                else:
+                    storage.start_history_maintenance(retention_months=1)
+                    assert storage.load_history_stats().count == 0
+                    storage.close()
+                    other.close()
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ History statistics work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ History statistics test failed: {e}")
+        return False
+
+def test_history_rollups():
+    """Test per-day, week and month rollups and their upkeep in storage"""
+    print("\nTesting history rollups...")
+    
+    try:
+        from src.services.history_stats import HistoryRollups
+        from src.services.storage import StorageService
+        from src.services.sqlite_storage import SQLiteStorageService
+        from datetime import date, datetime, timedelta
+        import tempfile
+        import shutil
+        import json
+        
+        start = date(2024, 12, 20)
+        records = [{"timestamp": f"{start + timedelta(days=i // 3)}T1{i % 3}:00:00", "deaths": i % 7,
+                    "reps_total": i, "seconds_total": 1} for i in range(90)]
+        records.append({"timestamp": "not a date", "deaths": 5})
+        
+        # Same buckets as parsing every timestamp
+        rollups = HistoryRollups()
+        for record in records:
+            rollups.add(record)
+        expected = {}
+        for record in records[:-1]:
+            day = datetime.fromisoformat(record["timestamp"]).date()
+            key = f"{day.isocalendar()[0]}-W{day.isocalendar()[1]:02d}"
+            totals = expected.setdefault(key, {"workouts": 0, "deaths": 0, "reps": 0, "seconds": 0})
+            totals["workouts"] += 1
+            totals["deaths"] += record["deaths"]
+            totals["reps"] += record["reps_total"]
+            totals["seconds"] += 1
+        assert dict(rollups.series("week")) == expected
+        assert "2025-W01" in expected and rollups.get("week", "2025-W01")["workouts"] == 21
+        assert rollups.current("month", date(2025, 1, 5))["workouts"] == 3 * 18
+        assert rollups.get("day", "2025-01-05") == {"workouts": 3, "deaths": 7, "reps": 147, "seconds": 3}
+        assert rollups.series("month", since="2025-01") == [("2025-01", rollups.get("month", "2025-01"))]
+        
+        restored = HistoryRollups.from_dict(json.loads(json.dumps(rollups.to_dict())))
+        merged = HistoryRollups()
+        merged.merge(restored)
+        assert merged.series("week") == restored.series("week") == rollups.series("week")
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            for storage_class in (StorageService, SQLiteStorageService):
+                directory = f"{temp_dir}/{storage_class.__name__}"
+                storage = storage_class(directory)
+                with storage.batch():
+                    for record in records[:60]:
+                        storage.save_workout_history(record)
+                loaded = storage.get_history_rollups()
+                
+                # Later saves update the loaded rollups in place
+                for record in records[60:]:
+                    storage.save_workout_history(record)
+                assert loaded.series("day") == rollups.series("day")
+                
+                reopened = storage_class(directory)
+                assert reopened.get_history_rollups().series("week") == rollups.series("week")
+                if storage_class is SQLiteStorageService:
+                    storage.close()
+                    reopened.close()
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ History rollups work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ History rollups test failed: {e}")
+        return False
+
+def test_history_index():
+    """Test combined history filters answered from the indexes"""
+    print("\nTesting history index...")
+    
+    try:
+        from src.services.history_index import HistoryIndex, PossibleNames
+        from src.services.storage import StorageService
+        from src.models.exercise import Exercise, UnitType
+        import random
+        import tempfile
+        import shutil
+        
+        rng = random.Random(7)
+        names = ["Squats", "Burpees", "Plank", "Lunges"]
+        records = [{"timestamp": f"2025-{rng.randint(1, 6):02d}-{rng.randint(1, 28):02d}T10:00:00",
+                    "deaths": rng.randint(0, 30),
+                    "exercises": [{"name": name} for name in rng.sample(names, 2)]} for _ in range(400)]
+        index = HistoryIndex(records[:300])
+        for record in records[300:]:
+            index.add(record)
+        
+        def scan(since=None, until=None, min_deaths=None, max_deaths=None, exercise=None):
+            matches = [
+                (record["timestamp"], position) for position, record in enumerate(records)
+                if (since is None or record["timestamp"] >= since) and (until is None or record["timestamp"] < until)
+                and (min_deaths is None or record["deaths"] >= min_deaths)
+                and (max_deaths is None or record["deaths"] <= max_deaths)
+                and (exercise is None or exercise in [entry["name"] for entry in record["exercises"]])
+            ]
+            return [position for _, position in sorted(matches, reverse=True)]
+        
+        # Every combination of filters agrees with a full scan, newest first
+        for since, until in ((None, None), ("2025-03-01", None), ("2025-02-10", "2025-02-20"), ("2026", None)):
+            for min_deaths, max_deaths in ((None, None), (15, None), (None, 9), (12, 12)):
+                for exercise in (None, "Burpees", "plank", "Rowing"):
+                    expected = scan(since, until, min_deaths, max_deaths, exercise and exercise.capitalize())
+                    assert index.query_positions(since, until, min_deaths, max_deaths, exercise) == expected
+                    assert index.query_positions(since, until, min_deaths, max_deaths, exercise, limit=5) == expected[:5]
+        assert index.query(min_deaths=30, limit=1)[0]["deaths"] == 30
+        assert index.exercises() == sorted(names)
+        
+        # Possible names are checked against the actual ones only for matching records
+        resolved = []
+        deferred = HistoryIndex(records, lambda record: PossibleNames(names),
+                                lambda record: resolved.append(record) or [entry["name"] for entry in record["exercises"]])
+        assert deferred.query_positions("2025-03-01", None, 15, None, "burpees") == scan("2025-03-01", None, 15, None, "Burpees")
+        assert len(resolved) == len(scan("2025-03-01", None, 15))
+        assert deferred.query_positions(exercise="Plank", limit=5) == scan(exercise="Plank")[:5]
+        
+        # Storage resolves exercise ids through the record's snapshot
+        temp_dir = tempfile.mkdtemp()
+        try:
+            storage = StorageService(temp_dir)
+            exercises = [Exercise("Squats", UnitType.REPS, 2, id="squats"), Exercise("Plank", UnitType.SECONDS, 5, id="plank")]
+            snapshot_hash = storage.save_exercise_snapshot(exercises)
+            storage.save_workout_history({"timestamp": "2025-05-01T10:00:00", "deaths": 3, "exercise_set": snapshot_hash,
+                                          "exercises": [{"id": "plank", "amount": 15}]})
+            storage.save_workout_history({"timestamp": "2025-05-02T10:00:00", "deaths": 8, "exercise_set": snapshot_hash,
+                                          "seed": 1, "volume": {"squats": 16}})
+            compact = {"timestamp": "2025-05-03T10:00:00", "deaths": 40, "exercise_set": snapshot_hash, "seed": 2}
+            storage.save_workout_history(compact)
+            
+            # Compact records without volume are regenerated only when a query reaches them
+            regenerated = []
+            resolve = storage.regenerated_exercise_names
+            storage.regenerated_exercise_names = lambda record: regenerated.append(record) or resolve(record)
+            index = storage.open_history_index()
+            assert index.exercises() == ["Plank", "Squats"] and not regenerated
+            assert [record["deaths"] for record in index.query(exercise="squats", max_deaths=10)] == [8]
+            assert not regenerated
+            assert [record["deaths"] for record in index.query(exercise="squats")] == [40, 8]
+            assert [record["deaths"] for record in index.query(exercise="plank")] == [40, 3]
+            assert len(regenerated) == 1
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ History index works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ History index test failed: {e}")
+        return False
+
+def test_virtual_list():
+    """Test the windowed list behind the history view"""
+    print("\nTesting virtual list...")
+    
+    try:
+        from src.gui.virtual_list import VirtualList
+        
+        pulled = []
+        def source():
+            for value in range(95):
+                pulled.append(value)
+                yield value
+        
+        entries = VirtualList(source(), page_size=20, max_rendered=50)
+        assert not entries.is_empty() and len(pulled) == 1
+        assert entries.extend_end() == range(0, 20)
+        assert len(pulled) == 20 and entries[19] == 19
+        
+        # Scrolling down keeps at most max_rendered entries
+        assert entries.extend_end() == range(20, 40)
+        assert entries.trim_start() == range(0, 0)
+        assert entries.extend_end() == range(40, 60)
+        assert entries.trim_start() == range(0, 10)
+        assert (entries.start, entries.end) == (10, 60)
+        while entries.has_more():
+            entries.extend_end()
+            entries.trim_start()
+        assert (entries.start, entries.end) == (45, 95)
+        assert entries.extend_end() == range(95, 95)
+        
+        # Scrolling back up reuses what was already pulled
+        assert entries.extend_start() == range(25, 45)
+        assert entries.trim_end() == range(75, 95)
+        assert (entries.start, entries.end) == (25, 75)
+        entries.extend_start()
+        entries.extend_start()
+        assert entries.extend_start() == range(0, 0)
+        assert entries.start == 0 and len(pulled) == 95
+        
+        assert VirtualList([]).is_empty()
+        single = VirtualList([1])
+        assert single.has_more() and single.extend_end() == range(0, 1) and not single.has_more()
+        
+        print("✅ Virtual list works correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Virtual list test failed: {e}")
+        return False
+
+def test_history_columns():
+    """Test the columnar in-memory history"""
+    print("\nTesting history columns...")
+    
+    try:
+        from src.services import history_columns as columns_module
+        from src.services.history_columns import HistoryColumns, BLOCK_ROWS
+        from src.services.history_index import PossibleNames
+        from src.services.history_stats import HistoryStats
+        from src.services.storage import StorageService
+        from src.models.exercise import Exercise, UnitType
+        import random
+        import statistics
+        import tempfile
+        import shutil
+        
+        rng = random.Random(3)
+        names = ["Squats", "Plank", "Burpees", "Lunges"]
+        records = []
+        for i in range(3 * BLOCK_ROWS + 5):
+            picks = rng.sample(names, 2)
+            records.append({"timestamp": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}T10:00:00", "deaths": rng.randint(0, 30),
+                            "reps_total": rng.randint(0, 50), "seconds_total": rng.randint(0, 60),
+                            "exercises": [{"name": pick, "amount": 5, "deaths_allocated": 1} for pick in picks]})
+        records.append({"timestamp": "not a date", "deaths": 7, "summary": "10 reps + 20 seconds"})
+        
+        history = HistoryColumns(records[:100])
+        history.extend(records[100:])
+        assert len(history) == len(records)
+        assert list(history) == records and list(reversed(history)) == records[::-1]
+        assert history[-1] == records[-1] and history[70:72] == records[70:72]
+        assert history.exercises() == sorted(names)
+        assert HistoryColumns(records, lambda record: ["Only"]).exercises() == ["Only"]
+        
+        # Looked-up records are copies
+        history[0]["deaths"] = -1
+        assert history[0] == records[0]
+        
+        def scan(since=None, until=None, min_deaths=None, max_deaths=None, exercise=None):
+            return [
+                position for position, record in enumerate(records)
+                if (since is None or (record["timestamp"][0].isdigit() and record["timestamp"] >= since))
+                and (until is None or (record["timestamp"][0].isdigit() and record["timestamp"] < until))
+                and (min_deaths is None or record["deaths"] >= min_deaths)
+                and (max_deaths is None or record["deaths"] <= max_deaths)
+                and (exercise is None or exercise.lower() in [entry["name"].lower() for entry in record.get("exercises", [])])
+            ]
+        
+        numpy_module = columns_module.np
+        try:
+            for backend in {numpy_module, None}:
+                columns_module.np = backend
+                for filters in [{}, {"since": "2025-06-01"}, {"until": "2025-03-01", "min_deaths": 10},
+                                {"max_deaths": 9, "exercise": "Plank"}, {"exercise": "unknown"}]:
+                    assert history.select(**filters) == scan(**filters), filters
+                
+                # Column statistics match adding the records one by one
+                assert history.total("deaths") == sum(record["deaths"] for record in records)
+                expected = HistoryStats()
+                for record in records:
+                    expected.add(record)
+                stats = history.stats()
+                assert (stats.count, stats.deaths, stats.reps, stats.seconds) == \
+                    (expected.count, expected.deaths, expected.reps, expected.seconds)
+                assert (stats.min_deaths, stats.max_deaths) == (expected.min_deaths, expected.max_deaths)
+                assert abs(stats.deaths_variance - expected.deaths_variance) < 1e-9
+                assert HistoryColumns().stats().count == 0
+                assert HistoryColumns().select(min_deaths=0) == []
+                
+                # Aggregates over a filter's positions
+                positions = history.select(min_deaths=20)
+                assert history.select(min_deaths=20, limit=3) == positions[-3:]
+                deaths = sorted(records[position]["deaths"] for position in positions)
+                assert history.stats(positions).count == len(positions)
+                assert history.total("deaths", positions) == sum(deaths)
+                assert history.percentile("deaths", 50, positions) == statistics.median(deaths)
+                assert history.percentile("deaths", 0) == min(record["deaths"] for record in records)
+                assert history.percentile("deaths", 50, []) is None and history.stats([]).count == 0
+                
+                # Possible names are resolved only for records the other filters match
+                resolved = []
+                deferred = HistoryColumns(records, lambda record: PossibleNames(names),
+                                          lambda record: resolved.append(record) or
+                                          [entry["name"] for entry in record.get("exercises", [])])
+                assert deferred.select(min_deaths=25, exercise="plank") == scan(min_deaths=25, exercise="plank")
+                assert len(resolved) == len(scan(min_deaths=25))
+                assert deferred.select(exercise="Burpees", limit=4) == scan(exercise="Burpees")[-4:]
+        finally:
+            columns_module.np = numpy_module
+        
+        # Storage loads its history into columns, regenerating compact records only when filtered
+        temp_dir = tempfile.mkdtemp()
+        try:
+            storage = StorageService(temp_dir)
+            snapshot_hash = storage.save_exercise_snapshot([Exercise("Squats", UnitType.REPS, 2, id="squats"),
+                                                            Exercise("Plank", UnitType.SECONDS, 5, id="plank")])
+            storage.save_workout_history({"timestamp": "2025-05-01T10:00:00", "deaths": 3, "exercise_set": snapshot_hash,
+                                          "exercises": [{"id": "plank", "amount": 15}]})
+            storage.save_workout_history({"timestamp": "2025-05-02T10:00:00", "deaths": 40,
+                                          "exercise_set": snapshot_hash, "seed": 2})
+            stored = storage.open_history_columns()
+            assert len(stored) == 2 and stored.exercises() == ["Plank", "Squats"]
+            assert stored.select(exercise="plank") == [0, 1] and stored.select(exercise="squats") == [1]
+        finally:
+            shutil.rmtree(temp_dir)
+        
+        print("✅ History columns work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ History columns test failed: {e}")
+        return False
+
+def _concurrent_writer(data_dir, worker, count):
+    """Save workouts, an exercise and a setting from a separate process"""
+    from src.services.storage import StorageService
+    from src.models.exercise import Exercise, UnitType
+    
+    storage = StorageService(data_dir)
+    for index in range(count):
+        storage.save_workout_history({"timestamp": f"2024-0{index % 3 + 1}-01T10:00:00",
+                                      "worker": worker, "index": index})
+        if index == count // 2:
+            exercises = storage.load_exercises()
+            exercises.append(Exercise(f"Worker {worker}", UnitType.REPS, 1, id=f"worker-{worker}"))
+            storage.save_exercises(exercises)
+            settings = storage.load_settings()
+            settings[f"worker_{worker}"] = True
+            storage.save_settings(settings)
+
+def _concurrent_compactor(data_dir, rounds):
+    """Compact the history over and over from a separate process"""
+    from src.services.storage import StorageService
+    
+    storage = StorageService(data_dir)
+    for _ in range(rounds):
+        storage.history.compact_before("2024-03")
+
+def test_concurrent_instances():
+    """Test that several processes sharing a data directory lose nothing"""
+    print("\nTesting concurrent instances...")
+    
+    try:
+        from src.services.storage import StorageService
+        from src.models.exercise import Exercise, UnitType
+        import multiprocessing
+        import threading
+        import tempfile
+        import shutil
+        
+        temp_dir = tempfile.mkdtemp()
+        try:
+            # Unchanged entries take the other instance's version
+            first = StorageService(temp_dir)
+            second = StorageService(temp_dir)
+            first.save_exercises([Exercise("Squats", UnitType.REPS, 2, id="squats")])
+            second.load_exercises()
+            first.save_exercises([Exercise("Squats", UnitType.REPS, 5, id="squats"),
+                                  Exercise("Lunges", UnitType.REPS, 2, id="lunges")])
+            second.save_exercises([Exercise("Squats", UnitType.REPS, 2, id="squats"),
+                                   Exercise("Plank", UnitType.SECONDS, 5, id="plank")])
+            exercises = {exercise.id: exercise for exercise in StorageService(temp_dir).load_exercises()}
+            assert sorted(exercises) == ["lunges", "plank", "squats"]
+            assert exercises["squats"].amount_per_death == 5
+            
+            first.save_settings({**first.load_settings(), "theme": "light"})
+            second.save_settings({**second.load_settings(), "compact_history": True})
+            settings = StorageService(temp_dir).load_settings()
+            assert settings["theme"] == "light" and settings["compact_history"] is True
+            shutil.rmtree(temp_dir)
+            
+            # Saves that replace each other in the queue or a batch keep both changes
+            storage = StorageService(temp_dir, write_behind=True)
+            storage.save_exercises([Exercise("A", UnitType.REPS, 1, id="a"), Exercise("B", UnitType.REPS, 1, id="b")])
+            settings = storage.load_settings()
+            storage.load_exercises()
+            writer_busy = threading.Event()
+            storage._submit_write(None, writer_busy.wait)
+            storage.save_settings({**settings, "theme": "light"})
+            storage.save_settings({**settings, "theme": "light", "window_size": "1024x768"})
+            storage.save_exercises([Exercise("A", UnitType.REPS, 99, id="a"), Exercise("B", UnitType.REPS, 1, id="b")])
+            storage.save_exercises([Exercise("A", UnitType.REPS, 99, id="a"), Exercise("B", UnitType.REPS, 1, id="b"),
+                                    Exercise("C", UnitType.REPS, 1, id="c")])
+            writer_busy.set()
+            storage.close()
+            with storage.batch():
+                storage.save_settings({**settings, "theme": "light", "window_size": "1024x768", "sound": False})
+                storage.save_settings({**settings, "theme": "light", "window_size": "800x600", "sound": False})
+            reopened = StorageService(temp_dir)
+            settings = reopened.load_settings()
+            assert settings["theme"] == "light" and settings["window_size"] == "800x600" and settings["sound"] is False
+            exercises = {exercise.id: exercise.amount_per_death for exercise in reopened.load_exercises()}
+            assert exercises == {"a": 99, "b": 1, "c": 1}
+            shutil.rmtree(temp_dir)
+            
+            # Writer processes racing each other and a compactor
+            workers, count = 4, 40
+            processes = [multiprocessing.Process(target=_concurrent_writer, args=(temp_dir, worker, count))
+                         for worker in range(workers)]
+            processes.append(multiprocessing.Process(target=_concurrent_compactor, args=(temp_dir, 20)))
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(60)
+                assert process.exitcode == 0
+            
+            storage = StorageService(temp_dir)
+            saved = [(record["worker"], record["index"]) for record in storage.load_workout_history(limit=None)]
+            assert sorted(saved) == [(worker, index) for worker in range(workers) for index in range(count)]
+            assert {exercise.id for exercise in storage.load_exercises()} == {f"worker-{worker}" for worker in range(workers)}
+            assert all(storage.load_settings()[f"worker_{worker}"] for worker in range(workers))
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        
+        print("✅ Concurrent instances work correctly")
+        return True
+    except Exception as e:
+        print(f"❌ Concurrent instances test failed: {e}")
+        return False
+
 def main():
     """Run all tests"""
     print("🧪 Running GGOS Tests")
@@ -132,7 +1613,32 @@ def main():
         test_imports,
         test_exercise_creation,
         test_workout_generation,
-        test_storage
+        test_allocation_engine,
+        test_workout_aggregation,
+        test_batch_generation,
+        test_seeded_generation,
+        test_compact_history_records,
+        test_weighted_sampling,
+        test_storage,
+        test_exercise_snapshots,
+        test_balanced_generation,
+        test_workout_session,
+        test_workout_totals,
+        test_history_log,
+        test_storage_backends,
+        test_write_behind,
+        test_atomic_writes,
+        test_read_cache,
+        test_history_segments,
+        test_history_reader,
+        test_history_totals,
+        test_corruption_salvage,
+        test_concurrent_instances,
+        test_history_stats,
+        test_history_rollups,
+        test_history_index,
+        test_virtual_list,
+        test_history_columns
     ]
     
     passed = 0